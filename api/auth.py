@@ -1,52 +1,90 @@
 #auth.py
-import requests
-import urllib3
+import asyncio
+
+import const.const_db
+from api.panel import PanelClient, is_panel_failure
+from api.panels import DEFAULT_PANEL, PanelRegistry, parse_panel_configs
+from api.session import SessionManager
 from utils.logging_utils import setup_logger, retry_on_error, log_function_call
-from utils.config import API_USERNAME, API_PASSWORD, API_IP, API_PORT, API_PATH
+from utils.resilience import get_breaker
+from utils.config import (
+    API_USERNAME, API_PASSWORD, API_IP, API_PORT, API_PATH, API_INBOUND_ID, API_PANELS, API_PANEL_CAPACITY,
+    API_CONNECT_TIMEOUT, API_READ_TIMEOUT, API_MAX_CONNECTIONS, API_MAX_CONCURRENCY, API_COOKIE_FILE
+)
 
 # Настраиваем логгер
 logger = setup_logger('auth', 'api.log')
 
-# Отключаем предупреждения о сертификате
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-@retry_on_error(retries=3, delay=5)
-@log_function_call(logger)
-def login():
-    """Авторизация в панели управления с автоматическими попытками переподключения"""
-    try:
-        url = f"https://{API_IP}:{API_PORT}/{API_PATH}/login"
+def load_panel_configs():
+    """Список панелей из API_PANELS или одна панель из API_* переменных"""
+    if API_PANELS:
+        return parse_panel_configs(API_PANELS)
+    return parse_panel_configs([{
+        'name': DEFAULT_PANEL,
+        'url': f"https://{API_IP}:{API_PORT}/{API_PATH}",
+        'username': API_USERNAME,
+        'password': API_PASSWORD,
+        'inbound_id': API_INBOUND_ID,
+        'host': API_IP,
+        'capacity': API_PANEL_CAPACITY,
+        'cookie_file': API_COOKIE_FILE,
+    }])
 
-        payload = {
-            'username': API_USERNAME,
-            'password': API_PASSWORD
-        }
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
 
-        session = requests.Session()
-        response = session.post(url, headers=headers, data=payload, verify=False)
+def create_client(config):
+    """Создание клиента панели с пулом соединений и таймаутами из конфигурации"""
+    return PanelClient(
+        config.url,
+        config.username,
+        config.password,
+        connect_timeout=API_CONNECT_TIMEOUT,
+        read_timeout=API_READ_TIMEOUT,
+        max_connections=API_MAX_CONNECTIONS,
+        max_concurrency=API_MAX_CONCURRENCY,
+    )
 
-        if not response.ok:
-            logger.error(f"Login failed with status code: {response.status_code}")
-            raise Exception(f"Failed to login. Status code: {response.status_code}")
 
-        logger.info("Successfully logged in")
-        return session
+def create_session(config):
+    """Создание менеджера сессии с повторным входом по истечении cookie и своим предохранителем"""
+    breaker = get_breaker(f"3x-ui:{config.name}", is_failure=is_panel_failure)
+    return SessionManager(create_client(config), cookie_file=config.cookie_file, breaker=breaker)
 
-    except requests.exceptions.ConnectionError as e:
-        logger.error(f"Connection error during login: {str(e)}")
-        raise
+
+def get_registry():
+    """Реестр панелей; вход в каждую выполняется при первом запросе к ней"""
+    if const.const_db.PANELS is None:
+        const.const_db.PANELS = PanelRegistry(load_panel_configs(), create_session)
+    return const.const_db.PANELS
+
+
+def get_session(panel=None):
+    """Сессия панели по имени (по умолчанию - основной)"""
+    return get_registry().session(panel)
+
+
+@retry_on_error(retries=3, delay=5)
+@log_function_call(logger)
+async def login(registry=None):
+    """Авторизация во всех панелях с автоматическими попытками переподключения.
+    Уже авторизованные сессии не делают повторный запрос к панели."""
+    try:
+        registry = registry or get_registry()
+        await asyncio.gather(*(session.ensure() for session in registry.sessions()))
+        logger.info("Successfully logged in")
+        return registry
     except Exception as e:
         logger.error(f"Unexpected error during login: {str(e)}")
         raise
 
 
 @log_function_call(logger)
-def logout(session):
-    """Безопасное завершение сессии"""
+async def logout(registry):
+    """Безопасное завершение сессий"""
     try:
-        session.close()
+        if registry is not None:
+            await registry.close()
         logger.info("Successfully logged out")
     except Exception as e:
         logger.error(f"Error during logout: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -1,12 +1,13 @@
 #client.py
-from utils.config import API_IP, API_PORT, API_PATH
 from const.const_bot import API_JSON_PATH
-from utils.json_fun import post_client_json_updater
+from utils.json_fun import post_client_json_updater, build_clients_payload, CLIENT_TEMPLATE_PATH
+from utils.templates import TEMPLATES
 from utils.gen_uuid import generate_id, generate_sub_id
 from utils.timestamp import set_date, update_date, current_timestamp
-import database.user
-import const.const_api
-import const.const_db
+import database.async_user
+import database.async_outbox
+from api.auth import get_registry
+from api.panel import PanelError
 import utils.ports
 from utils.logging_utils import setup_logger, retry_on_error, log_function_call
 
@@ -15,60 +16,55 @@ logger = setup_logger('client', 'api.log')
 
 
 @log_function_call(logger)
-def add_client(tg_id, period, username):
-    """Добавление нового клиента с обработкой ошибок"""
+async def add_client(tg_id, period, username):
+    """Добавление нового клиента на наименее загруженную панель с обработкой ошибок.
+    На панель клиент попадает через outbox, ответ не ждёт 3X-UI"""
     try:
-        url = f"https://{API_IP}:{API_PORT}/{API_PATH}/panel/api/inbounds" + "/addClient"
-
-        try:
-            # Генерация идентификаторов и установка даты
-            user_id = generate_id()
-            email = username
-            date = set_date(period)
-            sub_id = generate_sub_id()
-            port = utils.ports.random_port()
-        except Exception as e:
-            logger.error(f"Error generating IDs or date: {str(e)}")
-            raise
-
-        # Компиляция профиля vless
+        registry = get_registry()
+        panel = registry.place()
         try:
-            vless_profile = (f'vless://{user_id}@{API_IP}:{port}?'
-                            f'type=tcp&'
-                            f'security=reality&'
-                            f'pbk=OTaHp-w6pfI6LSU30DKJp00o2L0VVDpiDkYVa_EVcDs&'
-                            f'fp=chrome&'
-                            f'sni=www.google.com&'
-                            f'sid=7c1a8b90ee&spx=%2F&'
-                            f'flow=xtls-rprx-vision'
-                            f'#{email}')
-            login_date = current_timestamp()
-        except Exception as e:
-            logger.error(f"Error creating vless profile: {str(e)}")
+            try:
+                # Генерация идентификаторов и установка даты
+                user_id = generate_id()
+                email = username
+                date = set_date(period)
+                sub_id = generate_sub_id()
+                port = utils.ports.random_port(panel.port_min, panel.port_max)
+            except Exception as e:
+                logger.error(f"Error generating IDs or date: {str(e)}")
+                raise
+
+            # Компиляция профиля vless
+            try:
+                vless_profile = (f'vless://{user_id}@{panel.host}:{port}?'
+                                f'type=tcp&'
+                                f'security=reality&'
+                                f'pbk={panel.public_key}&'
+                                f'fp=chrome&'
+                                f'sni={panel.sni}&'
+                                f'sid={panel.short_id}&spx=%2F&'
+                                f'flow=xtls-rprx-vision'
+                                f'#{email}')
+                login_date = current_timestamp()
+            except Exception as e:
+                logger.error(f"Error creating vless profile: {str(e)}")
+                raise
+
+            # Пользователь и намерение создать клиента - одной транзакцией,
+            # на панель клиента отправит воркер outbox
+            try:
+                await database.async_outbox.insert_user_with_intent(
+                    tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel.name,
+                    f"add:{tg_id}:{user_id}", login_date)
+            except Exception as e:
+                logger.error(f"Database insertion error: {str(e)}")
+                raise
+        except Exception:
+            # Клиент не создан: место на панели освобождается
+            registry.release(panel.name)
             raise
 
-        # Вставка в базу данных
-        try:
-            database.user.insert_user(tg_id, user_id, email, date, sub_id, vless_profile, login_date)
-        except Exception as e:
-            logger.error(f"Database insertion error: {str(e)}")
-            raise
-
-        try:
-            # Компиляция JSON и отправка запроса
-            data = post_client_json_updater(tg_id, f"{API_JSON_PATH}json/request_post_client.json",
-                                            user_id, email, date, sub_id)
-            response = const.const_db.SESSION.post(url, headers=const.const_api.HEADERS,
-                                                   json=data, verify=False)
-
-            if not response.ok:
-                logger.error(f"Failed to add client. Status code: {response.status_code}")
-                raise Exception(f"Failed to add client. Status code: {response.status_code}")
-        except Exception as e:
-            logger.error(f"API request error: {str(e)}")
-            raise
-
-        logger.info(f"Successfully added client with tg_id: {tg_id}")
+        logger.info(f"Added client with tg_id: {tg_id} on panel {panel.name}, provisioning queued")
         return vless_profile
 
     except Exception as e:
@@ -77,44 +73,30 @@ def add_client(tg_id, period, username):
 
 
 @log_function_call(logger)
-def update_client(tg_id, period):
-    """Обновление данных активного пользователя"""
+async def update_client(tg_id, period):
+    """Обновление данных активного пользователя; на панель дата уходит через outbox"""
     try:
         try:
             # Получение информации из базы данных
-            user_data = database.user.select_user(tg_id)
+            user_data = await database.async_user.select_user(tg_id)
             if not user_data:
                 raise Exception(f"User with tg_id {tg_id} not found")
         except Exception as e:
             logger.error(f"Database selection error: {str(e)}")
             return False
 
-        tg_id, user_id, email, old_date, sub_id, vless, login_date, trial_date = user_data
-        url = f"https://{API_IP}:{API_PORT}/{API_PATH}/panel/api/inbounds" + "/updateClient" + f"/{user_id}"
+        tg_id, user_id, email, old_date, sub_id, vless, login_date, trial_date, panel = user_data
 
         try:
-            # Обновление даты
+            # Новая дата и намерение отправить её на панель - одной транзакцией
             date = update_date(old_date, period)
-            database.user.update_user_date(date, tg_id)
+            await database.async_outbox.update_user_date_with_intent(
+                date, tg_id, f"update:{tg_id}:{date}", current_timestamp())
         except Exception as e:
             logger.error(f"Error updating date: {str(e)}")
             return False
 
-        try:
-            # Компиляция JSON и отправка запроса
-            data = post_client_json_updater(tg_id, f"{API_JSON_PATH}json/request_post_client.json",
-                                            user_id, email, date, sub_id)
-            response = const.const_db.SESSION.post(url, headers=const.const_api.HEADERS,
-                                                   json=data, verify=False)
-
-            if not response.ok:
-                logger.error(f"Failed to update client. Status code: {response.status_code}")
-                return False
-        except Exception as e:
-            logger.error(f"API request error: {str(e)}")
-            return False
-
-        logger.info(f"Successfully updated client with tg_id: {tg_id}")
+        logger.info(f"Updated client with tg_id: {tg_id}, provisioning queued")
         return True
 
     except Exception as e:
@@ -122,3 +104,48 @@ def update_client(tg_id, period):
         return False
 
 
+async def push_client_expiry(tg_id, user_id, email, date, sub_id, panel=None):
+    """Установка новой даты окончания клиента на его панели без обращения к БД"""
+    try:
+        config = get_registry().get(panel)
+        data = post_client_json_updater(tg_id, f"{API_JSON_PATH}json/request_post_client.json",
+                                        user_id, email, date, sub_id, config.inbound_id)
+        await get_registry().session(config.name).update_client(user_id, data)
+    except Exception as e:
+        logger.error(f"API request error for tg_id {tg_id}: {str(e)}")
+        raise
+
+
+async def add_clients_batch(panel, users):
+    """Создание на панели нескольких клиентов одним запросом addClient.
+    users: строки (tg_id, user_id, email, date, sub_id) из БД"""
+    try:
+        config = get_registry().get(panel)
+        clients = list(users)
+        data = build_clients_payload(TEMPLATES.get(CLIENT_TEMPLATE_PATH).data, clients, config.inbound_id)
+        await get_registry().session(config.name).add_client(data)
+        logger.info(f"Added {len(clients)} clients to panel {config.name} in one request")
+    except Exception as e:
+        logger.error(f"API batch add error on panel {panel}: {str(e)}")
+        raise
+
+
+async def deliver_intent(action, tg_id, user_id, email, date, sub_id, panel):
+    """Доставка намерения из outbox на панель. Отправляется текущая строка users,
+    поэтому повтор после потерянного ответа ничего не ломает: если панель отклонила
+    addClient, потому что клиент уже создан прошлой попыткой, ему отправляется дата"""
+    if action == 'add':
+        try:
+            await add_clients_batch(panel, [(tg_id, user_id, email, date, sub_id)])
+            return
+        except PanelError as e:
+            # Панель недоступна или сессия истекла - повторит воркер
+            if e.status != 200:
+                raise
+            logger.warning(f"Panel rejected addClient for tg_id {tg_id}, updating the existing client: {str(e)}")
+            try:
+                await push_client_expiry(tg_id, user_id, email, date, sub_id, panel)
+            except Exception:
+                raise e
+            return
+    await push_client_expiry(tg_id, user_id, email, date, sub_id, panel)
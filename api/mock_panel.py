@@ -0,0 +1,274 @@
+#mock_panel.py
+import argparse
+import asyncio
+import json
+import math
+import random
+import secrets
+import sys
+import time
+
+from aiohttp import web
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('mock_panel', 'api.log')
+
+COOKIE_NAME = '3x-ui'
+
+
+def parse_latency(spec, rng=random):
+    """
+    Builds a latency function returning seconds from a spec string:
+    'fixed:0.05', 'uniform:0.01,0.2', 'exp:0.05' (mean) or 'lognormal:0.05,0.5'
+    (median, sigma). An empty spec means no latency.
+    """
+    if not spec:
+        return lambda: 0.0
+    kind, _, raw = spec.partition(':')
+    try:
+        values = [float(value) for value in raw.split(',') if value]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec {spec!r}")
+    if kind == 'fixed' and len(values) == 1:
+        return lambda: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == 'exp' and len(values) == 1:
+        return lambda: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if kind == 'lognormal' and len(values) == 2:
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Invalid latency spec {spec!r}")
+
+
+class MockPanel:
+    """
+    In-memory stand-in for the 3X-UI panel API, for tests and benchmarks.
+
+    Implements login, addClient, updateClient, inbound listing, client traffic
+    and the online list the way PanelClient uses them. Every request waits
+    latency() seconds; with error_rate a share of requests fails with
+    error_status, and with session_ttl login cookies expire, so callers see
+    the redirect to the login page a real panel sends.
+    """
+
+    def __init__(self, username='admin', password='secret', inbound_ids=(1,), latency=None,
+                 error_rate=0.0, error_status=500, session_ttl=None, seed=None, clock=time.monotonic):
+        self.username = username
+        self.password = password
+        self.latency = latency if callable(latency) else parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.session_ttl = session_ttl
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.inbounds = {
+            inbound_id: {'id': inbound_id, 'remark': f'inbound-{inbound_id}', 'protocol': 'vless', 'clients': [], 'stats': {}}
+            for inbound_id in inbound_ids
+        }
+        self.online = set()
+        self._sessions = {}
+        self.requests = 0
+        self.logins = 0
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    # Состояние
+
+    def expire_sessions(self):
+        """
+        Drops every session, like a panel restart.
+        """
+        self._sessions.clear()
+
+    def clients(self, inbound_id):
+        return self.inbounds[inbound_id]['clients']
+
+    def set_traffic(self, email, up=0, down=0):
+        for inbound in self.inbounds.values():
+            if email in inbound['stats']:
+                inbound['stats'][email].update(up=up, down=down)
+
+    def set_online(self, emails):
+        self.online = set(emails)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'logins': self.logins,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'max_in_flight': self.max_in_flight,
+            'clients': sum(len(inbound['clients']) for inbound in self.inbounds.values()),
+        }
+
+    # Обработка запросов
+
+    @staticmethod
+    def reply(obj=None, success=True, msg=''):
+        return web.json_response({'success': success, 'msg': msg, 'obj': obj})
+
+    def reject(self, msg):
+        self.rejected += 1
+        return self.reply(None, False, msg)
+
+    def _authorized(self, request):
+        expires_at = self._sessions.get(request.cookies.get(COOKIE_NAME))
+        return expires_at is not None and expires_at > self.clock()
+
+    @web.middleware
+    async def _faults(self, request, handler):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.errors += 1
+                return web.Response(status=self.error_status, text='injected fault')
+            if request.match_info.route.name != 'login' and not self._authorized(request):
+                raise web.HTTPFound('/login')
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    def _inbound_obj(self, inbound):
+        return {
+            'id': inbound['id'],
+            'remark': inbound['remark'],
+            'protocol': inbound['protocol'],
+            'settings': json.dumps({'clients': inbound['clients']}),
+            'clientStats': list(inbound['stats'].values()),
+        }
+
+    def _find_client(self, uuid):
+        for inbound in self.inbounds.values():
+            for index, client in enumerate(inbound['clients']):
+                if client.get('id') == uuid:
+                    return inbound, index
+        return None, None
+
+    async def login(self, request):
+        form = await request.post()
+        if form.get('username') != self.username or form.get('password') != self.password:
+            return self.reject('Wrong username or password')
+        self.logins += 1
+        token = secrets.token_hex(16)
+        self._sessions[token] = self.clock() + self.session_ttl if self.session_ttl else float('inf')
+        response = self.reply(None, msg='Login successfully')
+        response.set_cookie(COOKIE_NAME, token)
+        return response
+
+    @staticmethod
+    async def _payload(request):
+        payload = await request.json()
+        settings = payload.get('settings') or '{}'
+        clients = json.loads(settings).get('clients') if isinstance(settings, str) else settings.get('clients')
+        return payload.get('id'), clients or []
+
+    async def add_client(self, request):
+        inbound_id, clients = await self._payload(request)
+        inbound = self.inbounds.get(inbound_id)
+        if inbound is None:
+            return self.reject(f'Inbound {inbound_id} not found')
+        emails = {stat['email'] for item in self.inbounds.values() for stat in item['stats'].values()}
+        for client in clients:
+            if client.get('email') in emails:
+                return self.reject(f"Duplicate email: {client.get('email')}")
+            emails.add(client.get('email'))
+        for client in clients:
+            inbound['clients'].append(dict(client))
+            inbound['stats'][client['email']] = {
+                'inboundId': inbound_id, 'email': client['email'], 'up': 0, 'down': 0, 'total': 0,
+                'expiryTime': client.get('expiryTime', 0), 'enable': client.get('enable', True), 'lastOnline': 0,
+            }
+        return self.reply(msg='Inbound client(s) have been added.')
+
+    async def update_client(self, request):
+        inbound_id, clients = await self._payload(request)
+        inbound, index = self._find_client(request.match_info['uuid'])
+        if inbound is None or inbound['id'] != inbound_id or not clients:
+            return self.reject('Client not found')
+        old, new = inbound['clients'][index], dict(clients[0])
+        inbound['clients'][index] = new
+        stat = inbound['stats'].pop(old['email'])
+        stat.update(email=new.get('email'), expiryTime=new.get('expiryTime', 0), enable=new.get('enable', True))
+        inbound['stats'][stat['email']] = stat
+        return self.reply(msg='Inbound client has been updated.')
+
+    async def list_inbounds(self, request):
+        return self.reply([self._inbound_obj(inbound) for inbound in self.inbounds.values()])
+
+    async def get_inbound(self, request):
+        inbound = self.inbounds.get(int(request.match_info['inbound_id']))
+        if inbound is None:
+            return self.reject('Inbound not found')
+        return self.reply(self._inbound_obj(inbound))
+
+    async def client_traffic(self, request):
+        email = request.match_info['email']
+        for inbound in self.inbounds.values():
+            if email in inbound['stats']:
+                return self.reply(inbound['stats'][email])
+        return self.reply(None)
+
+    async def client_traffic_by_id(self, request):
+        inbound, index = self._find_client(request.match_info['uuid'])
+        if inbound is None:
+            return self.reply([])
+        return self.reply([inbound['stats'][inbound['clients'][index]['email']]])
+
+    async def onlines(self, request):
+        return self.reply(sorted(self.online))
+
+    def make_app(self):
+        app = web.Application(middlewares=[self._faults])
+        app.router.add_post('/login', self.login, name='login')
+        app.router.add_post('/panel/api/inbounds/addClient', self.add_client)
+        app.router.add_post('/panel/api/inbounds/updateClient/{uuid}', self.update_client)
+        app.router.add_get('/panel/api/inbounds/list', self.list_inbounds)
+        app.router.add_get('/panel/api/inbounds/get/{inbound_id}', self.get_inbound)
+        app.router.add_get('/panel/api/inbounds/getClientTraffics/{email}', self.client_traffic)
+        app.router.add_get('/panel/api/inbounds/getClientTrafficsById/{uuid}', self.client_traffic_by_id)
+        app.router.add_post('/panel/api/inbounds/onlines', self.onlines)
+        return app
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Serves the panel in the running loop. Returns (runner, base_url);
+        call runner.cleanup() to stop it.
+        """
+        runner = web.AppRunner(self.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = runner.addresses[0][1]
+        return runner, f"http://{host}:{port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local mock 3X-UI panel.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2053)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='secret')
+    parser.add_argument('--inbound', type=int, action='append', help="inbound id, may be repeated (default 1)")
+    parser.add_argument('--latency', default='', help="fixed:S, uniform:MIN,MAX, exp:MEAN or lognormal:MEDIAN,SIGMA")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests failing with --error-status")
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--session-ttl', type=float, default=None, help="seconds a login cookie stays valid")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    panel = MockPanel(args.username, args.password, tuple(args.inbound or (1,)), args.latency,
+                      args.error_rate, args.error_status, args.session_ttl, args.seed)
+    print(f"Mock 3X-UI panel on http://{args.host}:{args.port}")
+    web.run_app(panel.make_app(), host=args.host, port=args.port, print=None)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#panel.py
+import asyncio
+import json
+import os
+import pickle
+
+import aiohttp
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('panel', 'api.log')
+
+
+class PanelError(Exception):
+    """
+    Raised when the 3X-UI panel is unreachable, times out or rejects a request.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class PanelAuthError(PanelError):
+    """
+    Raised when the panel redirects to the login page or answers 401/403,
+    i.e. the session cookie is missing or has expired.
+    """
+
+
+# Панель без действующей cookie отвечает редиректом на страницу входа или 401
+AUTH_FAILURE_STATUSES = {301, 302, 303, 307, 308, 401, 403}
+
+
+def is_panel_failure(e):
+    """
+    True for errors meaning the panel is down: unreachable, timed out or 5xx.
+    Auth failures and requests the panel rejected show it is alive.
+    """
+    if not isinstance(e, PanelError) or isinstance(e, PanelAuthError):
+        return False
+    return e.status is None or e.status >= 500
+
+
+def inbound_clients(inbound):
+    """
+    Returns the client dicts (id, email, expiryTime, ...) of a 3X-UI inbound object,
+    whose settings field is a JSON string.
+    """
+    settings = inbound.get('settings') or '{}'
+    if isinstance(settings, str):
+        settings = json.loads(settings)
+    return settings.get('clients') or []
+
+
+class PanelClient:
+    """
+    Async client for the 3X-UI panel API.
+
+    One aiohttp session keeps connections to the panel alive between requests,
+    timeouts are split into connect and read, and a semaphore caps how many
+    requests are in flight so a slow panel cannot pile up work.
+    """
+
+    def __init__(self, base_url, username, password, connect_timeout=5, read_timeout=15,
+                 max_connections=10, max_concurrency=5, verify_ssl=False):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.max_connections = max_connections
+        self.verify_ssl = verify_ssl
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ssl=None if self.verify_ssl else False)
+            # Панель отдаётся по IP: без unsafe=True aiohttp не сохранит cookie сессии
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                headers={'Accept': 'application/json'},
+            )
+        return self._session
+
+    async def _request(self, method, path, **kwargs):
+        """
+        Sends one request and returns the 'obj' field of the panel's JSON reply.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        async with self._semaphore:
+            try:
+                async with self._get_session().request(method, url, allow_redirects=False, **kwargs) as response:
+                    if response.status in AUTH_FAILURE_STATUSES:
+                        raise PanelAuthError(f"{method} {path} is not authorized (status {response.status})", response.status)
+                    if response.status != 200:
+                        raise PanelError(f"{method} {path} failed with status {response.status}", response.status)
+                    body = await response.json(content_type=None)
+            except asyncio.TimeoutError as e:
+                raise PanelError(f"{method} {path} timed out") from e
+            except aiohttp.ClientError as e:
+                raise PanelError(f"{method} {path} failed: {str(e)}") from e
+
+        if not isinstance(body, dict) or not body.get('success', False):
+            message = body.get('msg') if isinstance(body, dict) else body
+            raise PanelError(f"{method} {path} rejected by panel: {message}", 200)
+        return body.get('obj')
+
+    async def login(self):
+        """
+        Logs in and stores the session cookie for the following requests.
+        """
+        await self._request('POST', 'login', data={'username': self.username, 'password': self.password})
+        logger.info("Successfully logged in to 3X-UI.")
+
+    async def add_client(self, payload):
+        """
+        Adds clients to an inbound; payload is {'id': inbound_id, 'settings': json_string}.
+        """
+        return await self._request('POST', 'panel/api/inbounds/addClient', json=payload)
+
+    async def update_client(self, client_uuid, payload):
+        """
+        Updates the client with the given uuid.
+        """
+        return await self._request('POST', f'panel/api/inbounds/updateClient/{client_uuid}', json=payload)
+
+    async def get_inbounds(self):
+        """
+        Returns every inbound with its client statistics.
+        """
+        return await self._request('GET', 'panel/api/inbounds/list')
+
+    async def get_inbound(self, inbound_id):
+        """
+        Returns one inbound with its client statistics.
+        """
+        return await self._request('GET', f'panel/api/inbounds/get/{inbound_id}')
+
+    async def get_client_traffic(self, email):
+        """
+        Returns up/down traffic, expiry and enable flag of a client by email.
+        """
+        return await self._request('GET', f'panel/api/inbounds/getClientTraffics/{email}')
+
+    async def get_client_traffic_by_id(self, client_uuid):
+        """
+        Returns traffic records of a client by uuid.
+        """
+        return await self._request('GET', f'panel/api/inbounds/getClientTrafficsById/{client_uuid}')
+
+    async def get_online_clients(self):
+        """
+        Returns emails of clients connected right now.
+        """
+        return await self._request('POST', 'panel/api/inbounds/onlines')
+
+    def save_cookies(self, path):
+        """
+        Writes the session cookies to path, readable by the owner only.
+        """
+        self._get_session().cookie_jar.save(path)
+        os.chmod(path, 0o600)
+
+    def load_cookies(self, path):
+        """
+        Loads session cookies saved by save_cookies.
+        Returns False if the file is missing or unreadable.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            self._get_session().cookie_jar.load(path)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning(f"Could not load panel cookies from {path}: {str(e)}")
+            return False
+        return len(self._get_session().cookie_jar) > 0
+
+    async def close(self):
+        """
+        Closes the HTTP session and its pooled connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,156 @@
+#panels.py
+import json
+import threading
+from collections import namedtuple
+
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('panels', 'api.log')
+
+PanelConfig = namedtuple('PanelConfig', [
+    'name', 'url', 'username', 'password', 'inbound_id', 'host', 'capacity',
+    'port_min', 'port_max', 'public_key', 'short_id', 'sni', 'cookie_file',
+])
+
+# Значения по умолчанию для полей, которые можно не указывать в API_PANELS
+PANEL_DEFAULTS = {
+    'capacity': 100000,
+    'port_min': 29401,
+    'port_max': 29599,
+    'public_key': 'OTaHp-w6pfI6LSU30DKJp00o2L0VVDpiDkYVa_EVcDs',
+    'short_id': '7c1a8b90ee',
+    'sni': 'www.google.com',
+    'cookie_file': None,
+}
+
+DEFAULT_PANEL = 'main'
+
+
+class PanelCapacityError(Exception):
+    """
+    Raised when every panel has reached its capacity.
+    """
+
+
+def parse_panel_configs(raw, defaults=None):
+    """
+    Builds PanelConfig entries from a JSON list of panel objects.
+    name, url, username, password, inbound_id and host are required.
+    """
+    defaults = {**PANEL_DEFAULTS, **(defaults or {})}
+    items = json.loads(raw) if isinstance(raw, str) else raw
+    if not items:
+        raise ValueError("At least one panel must be configured")
+
+    configs = []
+    for item in items:
+        missing = [field for field in ('name', 'url', 'username', 'password', 'inbound_id', 'host') if not item.get(field)]
+        if missing:
+            raise ValueError(f"Panel {item.get('name')} is missing {missing}")
+        unknown = set(item) - set(PanelConfig._fields)
+        if unknown:
+            raise ValueError(f"Panel {item['name']} has unknown fields {sorted(unknown)}")
+        config = PanelConfig(**{**defaults, **item})
+        if config.capacity <= 0:
+            raise ValueError(f"Panel {config.name} must have a positive capacity")
+        configs.append(config)
+
+    names = [config.name for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Panel names must be unique: {names}")
+    return configs
+
+
+class PanelRegistry:
+    """
+    The 3X-UI panels clients can be placed on, each with its own session.
+
+    Loads are client counts per panel. They are seeded from the database
+    with set_loads and then tracked in memory: place() picks the panel with
+    the lowest load/capacity ratio and counts the client at once, so
+    concurrent placements spread over the panels.
+    """
+
+    def __init__(self, configs, session_factory):
+        self.configs = {config.name: config for config in configs}
+        self.default = configs[0].name
+        self._session_factory = session_factory
+        self._sessions = {}
+        self._loads = {name: 0 for name in self.configs}
+        self._lock = threading.Lock()
+
+    def get(self, name=None):
+        """
+        Returns the PanelConfig by name; unknown or empty names fall back to the default panel.
+        """
+        config = self.configs.get(name or self.default)
+        if config is None:
+            logger.warning(f"Unknown panel {name}, using {self.default}.")
+            config = self.configs[self.default]
+        return config
+
+    def session(self, name=None):
+        """
+        Returns the SessionManager of a panel, creating it on first use.
+        """
+        config = self.get(name)
+        session = self._sessions.get(config.name)
+        if session is None:
+            session = self._sessions.setdefault(config.name, self._session_factory(config))
+        return session
+
+    def sessions(self):
+        return [self.session(name) for name in self.configs]
+
+    def set_loads(self, loads):
+        """
+        Replaces the client counts, e.g. with counts from the users table.
+        """
+        with self._lock:
+            self._loads = {name: loads.get(name, 0) for name in self.configs}
+
+    def place(self):
+        """
+        Chooses the least loaded panel with free capacity and counts one client on it.
+        Panels whose circuit is open are skipped while another panel has room.
+        """
+        with self._lock:
+            free = [config for config in self.configs.values() if self._loads[config.name] < config.capacity]
+            if not free:
+                raise PanelCapacityError("All 3X-UI panels are full")
+            free = [config for config in free if self._available(config.name)] or free
+            config = min(free, key=lambda item: (self._loads[item.name] / item.capacity, self._loads[item.name]))
+            self._loads[config.name] += 1
+        return config
+
+    def _available(self, name):
+        session = self._sessions.get(name)
+        return session is None or session.available()
+
+    def release(self, name):
+        """
+        Takes back a placement whose client was not created.
+        """
+        with self._lock:
+            if self._loads.get(name, 0) > 0:
+                self._loads[name] -= 1
+
+    def stats(self):
+        """
+        Returns load, capacity and session counters per panel.
+        """
+        with self._lock:
+            loads = dict(self._loads)
+        return {
+            name: {
+                'load': loads[name],
+                'capacity': config.capacity,
+                'session': self._sessions[name].stats() if name in self._sessions else None,
+            }
+            for name, config in self.configs.items()
+        }
+
+    async def close(self):
+        for session in list(self._sessions.values()):
+            await session.close()
+        self._sessions.clear()
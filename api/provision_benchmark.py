@@ -0,0 +1,103 @@
+#provision_benchmark.py
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+
+from api.mock_panel import MockPanel
+from api.panel import PanelClient, is_panel_failure
+from api.session import SessionManager
+from utils.gen_uuid import generate_id, generate_sub_id
+from utils.json_fun import CLIENT_TEMPLATE_PATH, build_client_payload, preload_templates
+from utils.resilience import CircuitBreaker
+from utils.templates import TEMPLATES
+
+INBOUND_ID = 1
+
+
+def percentile(samples, share):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+async def provision(session, template, clients, concurrency):
+    """
+    Adds then updates every (tg_id, uuid, email, date, sub_id) client with at
+    most concurrency requests in flight.
+    Returns ([request_ms], Counter of error types, elapsed seconds).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, errors = [], Counter()
+
+    async def timed(method, *args):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await getattr(session, method)(*args)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                return
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        timed('add_client', build_client_payload(template, *client, INBOUND_ID))
+        for client in clients
+    ))
+    await asyncio.gather(*(
+        timed('update_client', client[1], build_client_payload(template, *client[:3], client[3] + 1, client[4], INBOUND_ID))
+        for client in clients
+    ))
+    return samples, errors, time.perf_counter() - started
+
+
+async def run(args):
+    panel = MockPanel(inbound_ids=(INBOUND_ID,), latency=args.latency, error_rate=args.error_rate,
+                      session_ttl=args.session_ttl, seed=args.seed)
+    runner, url = await panel.start()
+    breaker = CircuitBreaker('3x-ui:mock', is_failure=is_panel_failure) if args.breaker else None
+    session = SessionManager(PanelClient(url, panel.username, panel.password, max_concurrency=args.concurrency,
+                                         read_timeout=args.read_timeout), breaker=breaker)
+    template = TEMPLATES.get(CLIENT_TEMPLATE_PATH).data
+    clients = [(tg_id, generate_id(), f'bench{tg_id}', 1_760_000_000_000, generate_sub_id()) for tg_id in range(args.clients)]
+    try:
+        samples, errors, elapsed = await provision(session, template, clients, args.concurrency)
+    finally:
+        await session.close()
+        await runner.cleanup()
+    return samples, errors, elapsed, panel.stats(), session.stats(), breaker.stats() if breaker else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure client provisioning against a mock 3X-UI panel.")
+    parser.add_argument('--clients', type=int, default=500, help="clients to add and then update")
+    parser.add_argument('--concurrency', type=int, default=5, help="requests in flight")
+    parser.add_argument('--latency', default='lognormal:0.02,0.5', help="panel latency, see api.mock_panel.parse_latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of panel requests failing with 500")
+    parser.add_argument('--session-ttl', type=float, default=None, help="seconds a panel login stays valid")
+    parser.add_argument('--read-timeout', type=float, default=15)
+    parser.add_argument('--breaker', action='store_true', help="route calls through a circuit breaker")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    preload_templates()
+    samples, errors, elapsed, panel, session, breaker = asyncio.run(run(args))
+
+    requests = len(samples) + sum(errors.values())
+    print(f"requests {requests}, ok {len(samples)}, {requests / elapsed:.0f} req/s")
+    if samples:
+        print(f"p50 {statistics.median(samples):.1f} ms, p95 {percentile(samples, 0.95):.1f} ms, "
+              f"p99 {percentile(samples, 0.99):.1f} ms")
+    for name, count in errors.most_common():
+        print(f"error {name}: {count}")
+    print(f"panel: {panel}")
+    print(f"session: {session}")
+    if breaker is not None:
+        print(f"breaker: {breaker}")
+    return 0 if not errors else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
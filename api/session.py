@@ -0,0 +1,132 @@
+#session.py
+import asyncio
+
+from api.panel import PanelAuthError
+from utils.logging_utils import setup_logger
+from utils.resilience import OPEN
+
+logger = setup_logger('session', 'api.log')
+
+
+class SessionManager:
+    """
+    Keeps one authenticated 3X-UI session for the whole bot.
+
+    Calls go straight to the panel with the stored cookie. When the panel
+    answers with an auth failure the session logs in again and the call is
+    repeated once; concurrent callers that hit the same expired cookie wait
+    for a single shared login. With cookie_file set the cookie survives a
+    restart, so startup does not need a login round trip.
+    With a breaker, calls to a panel that keeps failing raise CircuitOpenError
+    at once instead of waiting for timeouts.
+    """
+
+    def __init__(self, client, cookie_file=None, breaker=None):
+        self.client = client
+        self.cookie_file = cookie_file
+        self.breaker = breaker
+        self.authenticated = False
+        self.logins = 0
+        self.relogins = 0
+        # Номер текущей сессии: растёт при каждом входе
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def _login(self):
+        await self.client.login()
+        self._generation += 1
+        self.logins += 1
+        self.authenticated = True
+        if self.cookie_file:
+            try:
+                self.client.save_cookies(self.cookie_file)
+            except OSError as e:
+                logger.warning(f"Could not save panel cookies to {self.cookie_file}: {str(e)}")
+
+    async def ensure(self):
+        """
+        Makes sure a session exists: restores the saved cookie or logs in.
+        Does nothing if the session is already authenticated.
+        """
+        if self.authenticated:
+            return
+        async with self._lock:
+            if self.authenticated:
+                return
+            if self.cookie_file and self.client.load_cookies(self.cookie_file):
+                self.authenticated = True
+                logger.info(f"Restored 3X-UI session from {self.cookie_file}.")
+                return
+            await self._login()
+
+    async def _relogin(self, generation):
+        async with self._lock:
+            # Пока ждали блокировку, другой запрос уже перелогинился
+            if self._generation != generation and self.authenticated:
+                return
+            self.authenticated = False
+            self.relogins += 1
+            logger.warning("3X-UI session expired, logging in again.")
+            await self._login()
+
+    async def call(self, method, *args, **kwargs):
+        """
+        Calls a PanelClient method, re-logging in once on an auth failure.
+        """
+        if self.breaker is not None:
+            return await self.breaker.call(self._call, method, *args, **kwargs)
+        return await self._call(method, *args, **kwargs)
+
+    async def _call(self, method, *args, **kwargs):
+        await self.ensure()
+        generation = self._generation
+        try:
+            return await getattr(self.client, method)(*args, **kwargs)
+        except PanelAuthError:
+            await self._relogin(generation)
+            return await getattr(self.client, method)(*args, **kwargs)
+
+    async def add_client(self, payload):
+        return await self.call('add_client', payload)
+
+    async def update_client(self, client_uuid, payload):
+        return await self.call('update_client', client_uuid, payload)
+
+    async def get_inbounds(self):
+        return await self.call('get_inbounds')
+
+    async def get_inbound(self, inbound_id):
+        return await self.call('get_inbound', inbound_id)
+
+    async def get_client_traffic(self, email):
+        return await self.call('get_client_traffic', email)
+
+    async def get_client_traffic_by_id(self, client_uuid):
+        return await self.call('get_client_traffic_by_id', client_uuid)
+
+    async def get_online_clients(self):
+        return await self.call('get_online_clients')
+
+    def available(self):
+        """
+        False while the panel's circuit is open.
+        """
+        return self.breaker is None or self.breaker.state != OPEN
+
+    def stats(self):
+        """
+        Returns login counters of the session and the state of its circuit.
+        """
+        return {
+            'authenticated': self.authenticated,
+            'logins': self.logins,
+            'relogins': self.relogins,
+            'circuit': self.breaker.state if self.breaker is not None else None,
+        }
+
+    async def close(self):
+        """
+        Closes the underlying client; the saved cookie file is kept.
+        """
+        self.authenticated = False
+        await self.client.close()
@@ -0,0 +1,119 @@
+#traffic.py
+import asyncio
+import threading
+import time
+from collections import namedtuple
+
+from api.panel import inbound_clients
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('traffic', 'api.log')
+
+ClientTraffic = namedtuple('ClientTraffic', [
+    'email', 'uuid', 'up', 'down', 'total', 'expiry_time', 'enable', 'online', 'last_online',
+])
+
+
+class TrafficCache:
+    """
+    In-memory table of per-client traffic and online status.
+
+    A sync replaces the whole table at once, so readers never see a half
+    updated table and never wait for the panel. Rows are found by email or
+    by client uuid.
+    """
+
+    def __init__(self):
+        self._by_email = {}
+        self._email_by_uuid = {}
+        self._lock = threading.Lock()
+        self.synced_at = None
+        self.syncs = 0
+        self.sync_errors = 0
+
+    def replace(self, rows):
+        """
+        Swaps in a new table built from ClientTraffic rows.
+        """
+        by_email = {row.email: row for row in rows}
+        email_by_uuid = {row.uuid: row.email for row in rows if row.uuid}
+        with self._lock:
+            self._by_email, self._email_by_uuid = by_email, email_by_uuid
+            self.synced_at = time.time()
+            self.syncs += 1
+
+    def get(self, email):
+        return self._by_email.get(email)
+
+    def get_by_uuid(self, uuid):
+        email = self._email_by_uuid.get(uuid)
+        return self._by_email.get(email) if email is not None else None
+
+    def rows(self):
+        return list(self._by_email.values())
+
+    def stats(self):
+        """
+        Returns a snapshot of the table counters.
+        """
+        rows = self._by_email
+        return {
+            'clients': len(rows),
+            'online': sum(1 for row in rows.values() if row.online),
+            'synced_at': self.synced_at,
+            'syncs': self.syncs,
+            'sync_errors': self.sync_errors,
+        }
+
+
+def parse_inbound(inbound, online_emails):
+    """
+    Builds ClientTraffic rows from a 3X-UI inbound object and the list of online emails.
+    """
+    uuid_by_email = {client.get('email'): client.get('id') for client in inbound_clients(inbound)}
+    online = set(online_emails or ())
+
+    rows = []
+    for stat in inbound.get('clientStats') or []:
+        email = stat.get('email')
+        rows.append(ClientTraffic(
+            email=email,
+            uuid=uuid_by_email.get(email),
+            up=stat.get('up', 0),
+            down=stat.get('down', 0),
+            total=stat.get('total', 0),
+            expiry_time=stat.get('expiryTime', 0),
+            enable=stat.get('enable', True),
+            online=email in online,
+            last_online=stat.get('lastOnline'),
+        ))
+    return rows
+
+
+async def fetch_traffic(session, inbound_id):
+    """
+    Pulls traffic of every client of one inbound and the panel's online list.
+    """
+    inbound = await session.get_inbound(inbound_id)
+    online_emails = await session.get_online_clients()
+    return parse_inbound(inbound, online_emails)
+
+
+async def sync_traffic(targets, cache):
+    """
+    Fetches every (session, inbound_id) target concurrently and replaces the cache.
+    Returns the number of clients synced.
+    """
+    try:
+        results = await asyncio.gather(*(fetch_traffic(session, inbound_id) for session, inbound_id in targets))
+        rows = [row for result in results for row in result]
+        cache.replace(rows)
+        logger.info(f"Synced traffic of {len(rows)} clients from {len(targets)} inbounds.")
+        return len(rows)
+    except Exception as e:
+        cache.sync_errors += 1
+        logger.error(f"Error while syncing traffic: {str(e)}")
+        raise
+
+
+TRAFFIC_CACHE = TrafficCache()
@@ -3,6 +3,8 @@ from bot.bot_init import bot
 from const.const_bot import PAYMENT_STATE
 from utils.logging_utils import setup_logger
 import middleware.user
+import middleware.balance
+import middleware.traffic
 from bot.messages import messages
 
 logger = setup_logger('base_fun', 'bot.log')
@@ -14,13 +16,45 @@ async def remove_message(tg_id, msg_id: int):
     except Exception as e:
         logger.error(f"Could not remove message {msg_id} in chat {tg_id}: {e}")
         
-async def expiry_date_view(type_of_message, tg_id):
-    date = middleware.user.get_users_expiration_date(tg_id)
-    comfort_format_expiration_date = middleware.user.get_users_expiration_date_to_comfort_format(tg_id)
+async def release_bonus_reservation(tg_id):
+    """
+    Releases the meow-coins reserved for the user's current invoice, if any.
+    """
+    state = PAYMENT_STATE.get(tg_id)
+    reservation_id = state.get("reservation_id") if state else None
+    if not reservation_id:
+        return
+    try:
+        await middleware.balance.release_reservation(reservation_id)
+        state["reservation_id"] = None
+    except Exception as e:
+        # Резерв всё равно истечёт сам по BONUS_RESERVATION_TTL_MS
+        logger.error(f"Could not release reservation {reservation_id} for {tg_id}: {e}")
+
+async def expiry_date_view(type_of_message, tg_id, date_ts=None):
+    """
+    Builds the expiry text. Pass date_ts (e.g. from a UserSnapshot) to skip the database read.
+    """
+    if date_ts is None:
+        date_ts = await middleware.user.select_user_date(tg_id)
+    date = middleware.user.format_expiration_date(date_ts)
+    comfort_format_expiration_date = middleware.user.format_time_left(date_ts)
     text = (
         f'{messages.get_random_message(type_of_message)}\n'
         f'├─ Осталось: `{comfort_format_expiration_date}` 🐱\n'
         f'└─ Дата истечения: `{date}` ⏰'
         )
             
-    return text
\ No newline at end of file
+    return text
+
+def traffic_view(traffic):
+    """
+    Builds the traffic lines of the profile from a cached ClientTraffic row.
+    """
+    status = "🟢 онлайн" if traffic.online else "⚪️ не в сети"
+    text = (
+        f'├─ Трафик: `{middleware.traffic.format_bytes(traffic.up + traffic.down)}` '
+        f'(↑ {middleware.traffic.format_bytes(traffic.up)}, ↓ {middleware.traffic.format_bytes(traffic.down)})\n'
+        f'└─ Статус: {status}'
+    )
+    return text
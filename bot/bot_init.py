@@ -1,8 +1,47 @@
 #bot_init.py
+import aiohttp
+from telebot import asyncio_helper
 from utils.logging_utils import setup_logger
+from utils.resilience import get_breaker
 from telebot.async_telebot import AsyncTeleBot
 
-from utils.config import BOT_API
+from utils.config import BOT_API, BOT_UPDATE_WORKERS
+from bot.update_scheduler import install_update_scheduler
 
 logger = setup_logger('bot', 'bot.log')
-bot = AsyncTeleBot(BOT_API)
\ No newline at end of file
+
+
+def is_telegram_failure(e):
+    """
+    True for errors meaning the Bot API is unreachable or failing (timeouts, 5xx).
+    Errors about one chat or request (blocked bot, bad markup, 429) do not count.
+    """
+    if isinstance(e, asyncio_helper.ApiTelegramException):
+        return e.error_code >= 500
+    if isinstance(e, asyncio_helper.ApiHTTPException):
+        return e.result.status >= 500
+    return isinstance(e, (asyncio_helper.RequestTimeout, aiohttp.ClientError))
+
+
+TELEGRAM_BREAKER = get_breaker('telegram', is_failure=is_telegram_failure)
+
+
+def install_telegram_breaker(breaker):
+    """
+    Routes every Bot API request except getUpdates through the breaker.
+    Polling keeps its own reconnect loop, so an outage is not reported twice.
+    """
+    process_request = asyncio_helper._process_request
+
+    async def guarded(token, url, *args, **kwargs):
+        if url == 'getUpdates':
+            return await process_request(token, url, *args, **kwargs)
+        return await breaker.call(process_request, token, url, *args, **kwargs)
+
+    asyncio_helper._process_request = guarded
+
+
+install_telegram_breaker(TELEGRAM_BREAKER)
+bot = AsyncTeleBot(BOT_API)
+# Обновления одного чата - по очереди, разных чатов - параллельно
+UPDATE_SCHEDULER = install_update_scheduler(bot, BOT_UPDATE_WORKERS)
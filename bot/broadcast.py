@@ -0,0 +1,261 @@
+#broadcast.py
+import asyncio
+import time
+
+from telebot import asyncio_helper
+
+import database.async_broadcast
+import utils.timestamp
+from bot.bot_init import is_telegram_failure
+from utils.config import (
+    BROADCAST_RATE, BROADCAST_BURST, BROADCAST_CHAT_INTERVAL, BROADCAST_BATCH_SIZE, BROADCAST_CONCURRENCY,
+    BROADCAST_MAX_ATTEMPTS, BROADCAST_PROGRESS_INTERVAL
+)
+from utils.logging_utils import backoff_delay, setup_logger
+from utils.rate_limit import ChatSpacing, TokenBucket
+from utils.resilience import CircuitOpenError
+
+logger = setup_logger('broadcast', 'bot.log')
+
+DELIVERED, BLOCKED, FAILED = 'delivered', 'blocked', 'failed'
+
+# Лимит Telegram считается на весь бот, поэтому общий для всех рассылок
+BROADCAST_BUCKET = TokenBucket(BROADCAST_RATE, BROADCAST_BURST)
+CHAT_SPACING = ChatSpacing(BROADCAST_CHAT_INTERVAL)
+
+# Рассылки, которые идут в этом процессе: job_id -> Broadcast
+BROADCASTS = {}
+
+
+def retry_after(e):
+    """
+    Seconds to hold all sends for: retry_after of a 429, or the time left
+    until the Telegram circuit tries again. None for other errors.
+    """
+    if isinstance(e, asyncio_helper.ApiTelegramException) and e.error_code == 429:
+        return float((e.result_json.get('parameters') or {}).get('retry_after', 1))
+    if isinstance(e, CircuitOpenError):
+        return e.retry_after
+    return None
+
+
+def is_blocked(e):
+    """
+    True when the user blocked the bot or deleted the account.
+    """
+    return isinstance(e, asyncio_helper.ApiTelegramException) and e.error_code == 403
+
+
+async def send_with_limits(bot, chat_id, text, bucket, spacing, max_attempts):
+    """
+    Sends text to chat_id within the bucket rate and the per-chat spacing.
+    A 429 pauses the whole bucket for retry_after and the message is sent
+    again; it does not count as an attempt. Outage errors are retried with
+    backoff up to max_attempts. Returns (status, error).
+    """
+    attempt = 0
+    while True:
+        await spacing.wait(chat_id)
+        await bucket.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            return DELIVERED, None
+        except Exception as e:
+            wait = retry_after(e)
+            if wait is not None:
+                bucket.pause(wait)
+                continue
+            if is_blocked(e):
+                return BLOCKED, str(e)
+            attempt += 1
+            if is_telegram_failure(e) and attempt < max_attempts:
+                await asyncio.sleep(backoff_delay(attempt - 1, 1))
+                continue
+            return FAILED, str(e) or type(e).__name__
+
+
+def format_broadcast(job):
+    state = {'running': "идёт", 'finished': "завершена", 'cancelled': "отменена"}[job.status]
+    text = (
+        f"Рассылка {job.job_id}: {state}\n"
+        f"├─ Доставлено: {job.delivered}\n"
+        f"├─ Заблокировали бота: {job.blocked}\n"
+        f"└─ Ошибок: {job.failed}"
+    )
+    if job.status == 'running':
+        text += f"\n\nОтменить: /broadcast cancel {job.job_id}"
+    return text
+
+
+class Broadcast:
+    """
+    One broadcast job running in this process.
+
+    Recipients are read from the DB batch_size at a time in tg_id order and
+    sent to with at most concurrency messages in flight, all under the shared
+    token bucket. After every batch the per-recipient results and the
+    checkpoint are stored together, so a restart repeats at most the batch
+    that was in flight. Progress is edited into a message in the admin chat
+    at most every progress_interval seconds.
+    """
+
+    def __init__(self, job, bot, batch_size=BROADCAST_BATCH_SIZE, concurrency=BROADCAST_CONCURRENCY,
+                 max_attempts=BROADCAST_MAX_ATTEMPTS, progress_interval=BROADCAST_PROGRESS_INTERVAL,
+                 bucket=BROADCAST_BUCKET, spacing=CHAT_SPACING):
+        self.job = job
+        self.bot = bot
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.progress_interval = progress_interval
+        self.bucket = bucket
+        self.spacing = spacing
+        self.cancelled = False
+        self.task = None
+        self._status_message = None
+        self._reported_at = 0.0
+
+    def cancel(self):
+        """
+        Stops the job: messages already being sent finish, no new ones start.
+        """
+        self.cancelled = True
+
+    async def _send(self, tg_id, semaphore):
+        async with semaphore:
+            if self.cancelled:
+                return None
+            status, error = await send_with_limits(self.bot, tg_id, self.job.text, self.bucket, self.spacing,
+                                                   self.max_attempts)
+            return tg_id, status, error
+
+    async def _report(self, force=False):
+        if self.job.admin_chat_id is None:
+            return
+        if not force and time.monotonic() - self._reported_at < self.progress_interval:
+            return
+        self._reported_at = time.monotonic()
+        try:
+            # Сообщения администратору тоже считаются в лимит бота
+            await self.bucket.acquire()
+            text = format_broadcast(self.job)
+            if self._status_message is None:
+                self._status_message = await self.bot.send_message(chat_id=self.job.admin_chat_id, text=text)
+            else:
+                await self.bot.edit_message_text(text, chat_id=self.job.admin_chat_id,
+                                                 message_id=self._status_message.message_id)
+        except Exception as e:
+            logger.warning(f"Failed to report progress of broadcast {self.job.job_id}: {str(e)}")
+
+    async def run(self):
+        """
+        Sends the job to every remaining recipient. Returns the final BroadcastJob.
+        """
+        job_id = self.job.job_id
+        try:
+            await self._report(force=True)
+            while not self.cancelled:
+                recipients = await database.async_broadcast.select_broadcast_recipients(
+                    self.job.where_sql, self.job.params, self.job.last_tg_id, self.batch_size)
+                if not recipients:
+                    break
+                semaphore = asyncio.Semaphore(self.concurrency)
+                results = await asyncio.gather(*(self._send(tg_id, semaphore) for tg_id in recipients))
+                results = [result for result in results if result is not None]
+                if results:
+                    last_tg_id = max(result[0] for result in results)
+                    totals = await database.async_broadcast.record_broadcast_deliveries(
+                        job_id, results, last_tg_id, utils.timestamp.current_timestamp())
+                    self.job = self.job._replace(last_tg_id=last_tg_id, delivered=totals[0], blocked=totals[1],
+                                                 failed=totals[2])
+                logger.info(f"Broadcast {job_id}: {self.job.delivered} delivered, {self.job.blocked} blocked, "
+                            f"{self.job.failed} failed, checkpoint tg_id={self.job.last_tg_id}.")
+                await self._report()
+
+            status = 'cancelled' if self.cancelled else 'finished'
+            finished_at = utils.timestamp.current_timestamp()
+            await database.async_broadcast.finish_broadcast_job(job_id, status, finished_at)
+            self.job = self.job._replace(status=status, finished_at=finished_at)
+            await self._report(force=True)
+            return self.job
+        except Exception as e:
+            logger.error(f"Error in broadcast {job_id}: {str(e)}")
+            raise
+        finally:
+            BROADCASTS.pop(job_id, None)
+
+    def stats(self):
+        return self.job._asdict()
+
+
+def _launch(job, bot, **kwargs):
+    broadcast = Broadcast(job, bot, **kwargs)
+    BROADCASTS[job.job_id] = broadcast
+    broadcast.task = asyncio.create_task(broadcast.run())
+    return broadcast
+
+
+async def start_broadcast(bot, job_id, text, where=None, params=None, admin_chat_id=None, **kwargs):
+    """
+    Creates the job and runs it in the background. Returns the Broadcast;
+    await its task to wait for the end.
+    """
+    job = await database.async_broadcast.start_broadcast_job(
+        job_id, text, where, params, admin_chat_id, utils.timestamp.current_timestamp())
+    if job_id in BROADCASTS:
+        return BROADCASTS[job_id]
+    return _launch(job, bot, **kwargs)
+
+
+async def start_active_broadcast(bot, job_id, text, **kwargs):
+    """
+    Broadcast to users whose subscription has not expired yet.
+    """
+    return await start_broadcast(bot, job_id, text, "date > %s", [utils.timestamp.current_timestamp()], **kwargs)
+
+
+async def resume_broadcast(bot, job_id, **kwargs):
+    """
+    Continues an interrupted job from its checkpoint. Returns None if
+    job_id is unknown, finished or cancelled.
+    """
+    if job_id in BROADCASTS:
+        return BROADCASTS[job_id]
+    job = await database.async_broadcast.select_broadcast_job(job_id)
+    if job is None or job.status != 'running':
+        return None
+    return _launch(job, bot, **kwargs)
+
+
+async def resume_broadcasts(bot, **kwargs):
+    """
+    Restarts every job left running by the previous process.
+    """
+    for job in await database.async_broadcast.select_running_broadcast_jobs():
+        if job.job_id not in BROADCASTS:
+            logger.info(f"Resuming broadcast {job.job_id} from tg_id={job.last_tg_id}.")
+            _launch(job, bot, **kwargs)
+
+
+async def cancel_broadcast(job_id):
+    """
+    Cancels a job. Returns False if it is unknown or already over.
+    """
+    broadcast = BROADCASTS.get(job_id)
+    if broadcast is not None:
+        broadcast.cancel()
+        return True
+    job = await database.async_broadcast.select_broadcast_job(job_id)
+    if job is None or job.status != 'running':
+        return False
+    # Задание осталось от прошлого запуска и сейчас не выполняется
+    await database.async_broadcast.finish_broadcast_job(job_id, 'cancelled', utils.timestamp.current_timestamp())
+    return True
+
+
+def get_broadcast_stats():
+    """
+    Returns the jobs running in this process and the shared rate limiter counters.
+    """
+    return {'jobs': {job_id: broadcast.stats() for job_id, broadcast in BROADCASTS.items()},
+            'bucket': BROADCAST_BUCKET.stats()}
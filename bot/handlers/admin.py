@@ -6,15 +6,23 @@ from telebot import types
 import middleware.connection
 from utils.logging_utils import log_function_call, setup_logger
 import middleware.user
+import middleware.renewal
+import middleware.traffic
+import middleware.reconcile
+import middleware.outbox
+import middleware.reminders
 from bot.handlers.instructions import show_instructions
 from bot.handlers.bonus_payment import prompt_payment_method
 from bot.bot_base_fun import expiry_date_view
+from bot import broadcast as broadcast
+from bot.tasks import monthly_referral_bonus
 from bot.messages import messages
+from utils.timestamp import current_timestamp
 from const.const_bot import (
     TRIAL, MONTH1, MONTH3, MONTH6, YEAR1, DAY_3_TIMESTAMP,
     LOGGER_PRESET, MAIN_MENU
 )
-from bot.bot_init import bot
+from bot.bot_init import bot, UPDATE_SCHEDULER
 from utils.config import BOT_ADMIN_IDS, PHOTO_subscriptions
 
 logger = setup_logger('admin', 'bot.log')
@@ -92,101 +100,335 @@ async def show_photos(message: types.Message):
     await bot.send_message(chat_id=message.chat.id, text=f"Имеются записи:\n\n{full_text}")
         
         
+BROADCAST_USAGE = (
+    "Использование:\n"
+    "/broadcast - идущие рассылки\n"
+    "/broadcast cancel <job_id>\n"
+    "/broadcast resume <job_id>"
+)
+
+
+def broadcast_text(message: types.Message):
+    """
+    Returns the text after the command with its line breaks, or None if there is none.
+    """
+    parts = message.text.split(maxsplit=1)
+    return parts[1] if len(parts) == 2 else None
+
+
 @log_function_call(logger)
 @bot.message_handler(commands=['message'])
 async def send_to_everyone_message(message: types.Message):
     """
-    Admin-only function that sends a message to all users.
+    Admin-only function that starts a background broadcast to all users.
     """
-    args = message.text.split()
-    if len(args) < 2:
+    if message.chat.id not in BOT_ADMIN_IDS:
+        await bot.send_message(chat_id=message.chat.id, text="У вас нет прав для использования этой команды.")
+        return
+
+    text = broadcast_text(message)
+    if text is None:
         await bot.send_message(
             chat_id=message.chat.id,
             text="Использование: /message <сообщение>"
         )
         return
 
-    text = " ".join(args[1:])
-    users = middleware.user.select_all_users()    
-    success_count = 0
-    for user in users:
-        try:
-            await bot.send_message(chat_id=user[0], text=text)
-            success_count += 1
-        except Exception as e:
-            if "Forbidden" in str(e):
-                logger.info(f"Пользователь {user[0]} заблокировал бота.")
-            else:
-                logger.info(f"Ошибка при отправке сообщения пользователю {user[0]}: {e}")
-
-    await bot.send_message(
-        chat_id=message.chat.id,
-        text=f"Сообщение отправлено {success_count} пользователям из {len(users)}."
-    )
+    try:
+        await middleware.connection.login_db()
+        await broadcast.start_broadcast(bot, f"broadcast-{current_timestamp()}", text, admin_chat_id=message.chat.id)
+    except Exception as e:
+        logger.error(f"Error in send_to_everyone_message: {str(e)}")
+        await bot.send_message(chat_id=message.chat.id, text=f"Не удалось запустить рассылку: {str(e)}")
     
 @log_function_call(logger)
 @bot.message_handler(commands=['message_active'])
 async def send_to_active_users_message(message: types.Message):
     """
-    Admin-only function that sends a message to all active users.
+    Admin-only function that starts a background broadcast to all active users.
     """
-    args = message.text.split()
-    if len(args) < 2:
+    if message.chat.id not in BOT_ADMIN_IDS:
+        await bot.send_message(chat_id=message.chat.id, text="У вас нет прав для использования этой команды.")
+        return
+
+    text = broadcast_text(message)
+    if text is None:
         await bot.send_message(
             chat_id=message.chat.id,
             text="Использование: /message_active <сообщение>"
         )
         return
 
-    text = " ".join(args[1:])
-    users = middleware.user.select_all_active_users()
-    for user in users:
-        try:
-            await bot.send_message(chat_id=user[0], text=text)
-        except Exception as e:
-            logger.error(f"Failed to send message to user {user[0]}: {str(e)}")
+    try:
+        await middleware.connection.login_db()
+        await broadcast.start_active_broadcast(bot, f"broadcast-{current_timestamp()}", text,
+                                                   admin_chat_id=message.chat.id)
+    except Exception as e:
+        logger.error(f"Error in send_to_active_users_message: {str(e)}")
+        await bot.send_message(chat_id=message.chat.id, text=f"Не удалось запустить рассылку: {str(e)}")
 
-    await bot.send_message(chat_id=message.chat.id, text=f"Сообщение отправлено всем активным пользователям.\n\n{len(users)}")
+@log_function_call(logger)
+@bot.message_handler(commands=['broadcast'])
+async def manage_broadcasts(message: types.Message):
+    """
+    Admin-only progress, cancellation and resumption of broadcasts.
+    """
+    if message.chat.id not in BOT_ADMIN_IDS:
+        await bot.send_message(chat_id=message.chat.id, text="У вас нет прав для использования этой команды.")
+        return
 
-# @log_function_call(logger) 
-# @bot.message_handler(commands=['renew'])
-# async def renew_subscription(message: types.Message):
-#     args = message.text.split()
+    args = message.text.split()[1:]
+    if not args:
+        stats = broadcast.get_broadcast_stats()
+        lines = [broadcast.format_broadcast(running.job) for running in broadcast.BROADCASTS.values()]
+        bucket = stats['bucket']
+        text = "\n\n".join(lines) if lines else "Рассылок сейчас нет."
+        text += (f"\n\nЛимит: {bucket['rate']:g} сообщений в секунду, отправлено {bucket['acquired']}, "
+                 f"пауз по 429 {bucket['pauses']}")
+        await bot.send_message(chat_id=message.chat.id, text=text)
+        return
+    if len(args) != 2 or args[0] not in ('cancel', 'resume'):
+        await bot.send_message(chat_id=message.chat.id, text=BROADCAST_USAGE)
+        return
 
-#     chat_id = args[1]
-#     period = args[2]
-#     my_tg_id = message.chat.id
-#     username = message.from_user.username
+    job_id = args[1]
+    try:
+        await middleware.connection.login_db()
+        if args[0] == 'cancel':
+            found = await broadcast.cancel_broadcast(job_id)
+            text = f"Рассылка {job_id} отменяется." if found else f"Идущей рассылки {job_id} нет."
+        else:
+            found = await broadcast.resume_broadcast(bot, job_id)
+            text = f"Рассылка {job_id} продолжается." if found else f"Незавершённой рассылки {job_id} нет."
+    except Exception as e:
+        logger.error(f"Error in manage_broadcasts: {str(e)}")
+        text = f"Не удалось выполнить: {str(e)}"
+    await bot.send_message(chat_id=message.chat.id, text=text)
 
-#     try:
-        
-#         # Разделяем текст сообщения по пробелам        
-#         # Проверяем, что пользователь передал достаточно аргументов
-#         if len(args) < 3:
-#             await bot.send_message(
-#                 chat_id=message.chat.id, 
-#                 text="Использование: /renew <tg_id> <period>"
-#             )
-#             return
-        
-#         middleware.connection.login_3x()
-#         middleware.connection.login_db()
+@log_function_call(logger)
+@bot.message_handler(commands=['bonus_dry_run'])
+async def referral_bonus_dry_run(message: types.Message):
+    """
+    Admin-only function that reports what the monthly referral bonus would credit now.
+    """
+    if message.chat.id not in BOT_ADMIN_IDS:
+        await bot.send_message(chat_id=message.chat.id, text="У вас нет прав для использования этой команды.")
+        return
 
-#         data = middleware.user.create_or_update_user(chat_id, period, username)
+    summary = await monthly_referral_bonus(dry_run=True)
+    if not summary:
+        await bot.send_message(chat_id=message.chat.id, text="Не удалось посчитать бонусы, подробности в логах.")
+        return
 
-#         text2 = await expiry_date_view("expiration", chat_id)
-#         await bot.send_message(chat_id=chat_id, text=text2, parse_mode='Markdown')
+    await bot.send_message(
+        chat_id=message.chat.id,
+        text=(
+            f"Пробный расчёт бонусов за {summary['period']}:\n"
+            f"├─ Рефереров: {summary['referrers']}\n"
+            f"├─ Активных рефералов: {summary['active_users']}\n"
+            f"├─ Всего коинов: {summary['total']}\n"
+            f"└─ Время расчёта: {summary['elapsed']:.3f} с"
+        )
+    )
 
-        
-#         text1 = f'🔑 {messages.get_random_message("trial_subscription")}'
-#         await bot.send_message(
-#             chat_id=chat_id,
-#             text=f'{text1}\n```{data}```',
-#             parse_mode='Markdown'
-#         )
-
-#         logger.info(f"Trial subscription granted to user {chat_id}.")
-
-#     except Exception as e:
-#         logger.error(f"Error in get_trial: {str(e)}")
-#         raise
\ No newline at end of file
+@log_function_call(logger)
+@bot.message_handler(commands=['cache_stats'])
+async def cache_stats(message: types.Message):
+    """
+    Admin-only function that reports user cache, connection pool, panel,
+    outbox, reminder, executor and circuit breaker counters.
+    """
+    if message.chat.id not in BOT_ADMIN_IDS:
+        await bot.send_message(chat_id=message.chat.id, text="У вас нет прав для использования этой команды.")
+        return
+
+    stats = middleware.connection.get_db_stats()
+    cache, pool, tunnel, panels = stats['cache'], stats['pool'], stats['tunnel'], stats['panels']
+    text = (
+        f"Кэш пользователей:\n"
+        f"├─ Записей: {cache['size']} из {cache['maxsize']}\n"
+        f"├─ Попаданий: {cache['hits']}, промахов: {cache['misses']} ({cache['hit_rate']:.1%})\n"
+        f"└─ Вытеснено: {cache['evictions']}, сброшено: {cache['invalidations']}"
+    )
+    if pool is not None:
+        text += f"\n\nПул соединений: {pool['in_use']} занято, {pool['idle']} свободно из {pool['size']}"
+    if tunnel is not None:
+        state = "работает" if tunnel['alive'] else "недоступен"
+        text += f"\nSSH-туннель: {state}, порт {tunnel['local_port']}, переподключений: {tunnel['reconnects']}"
+    for name, panel in (panels or {}).items():
+        text += f"\n3X-UI {name}: клиентов {panel['load']} из {panel['capacity']}"
+        if panel['session'] is not None:
+            text += f", входов {panel['session']['logins']}, повторных входов {panel['session']['relogins']}"
+    try:
+        outbox = await middleware.outbox.get_outbox_stats()
+        text += (f"\n\nOutbox 3X-UI: ожидают {outbox['pending']} (к отправке {outbox['due']}), "
+                 f"отказов {outbox['dead']}, доставлено {outbox['delivered']}, повторов {outbox['retried']}")
+    except Exception as e:
+        logger.error(f"Failed to read outbox stats: {str(e)}")
+    updates = UPDATE_SCHEDULER.stats()
+    text += (f"\n\nОбновления: {updates['running']} в работе из {updates['workers']}, в очереди {updates['queued']} "
+             f"в {updates['chats']} чатах, обработано {updates['processed']}, ошибок {updates['failed']}")
+    if middleware.reminders.REMINDERS is not None:
+        reminders = middleware.reminders.REMINDERS.stats()
+        text += (f"\nНапоминания: в очереди {reminders['queued']}, отправлено {reminders['sent']}, "
+                 f"пропущено {reminders['skipped']}, загрузок окна {reminders['loads']}")
+    if stats['executors']:
+        text += "\n\nПотоки для блокирующих вызовов:"
+    for name, bridge in stats['executors'].items():
+        text += (f"\n{name}: {bridge['active']} из {bridge['workers']} заняты, в очереди {bridge['queued']}, "
+                 f"ожидание {bridge['wait_ms_avg']:.1f} мс (p95 {bridge['wait_ms_p95']:.1f}, макс {bridge['wait_ms_max']:.1f})")
+    if stats['breakers']:
+        text += "\n\nПредохранители:"
+        for name, breaker in stats['breakers'].items():
+            text += f"\n{name}: {breaker['state']}, открывался {breaker['opened']} раз, отклонено {breaker['rejected']}"
+    await bot.send_message(chat_id=message.chat.id, text=text)
+
+@log_function_call(logger)
+@bot.message_handler(commands=['traffic'])
+async def traffic_stats(message: types.Message):
+    """
+    Admin-only traffic report from the synced cache:
+    /traffic - top clients, /traffic <tg_id|email> - one client.
+    """
+    if message.chat.id not in BOT_ADMIN_IDS:
+        await bot.send_message(chat_id=message.chat.id, text="У вас нет прав для использования этой команды.")
+        return
+
+    fmt = middleware.traffic.format_bytes
+    stats = middleware.traffic.get_traffic_stats()
+    if stats['synced_at'] is None:
+        await bot.send_message(chat_id=message.chat.id, text="Трафик ещё не синхронизирован с 3X-UI.")
+        return
+
+    args = message.text.split()[1:]
+    if args:
+        email = args[0]
+        if email.isdigit():
+            await middleware.connection.login_db()
+            snapshot = await middleware.user.get_user_snapshot(int(email))
+            email = snapshot.email
+        traffic = middleware.traffic.get_traffic(email)
+        if traffic is None:
+            await bot.send_message(chat_id=message.chat.id, text=f"Клиент {args[0]} не найден в 3X-UI.")
+            return
+        text = (
+            f"{traffic.email} ({traffic.uuid})\n"
+            f"├─ ↑ {fmt(traffic.up)}, ↓ {fmt(traffic.down)}, всего {fmt(traffic.up + traffic.down)}\n"
+            f"├─ Включён: {'да' if traffic.enable else 'нет'}\n"
+            f"└─ Онлайн: {'да' if traffic.online else 'нет'}"
+        )
+    else:
+        lines = [f"{row.email}: {fmt(row.up + row.down)}{' 🟢' if row.online else ''}" for row in middleware.traffic.top_traffic()]
+        text = (
+            f"Клиентов: {stats['clients']}, онлайн: {stats['online']}\n"
+            f"Синхронизаций: {stats['syncs']}, ошибок: {stats['sync_errors']}\n\n" + "\n".join(lines)
+        )
+    await bot.send_message(chat_id=message.chat.id, text=text)
+
+
+@log_function_call(logger)
+@bot.message_handler(commands=['reconcile'])
+async def reconcile_panels(message: types.Message):
+    """
+    Admin-only comparison of the users table with the 3X-UI clients:
+    /reconcile - report only, /reconcile repair - also fix the drift.
+    """
+    if message.chat.id not in BOT_ADMIN_IDS:
+        await bot.send_message(chat_id=message.chat.id, text="У вас нет прав для использования этой команды.")
+        return
+
+    repair = message.text.split()[1:] == ['repair']
+    await bot.send_message(chat_id=message.chat.id, text="Сверка запущена...")
+    try:
+        await middleware.connection.login_db()
+        report = await middleware.reconcile.reconcile(repair_drift=repair)
+    except Exception as e:
+        logger.error(f"Error in reconcile_panels: {str(e)}")
+        await bot.send_message(chat_id=message.chat.id, text=f"Сверка прервана: {str(e)}")
+        return
+
+    summary = report.summary()
+    text = (
+        f"Пользователей: {summary['users']}, клиентов в 3X-UI: {summary['panel_clients']}\n"
+        f"├─ Нет клиента на панели: {summary['missing']}\n"
+        f"├─ Другая дата окончания: {summary['expiry_mismatch']}\n"
+        f"├─ Другой email: {summary['email_mismatch']}\n"
+        f"├─ Клиент на другой панели: {summary['wrong_panel']}\n"
+        f"└─ Клиентов без пользователя: {summary['orphaned']}"
+    )
+    if repair:
+        text += f"\n\nИсправлено: {summary['repaired']}, ошибок: {summary['repair_failed']}"
+    elif report.drift:
+        text += "\n\nИсправить: /reconcile repair"
+    await bot.send_message(chat_id=message.chat.id, text=text)
+
+
+RENEW_PERIODS = ('day3', 'month1', 'month3', 'month6', 'year1')
+RENEW_USAGE = (
+    "Использование:\n"
+    "/renew <period> <tg_id> [tg_id ...]\n"
+    "/renew <period> active|all\n"
+    "/renew resume <run_id>\n"
+    f"period: {', '.join(RENEW_PERIODS)}"
+)
+
+
+def format_renewal_run(run):
+    state = "завершено" if run.finished_at is not None else f"контрольная точка tg_id={run.last_tg_id}"
+    return (f"Продление {run.run_id} ({run.period}): продлено {run.renewed}, ошибок {run.failed}, "
+            f"дата изменилась во время продления {run.conflicts}, {state}")
+
+
+@log_function_call(logger)
+@bot.message_handler(commands=['renew'])
+async def renew_subscriptions(message: types.Message):
+    """
+    Admin-only bulk renewal: extends the given users, all active users or
+    every user by a period, and can resume an interrupted run.
+    """
+    if message.chat.id not in BOT_ADMIN_IDS:
+        await bot.send_message(chat_id=message.chat.id, text="У вас нет прав для использования этой команды.")
+        return
+
+    args = message.text.split()[1:]
+    if len(args) == 2 and args[0] == 'resume':
+        valid = True
+    else:
+        target = args[1:]
+        valid = (len(args) >= 2 and args[0] in RENEW_PERIODS
+                 and (target in (['active'], ['all']) or all(item.isdigit() for item in target)))
+    if not valid:
+        await bot.send_message(chat_id=message.chat.id, text=RENEW_USAGE)
+        return
+
+    run_id = args[1] if args[0] == 'resume' else f"renew-{current_timestamp()}"
+    status = await bot.send_message(chat_id=message.chat.id, text=f"Продление {run_id} запущено...")
+
+    async def progress(run):
+        try:
+            await bot.edit_message_text(format_renewal_run(run), chat_id=message.chat.id, message_id=status.message_id)
+        except Exception as e:
+            logger.warning(f"Failed to report renewal progress: {str(e)}")
+
+    try:
+        await middleware.connection.login_db()
+        if args[0] == 'resume':
+            run = await middleware.renewal.resume_renewal(run_id, progress=progress)
+            if run is None:
+                await bot.send_message(chat_id=message.chat.id, text=f"Запуск {run_id} не найден.")
+                return
+        else:
+            period, target = args[0], args[1:]
+            if target == ['active']:
+                run = await middleware.renewal.renew_active_users(run_id, period, progress=progress)
+            elif target == ['all']:
+                run = await middleware.renewal.renew_users(run_id, period, progress=progress)
+            else:
+                run = await middleware.renewal.renew_tg_ids(run_id, period, [int(item) for item in target], progress=progress)
+        await bot.send_message(chat_id=message.chat.id, text=format_renewal_run(run))
+    except Exception as e:
+        logger.error(f"Error in renew_subscriptions: {str(e)}")
+        await bot.send_message(
+            chat_id=message.chat.id,
+            text=f"Продление прервано: {str(e)}\nПродолжить: /renew resume {run_id}"
+        )
@@ -5,7 +5,8 @@ from utils.logging_utils import log_function_call, setup_logger
 from bot.bot_init import bot
 from bot.handlers.payments import buy
 from const.const_bot import PAYMENT_STATE, MINMUM_BONUS_PAYMENT
-from bot.bot_base_fun import remove_message
+from bot.bot_base_fun import remove_message, release_bonus_reservation
+import middleware.balance
 import middleware.referrals
 
 logger = setup_logger('bonus_payment', 'bot.log')
@@ -18,6 +19,7 @@ async def prompt_payment_method(call, product):
         chat_id = call.message.chat.id
 
         if chat_id in PAYMENT_STATE:
+            await release_bonus_reservation(chat_id)
             old_invoice = PAYMENT_STATE[chat_id].get("invoice_msg_id")
             if old_invoice:
                 await remove_message(chat_id, old_invoice)
@@ -37,10 +39,11 @@ async def prompt_payment_method(call, product):
             "invoice_msg_id": None,
             "choose_payment_method_id": None,
             "invoice_created_at": time.time(),
-            "payload": product["payload"]
+            "payload": product["payload"],
+            "reservation_id": None
         }
 
-        balance = middleware.referrals.get_balance(chat_id)
+        balance = await middleware.referrals.get_balance(chat_id)
 
         text = (
             f"{product['label']}\n"
@@ -92,6 +95,8 @@ async def callback_choose_payment_method(call):
                 user_state["invoice_msg_id"] = None
         except Exception as e:
             logger.error(f"Error removing messages: {str(e)}")
+        # Старый счёт удалён, его резерв больше не нужен
+        await release_bonus_reservation(chat_id)
 
         if call.data == "pay_full":
             user_state["state"] = "WAITING_PAYMENT"
@@ -102,7 +107,7 @@ async def callback_choose_payment_method(call):
             user_state["state"] = "CHOOSE_BONUS_AMOUNT"
             
             full_price = user_state.get("full_price")//100
-            balance = middleware.referrals.get_balance(chat_id)
+            balance = await middleware.referrals.get_balance(chat_id)
             max_bonus_to_pay = full_price - MINMUM_BONUS_PAYMENT
             if max_bonus_to_pay > balance:
                 max_bonus_to_pay = balance
@@ -151,6 +156,7 @@ async def bonus_input_handler(message):
                     await remove_message(chat_id, invoice_msg_id)
             except Exception as e:
                 logger.error(f"Error removing messages: {str(e)}")
+            await release_bonus_reservation(chat_id)
             PAYMENT_STATE.pop(chat_id, None)
             logger.info(f"User {chat_id} sent invalid input. Payment state cleared.")
             await bot.send_message(chat_id=chat_id, text="Вы ввели некорректное значение. Сессия оплаты сброшена.")
@@ -162,13 +168,14 @@ async def bonus_input_handler(message):
                     await remove_message(chat_id, invoice_msg_id)
             except Exception as e:
                 logger.error(f"Error removing invoice message: {str(e)}")
+            await release_bonus_reservation(chat_id)
             PAYMENT_STATE.pop(chat_id, None)
             logger.info(f"User {chat_id} sent input while WAITING_PAYMENT. Payment state cleared.")
             await bot.send_message(chat_id=chat_id, text="Счёт аннулирован. Повторите покупку заново.")
             return
 
         bonus_requested = int(message.text.strip())
-        balance = middleware.referrals.get_balance(chat_id)
+        balance = await middleware.referrals.get_balance(chat_id)
         price_to_pay = full_price//100 - bonus_requested
         
         if bonus_requested > balance:
@@ -181,6 +188,15 @@ async def bonus_input_handler(message):
             logger.info(f"User {chat_id} tried to pay less than minimum. Minimum: {bonus_requested}.")
             return
 
+        if bonus_requested > 0:
+            # Резерв атомарно проверяет доступный остаток: два счёта не потратят одни и те же коины
+            reservation_id = await middleware.balance.reserve_bonus(chat_id, bonus_requested)
+            if reservation_id is None:
+                await bot.send_message(chat_id=chat_id, text="У вас недостаточно бонусов. Введите меньшее число.")
+                logger.info(f"User {chat_id} could not reserve {bonus_requested} bonuses.")
+                return
+            st["reservation_id"] = reservation_id
+
         st["bonus_input"] = bonus_requested
         st["state"] = "WAITING_PAYMENT"
         await send_invoice_with_bonus(message)
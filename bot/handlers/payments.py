@@ -2,13 +2,15 @@
 from telebot.types import LabeledPrice
 import middleware.connection
 import middleware.user
+import middleware.referrals
+import middleware.balance
 from bot.handlers.instructions import show_instructions
 from bot.messages import messages
 from bot.bot_init import bot
 from const.const_bot import CURRENCY, HANDLERS_JSON_PATH, LOGGER_PRESET, PAYMENT_STATE
 from utils import json_fun
 from utils.logging_utils import retry_on_error, log_function_call, setup_logger
-from bot.bot_base_fun import remove_message, expiry_date_view
+from bot.bot_base_fun import remove_message, expiry_date_view, release_bonus_reservation
 from utils.config import BOT_TEST_PROVIDER_TOKEN
 
 logger = setup_logger('payments', 'bot.log')
@@ -55,6 +57,16 @@ async def process_pre_checkout_query(pre_checkout_query):
     Confirms the checkout query before finalizing payment.
     """
     try:
+        tg_id = pre_checkout_query.from_user.id
+        reservation_id = PAYMENT_STATE.get(tg_id, {}).get("reservation_id")
+        if reservation_id and not await middleware.balance.hold_reservation(reservation_id):
+            await bot.answer_pre_checkout_query(
+                pre_checkout_query.id,
+                ok=False,
+                error_message="❌ Бонусы для этого счёта уже недоступны. Пожалуйста, оформите покупку заново 😿"
+            )
+            logger.info(f"Pre-checkout rejected for tg_id={tg_id}: reservation {reservation_id} is gone.")
+            return
         await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
         logger.info("Pre-checkout query answered with OK=True.")
     except Exception as e:
@@ -84,10 +96,12 @@ async def successful_payment(message):
             logger.error(f"Error retrieving payment information for tg_id={tg_id}: {str(e)}")
             raise
 
+        invoice_msg_id, bonus_input, reservation_id = None, 0, None
         try:
             if tg_id in PAYMENT_STATE:
                 invoice_msg_id = PAYMENT_STATE[tg_id]["invoice_msg_id"]
                 bonus_input = PAYMENT_STATE[tg_id]["bonus_input"]
+                reservation_id = PAYMENT_STATE[tg_id].get("reservation_id")
         except KeyError as e:
             logger.error(f"Error accessing PAYMENT_STATE for tg_id={tg_id}: {str(e)}")
 
@@ -99,7 +113,13 @@ async def successful_payment(message):
 
         if bonus_input > 0:
             try:
-                middleware.referrals.update_balance(tg_id, -bonus_input)
+                reference = payment_info.telegram_payment_charge_id
+                committed = None
+                if reservation_id:
+                    committed = await middleware.balance.commit_reservation(reservation_id, reference)
+                if committed is None:
+                    # Резерв уже отпущен, а счёт со скидкой оплачен: списываем напрямую
+                    await middleware.referrals.update_balance(tg_id, -bonus_input, kind='payment', reference=reference)
                 logger.info(f"Deducted {bonus_input} bonuses from user {tg_id}")
             except Exception as e:
                 logger.error(f"Error deducting bonuses for tg_id={tg_id}: {str(e)}")
@@ -147,6 +167,7 @@ async def unsuccessful_payment(message):
                 await remove_message(tg_id, invoice_msg_id)
             except Exception as e:
                 logger.error(f"Error removing message with invoice_msg_id={invoice_msg_id} for tg_id={tg_id}: {str(e)}")
+        await release_bonus_reservation(tg_id)
         PAYMENT_STATE.pop(tg_id, None)
 
         await bot.send_message(
@@ -173,14 +194,14 @@ async def give_subscription(message, period):
     tg_id = message.chat.id
 
     try:
-        middleware.connection.login_3x()
-        middleware.connection.login_db()
+        await middleware.connection.login_db()
     except Exception as e:
         logger.error(f"Error during login_db for tg_id={tg_id}: {str(e)}")
         raise
 
     try:
-        user_exists = middleware.user.get_user_exists_in_user(tg_id)
+        # Вход в 3X-UI не нужен: сессия сама перелогинится при истёкшей cookie
+        user_exists = await middleware.user.get_user_exists_in_user(tg_id)
     except Exception as e:
         logger.error(f"Error checking if user exists for tg_id={tg_id}: {str(e)}")
         raise
@@ -188,7 +209,7 @@ async def give_subscription(message, period):
     if user_exists:
         try:
             logger.info(f"Updating existing user tg_id={tg_id}.")
-            middleware.user.create_or_update_user(tg_id, period, message.from_user.username)
+            await middleware.user.create_or_update_user(tg_id, period, message.from_user.username)
         except Exception as e:
             logger.error(f"Error updating user tg_id={tg_id}: {str(e)}")
             raise
@@ -209,7 +230,7 @@ async def give_subscription(message, period):
     else:
         try:
             logger.info(f"Creating new user tg_id={tg_id}.")
-            data = middleware.user.create_or_update_user(tg_id, period, message.from_user.username)
+            data = await middleware.user.create_or_update_user(tg_id, period, message.from_user.username)
         except Exception as e:
             logger.error(f"Error creating user tg_id={tg_id}: {str(e)}")
             raise
@@ -2,7 +2,8 @@
 from telebot import types
 import middleware.connection
 import middleware.user
-from bot.bot_base_fun import expiry_date_view
+import middleware.traffic
+from bot.bot_base_fun import expiry_date_view, traffic_view
 from bot.handlers.subscriptions import show_subscription_options
 from bot.bot_init import bot
 from bot.messages import messages
@@ -24,11 +25,15 @@ async def show_profile_options(call):
     chat_id = call.message.chat.id
 
     try:
-        middleware.connection.login_db()
-        exists = middleware.user.get_user_exists_in_user(chat_id)
+        await middleware.connection.login_db()
+        snapshot = await middleware.user.get_user_snapshot(chat_id)
 
-        if exists:
-            text = await expiry_date_view("expiration", chat_id)
+        if snapshot.exists_in_users:
+            text = await expiry_date_view("expiration", chat_id, snapshot.date)
+            # Трафик берётся из кэша, который обновляет фоновая синхронизация
+            traffic = middleware.traffic.get_traffic(snapshot.email)
+            if traffic is not None:
+                text += f'\n\n{traffic_view(traffic)}'
         else:
             text = messages.get_random_message('profile_options')
 
@@ -72,11 +77,12 @@ async def get_vless(call):
     chat_id = call.message.chat.id
     
     try:
-        middleware.connection.login_db()
-        if middleware.user.get_user_exists_in_user(chat_id):
+        await middleware.connection.login_db()
+        snapshot = await middleware.user.get_user_snapshot(chat_id)
+        if snapshot.exists_in_users:
             logger.info(f"User {username} found in DB.")
             
-            data = middleware.user.send_vless(chat_id)
+            data = snapshot.vless_profile
             text = f'🔑 {messages.get_random_message("vless_profile")}'
             await bot.send_message(chat_id=chat_id, text=f'{text}\n```{data}```', parse_mode='Markdown')
             
@@ -2,6 +2,7 @@
 from telebot import types
 import middleware.connection
 import middleware.referrals
+import middleware.user
 from bot.messages import messages
 from bot.bot_init import bot
 from const.const_bot import (
@@ -66,14 +67,14 @@ async def referral_info(call):
     chat_id = call.message.chat.id
 
     try:
-        middleware.connection.login_db()
+        await middleware.connection.login_db()
         
-        num_of_users = middleware.referrals.select_active_users_by_referrer(chat_id)
+        num_of_users = await middleware.referrals.select_active_users_by_referrer(chat_id)
         if not num_of_users:
             num = 0
         else:
             num = len(num_of_users)
-        balance = middleware.referrals.get_balance(chat_id)
+        balance = await middleware.referrals.get_balance(chat_id)
         
         text = messages.get_random_message('referral_info')
         formatted_text = text.format(num_of_users=num, balance=balance, bonus=MEOW_COINS_REFERRER_BONUS*num)
@@ -125,10 +126,11 @@ async def referrals_start(message, referral_code):
     username = message.from_user.username
     chat_id = message.chat.id
     try:
-        middleware.connection.login_db()
-        exists_in_users = middleware.user.get_user_exists_in_user(chat_id)
-        exists_in_referrals = middleware.referrals.select_user_exists(chat_id)
-        code_applied = middleware.referrals.get_refferer(chat_id)
+        await middleware.connection.login_db()
+        snapshot = await middleware.user.get_user_snapshot(chat_id)
+        exists_in_users = snapshot.exists_in_users
+        exists_in_referrals = snapshot.exists_in_referrals
+        code_applied = snapshot.referrer_tg_id is not None
     except Exception as e:
         logger.error(f"Error checking user existence for chat_id={chat_id}: {str(e)}")
         raise
@@ -140,7 +142,7 @@ async def referrals_start(message, referral_code):
             if ref_code_length > 1:
                 # Ensure referral record
                 try:
-                    approved = middleware.referrals.ensure_referral_record(chat_id, referral_code[1])
+                    approved = await middleware.referrals.ensure_referral_record(chat_id, referral_code[1])
                 except Exception as e:
                     logger.error(f"Unexpected error ensuring referral record for chat_id={chat_id}: {str(e)}")
                     raise
@@ -151,7 +153,7 @@ async def referrals_start(message, referral_code):
                     if not exists_in_referrals or (exists_in_referrals and not code_applied):
                         logger.info(f"User does not exist and is using referral code: {code}")
                         try:
-                            middleware.referrals.insert_update_referrer(chat_id, code)
+                            await middleware.referrals.insert_update_referrer(chat_id, code)
                         except Exception as e:
                             logger.error(f"Error inserting/updating referrer for chat_id={chat_id} with code={code}: {str(e)}")
                             raise
@@ -159,7 +161,9 @@ async def referrals_start(message, referral_code):
                         user_text = messages.get_random_message('referral_code_activated')
 
                         try:
-                            middleware.referrals.update_balance(chat_id, MEOW_COINS_FIRST_USE_REF_CODE)
+                            await middleware.referrals.update_balance(
+                                chat_id, MEOW_COINS_FIRST_USE_REF_CODE, kind='referral_code', reference='first_use'
+                            )
                             logger.info(f"Referral code activated: {code} for chat_id={chat_id}")
                         except Exception as e:
                             logger.error(f"Error updating balance for chat_id={chat_id} with referral_code={code}: {str(e)}")
@@ -168,7 +172,7 @@ async def referrals_start(message, referral_code):
                     else:
                         logger.info(f"User exists and is using referral code: {code}")
                         try:
-                            middleware.referrals.insert_update_referrer(chat_id, code)
+                            await middleware.referrals.insert_update_referrer(chat_id, code)
                         except Exception as e:
                             logger.error(f"Error updating referrer for chat_id={chat_id} with code={code}: {str(e)}")
                             raise
@@ -201,7 +205,7 @@ async def referrals_start(message, referral_code):
 async def inser_user_referrals(chat_id, exists_in_referrals):
     if not exists_in_referrals:
         try:
-            middleware.referrals.insert_user_referrals(chat_id)
+            await middleware.referrals.insert_user_referrals(chat_id)
             logger.info(f"Inserted user into referrals without a referrer code for chat_id={chat_id}.")
         except Exception as e:
             logger.error(f"Error inserting user into referrals for chat_id={chat_id}: {str(e)}")
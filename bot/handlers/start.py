@@ -17,7 +17,7 @@ from const.const_bot import (
     PHOTO_PATH, LOGGER_PRESET, PAYMENT_STATE, SUBSCRIPTIONS
 )
 from utils.logging_utils import log_function_call, setup_logger
-from bot.bot_base_fun import remove_message
+from bot.bot_base_fun import remove_message, release_bonus_reservation
 from utils.config import PHOTO_menu
 
 logger = setup_logger('start', 'bot.log')
@@ -107,6 +107,7 @@ async def handle_menu_callback(call):
                 if invoice_msg_id:
                     await remove_message(tg_id, invoice_msg_id)
                     PAYMENT_STATE[tg_id]["invoice_msg_id"] = None
+                    await release_bonus_reservation(tg_id)
                     logger.info(f"Invoice {invoice_msg_id} removed because user pressed any inline button.")
 
                 old_prompt = PAYMENT_STATE[tg_id].get("choose_payment_method_id")
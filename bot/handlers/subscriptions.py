@@ -26,12 +26,12 @@ async def get_trial(call):
     chat_id = call.message.chat.id
 
     try:
-        middleware.connection.login_3x()
-        middleware.connection.login_db()
+        await middleware.connection.login_db()
 
-        if not middleware.user.get_user_exists_in_user(chat_id):
-            data = middleware.user.create_or_update_user(chat_id, DAY_3_TIMESTAMP, username)
-            middleware.user.insert_trial_date(chat_id)
+        snapshot = await middleware.user.get_user_snapshot(chat_id)
+        if not snapshot.exists_in_users:
+            data = await middleware.user.create_or_update_user(chat_id, DAY_3_TIMESTAMP, username)
+            await middleware.user.insert_trial_date(chat_id)
 
             text2 = await expiry_date_view("trial_expiration", chat_id)
             await bot.send_message(chat_id=chat_id, text=text2, parse_mode='Markdown')
@@ -64,12 +64,12 @@ async def show_subscription_options(call):
     chat_id = call.message.chat.id
 
     try:
-        middleware.connection.login_db()
-        exists = middleware.user.get_user_exists_in_user(chat_id)
+        await middleware.connection.login_db()
+        snapshot = await middleware.user.get_user_snapshot(chat_id)
         text2 = messages.get_random_message('subscription_select')
 
         markup = types.InlineKeyboardMarkup(row_width=1)
-        if not exists:
+        if not snapshot.exists_in_users:
             btn_trial = types.InlineKeyboardButton(text=TRIAL, callback_data='sub_trial')
             markup.add(btn_trial)
 
@@ -1,15 +1,19 @@
 #tasks.py
 import asyncio
+import time
 from telebot import types
 import middleware.user
+import middleware.balance
+import middleware.traffic
+import middleware.reconcile
+import middleware.reminders
 from datetime import datetime, timedelta
 from bot.bot_init import bot
-from database.user import select_all_users
 from utils import timestamp
 from utils.logging_utils import setup_logger, log_function_call
-import database.referrals
-import database.user
+import database.async_referrals
 from bot.bot_base_fun import expiry_date_view
+from utils.config import TRAFFIC_SYNC_INTERVAL
 import const.const_bot  # где лежит MEOW_COINS_REFERRER_BONUS (или любое другое значение)
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -22,7 +26,7 @@ from apscheduler.triggers.interval import IntervalTrigger
 logger = setup_logger('tasks', 'bot.log')
 
 @log_function_call(logger)
-async def send_reminer_button(tg_id):
+async def send_reminer_button(tg_id, date_ts=None):
     """
     Sends a reminder button to user.
     """
@@ -30,7 +34,7 @@ async def send_reminer_button(tg_id):
         markup = types.InlineKeyboardMarkup()
         btn_renew = types.InlineKeyboardButton(text="🆙 Обновить подписку", callback_data="profile_subscriptions")
         markup.add(btn_renew)
-        text = await expiry_date_view("renewal_reminder", tg_id)
+        text = await expiry_date_view("renewal_reminder", tg_id, date_ts)
 
         await bot.send_message(chat_id=tg_id, text=text, parse_mode='Markdown', reply_markup=markup)
 
@@ -41,89 +45,93 @@ async def send_reminer_button(tg_id):
 @log_function_call(logger)
 async def reminder_task():
     """
-    Background task that checks expiring subscriptions and reminds users to renew.
+    Background task that reminds users to renew at the configured offsets before expiry.
     """
-    while True:
-        await asyncio.sleep(3540)
-        try:
-            boundary_ts_minus_hour, boundary_ts = timestamp.get_timestamp_with_reminder_time()
-            users = select_all_users()
-
-            for user in users:
-                tg_id = user[0]
-                expiry_ts = user[3]
-                if boundary_ts_minus_hour < expiry_ts <= boundary_ts:
-                    await send_reminer_button(tg_id)
-                    logger.info(f"Renewal reminder sent to tg_id={tg_id}.")
-        except Exception as e:
-            logger.error(f"Error in reminder_task: {str(e)}")
+    try:
+        await middleware.reminders.reminder_worker(send_reminer_button)
+    except Exception as e:
+        logger.error(f"Error in reminder_task: {str(e)}")
+        raise
 
 
 
 THREE_DAYS_MS = 3 * 24 * 60 * 60 * 1000  # 3 дня в миллисекундах
 
 @log_function_call(logger)
-def monthly_referral_bonus():
+async def monthly_referral_bonus(dry_run=False):
     """
-    Function to credit bonuses to referrers for each active user.
+    Credits bonuses to referrers for each active user.
     A user is NOT considered active if the difference (date - trial_date) <= 3 days.
+    Eligibility is computed by one set-based query and all balances are credited
+    in a single transaction, recorded per period in referral_bonus_runs/ledger,
+    so a rerun for the same month never credits twice.
+    With dry_run=True only reports what would be credited.
     Called at the beginning of the month (or according to your schedule).
     """
-    logger.info("Starting monthly referral bonus credits")
+    logger.info(f"Starting monthly referral bonus credits (dry_run={dry_run})")
+    started = time.perf_counter()
+    period = timestamp.current_time().strftime('%Y-%m')
+    summary = {'period': period, 'dry_run': dry_run, 'already_credited': False,
+               'referrers': 0, 'active_users': 0, 'total': 0, 'elapsed': 0.0}
 
     try:
-        referrals_info = database.referrals.select_all_referrals_with_every_user()
-        logger.info(f"Total referrers in the system: {len(referrals_info)}")
-
         now_ts = timestamp.current_timestamp()
-        total_bonuses_given = 0
-
-        for row in referrals_info:
-            if not row:
-                continue
-            referrer_tg_id = row[0]
-            referred_users = row[1] or []
-
-            # Count how many users are considered "active" and "not trial"
-            active_valid_users_count = 0
-
-            for user_tg_id in referred_users:
-                # Get the subscription end date (date) and the trial start date (trial_date)
-                user_date = database.user.select_user_date(user_tg_id)       # returns int or None
-                user_trial_date = database.user.select_trial_date(user_tg_id)  # also int or None
-
-                # If there is no subscription at all:
-                if not user_date:
-                    continue
-
-                # If the subscription (date) has already expired:
-                if user_date <= now_ts:
-                    continue
-
-                # If the user has a trial_date, check the difference
-                # If (date - trial_date) <= THREE_DAYS_MS -> user remained on trial
-                if user_trial_date and (user_date - user_trial_date) <= THREE_DAYS_MS:
-                    continue
-
-                # Otherwise, the user is active and not on trial
-                active_valid_users_count += 1
-
-            # Credit the bonus if applicable
-            if active_valid_users_count > 0:
-                # Suppose, for each active paid user, the referrer receives MEOW_COINS_REFERRER_BONUS
-                bonus_amount = active_valid_users_count * const.const_bot.MEOW_COINS_REFERRER_BONUS
-                database.referrals.update_balance(referrer_tg_id, bonus_amount)
-                logger.info(
-                    f"Referrer {referrer_tg_id} credited {bonus_amount} coins "
-                    f"for {active_valid_users_count} active users."
-                )
-                total_bonuses_given += bonus_amount
-
-        logger.info(f"Bonus credits completed. Total credited: {total_bonuses_given} coins.")
+        bonus = const.const_bot.MEOW_COINS_REFERRER_BONUS
+
+        if dry_run:
+            rows = await database.async_referrals.select_monthly_bonus_preview(now_ts, THREE_DAYS_MS, bonus)
+        else:
+            rows = await database.async_referrals.credit_monthly_bonus(period, now_ts, THREE_DAYS_MS, bonus)
+
+        if rows is None:
+            summary['already_credited'] = True
+        else:
+            summary['referrers'] = len(rows)
+            summary['active_users'] = sum(row[1] for row in rows)
+            summary['total'] = sum(row[2] for row in rows)
+        summary['elapsed'] = time.perf_counter() - started
+
+        logger.info(
+            f"Bonus credits completed for {period}: referrers={summary['referrers']}, "
+            f"active_users={summary['active_users']}, total={summary['total']} coins, "
+            f"already_credited={summary['already_credited']}, dry_run={dry_run}, "
+            f"elapsed={summary['elapsed']:.3f}s."
+        )
+        return summary
 
     except Exception as e:
         logger.error(f"monthly_referral_bonus: An error occurred while crediting bonuses: {str(e)}")
 
+@log_function_call(logger)
+async def expire_bonus_reservations():
+    """
+    Returns meow-coins reserved for invoices that were never paid.
+    """
+    try:
+        await middleware.balance.expire_reservations()
+    except Exception as e:
+        logger.error(f"Error in expire_bonus_reservations: {str(e)}")
+
+@log_function_call(logger)
+async def sync_client_traffic():
+    """
+    Pulls traffic and online status of all clients from 3X-UI into the cache.
+    """
+    try:
+        await middleware.traffic.sync_traffic()
+    except Exception as e:
+        logger.error(f"Error in sync_client_traffic: {str(e)}")
+
+@log_function_call(logger)
+async def reconcile_panels():
+    """
+    Daily check that every user has a matching client on the panel; only reports drift.
+    """
+    try:
+        await middleware.reconcile.reconcile()
+    except Exception as e:
+        logger.error(f"Error in reconcile_panels: {str(e)}")
+
 # Background task for monthly referral bonus credits
 def setup_scheduler():
     """
@@ -140,7 +148,37 @@ def setup_scheduler():
             monthly_referral_bonus,
             trigger=trigger,
             name="Monthly Referral Bonus",
-            replace_existing=True
+            replace_existing=True,
+            misfire_grace_time=6 * 60 * 60,
+            coalesce=True
+        )
+
+        scheduler.add_job(
+            expire_bonus_reservations,
+            trigger=IntervalTrigger(minutes=1),
+            name="Expire Bonus Reservations",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+        scheduler.add_job(
+            sync_client_traffic,
+            trigger=IntervalTrigger(seconds=TRAFFIC_SYNC_INTERVAL),
+            name="Sync Client Traffic",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            next_run_time=datetime.now()
+        )
+
+        scheduler.add_job(
+            reconcile_panels,
+            trigger=CronTrigger(hour=4, minute=30),
+            name="Reconcile Panels",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
         )
         
         # # Установка триггера: каждые 1 минуту
@@ -0,0 +1,132 @@
+#update_scheduler.py
+import asyncio
+from collections import deque
+
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('update_scheduler', 'bot.log')
+
+
+def update_chat_id(update):
+    """
+    Returns the chat an update belongs to, or None if it has none.
+    Payment and inline queries carry only the user; in a private chat
+    the chat id is the user id, so they queue with the user's messages.
+    """
+    for name in ('message', 'edited_message', 'channel_post', 'edited_channel_post', 'my_chat_member', 'chat_member',
+                 'chat_join_request'):
+        item = getattr(update, name, None)
+        if item is not None:
+            return item.chat.id
+    callback = getattr(update, 'callback_query', None)
+    if callback is not None:
+        return callback.message.chat.id if callback.message is not None else callback.from_user.id
+    for name in ('pre_checkout_query', 'shipping_query', 'inline_query', 'chosen_inline_result'):
+        item = getattr(update, name, None)
+        if item is not None:
+            return item.from_user.id
+    poll_answer = getattr(update, 'poll_answer', None)
+    if poll_answer is not None and poll_answer.user is not None:
+        return poll_answer.user.id
+    return None
+
+
+class UpdateScheduler:
+    """
+    Runs updates of one chat strictly one after another and updates of
+    different chats in parallel on at most max_workers workers.
+
+    Every chat with pending updates has its own queue; chats take turns, one
+    update per turn, so one busy chat cannot starve the others. A chat's
+    queue is dropped as soon as it is empty and nothing of it is running.
+    """
+
+    def __init__(self, process, max_workers=50):
+        self.process = process
+        self.max_workers = max_workers
+        self._queues = {}
+        self._ready = asyncio.Queue()
+        self._workers = []
+        self.processed = 0
+        self.failed = 0
+        self.evicted = 0
+        self.running = 0
+
+    def _ensure_workers(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    def submit(self, update):
+        """
+        Queues an update behind the earlier ones of its chat.
+        Returns a future resolved once the update was processed.
+        """
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        chat_id = update_chat_id(update)
+        # Обновления без чата ни с чем не упорядочиваются
+        key = chat_id if chat_id is not None else ('update', update.update_id)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append((update, future))
+        return future
+
+    async def dispatch(self, updates):
+        """
+        Drop-in replacement for bot.process_new_updates: queues the updates
+        and waits until all of them are processed.
+        """
+        futures = [self.submit(update) for update in updates]
+        await asyncio.gather(*futures)
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            update, future = queue.popleft()
+            self.running += 1
+            try:
+                await self.process(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error while processing update {update.update_id} of chat {key}: {str(e)}")
+            finally:
+                self.running -= 1
+                if not future.done():
+                    future.set_result(None)
+            if queue:
+                # В конец очереди готовых чатов: остальные чаты не ждут
+                self._ready.put_nowait(key)
+            else:
+                del self._queues[key]
+                self.evicted += 1
+
+    def stats(self):
+        return {
+            'chats': len(self._queues),
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'running': self.running,
+            'workers': self.max_workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'evicted': self.evicted,
+        }
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+def install_update_scheduler(bot, max_workers):
+    """
+    Routes every update the bot receives, by polling or webhook, through an UpdateScheduler.
+    """
+    process_new_updates = bot.process_new_updates
+    scheduler = UpdateScheduler(lambda update: process_new_updates([update]), max_workers)
+    bot.process_new_updates = scheduler.dispatch
+    return scheduler
@@ -0,0 +1,124 @@
+#webhook.py
+import asyncio
+import hmac
+import json
+
+from aiohttp import web
+from telebot import types
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('webhook', 'bot.log')
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Receives Telegram updates over HTTPS POSTs and feeds them to the bot's handlers.
+
+    Requests without the secret token set in setWebhook are refused. An update
+    is acknowledged as soon as it is scheduled, so Telegram never waits for a
+    slow handler; at most max_in_flight updates are processed at once. When
+    all slots stay busy for acquire_timeout seconds the update is refused
+    with 503 and Telegram delivers it again later.
+    """
+
+    def __init__(self, bot, secret_token, path='/webhook', max_in_flight=100, acquire_timeout=5.0):
+        if not secret_token:
+            raise ValueError("Webhook mode needs a secret token")
+        self.bot = bot
+        self.secret_token = secret_token
+        self.path = path
+        self.max_in_flight = max_in_flight
+        self.acquire_timeout = acquire_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.throttled = 0
+
+    async def _process(self, update):
+        try:
+            await self.bot.process_new_updates([update])
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error while processing update {update.update_id}: {str(e)}")
+        finally:
+            self._slots.release()
+
+    async def handle(self, request):
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.rejected += 1
+            logger.warning(f"Webhook request from {request.remote} with a wrong secret token.")
+            return web.Response(status=401)
+        try:
+            update = types.Update.de_json(await request.json(loads=json.loads))
+        except Exception as e:
+            self.rejected += 1
+            logger.warning(f"Malformed webhook update: {str(e)}")
+            return web.Response(status=400)
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            # Все слоты заняты: Telegram повторит доставку сам
+            self.throttled += 1
+            return web.Response(status=503, headers={'Retry-After': '1'})
+
+        self.received += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def health(self, request):
+        return web.json_response(self.stats())
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.router.add_get('/healthz', self.health)
+        return app
+
+    async def drain(self, timeout=30):
+        """
+        Waits up to timeout seconds for updates still being processed.
+        """
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    def stats(self):
+        return {
+            'in_flight': len(self._tasks),
+            'max_in_flight': self.max_in_flight,
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'throttled': self.throttled,
+        }
+
+
+async def run_webhook(bot, url, secret_token, host='0.0.0.0', port=8443, path='/webhook',
+                      max_in_flight=100, max_connections=40, stop=None):
+    """
+    Registers url with Telegram and serves updates until stop is set
+    (forever if stop is None). The webhook stays registered on exit, so
+    updates arriving during a restart wait in Telegram instead of being lost.
+    """
+    server = WebhookServer(bot, secret_token, path, max_in_flight)
+    runner = web.AppRunner(server.make_app())
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        await bot.set_webhook(url=url, secret_token=secret_token, max_connections=max_connections)
+        logger.info(f"Webhook set to {url}, listening on {host}:{port}{path}.")
+        await (stop or asyncio.Event()).wait()
+    finally:
+        await runner.shutdown()
+        await server.drain()
+        await runner.cleanup()
@@ -55,3 +55,5 @@ API_JSON_PATH = 'api/'
 LOGGER_PRESET = '\n\n{username} -'
 PAYMENT_STATE = {}
 MINMUM_BONUS_PAYMENT = 60
+# Сколько держится резерв бонусов под неоплаченный счёт
+BONUS_RESERVATION_TTL_MS = 30 * 60 * 1000
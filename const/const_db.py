@@ -1,5 +1,4 @@
 #const/const_db.py
-CUR = None
+POOL = None
 TUNNEL = None
-SESSION = None
-CONN = None
+PANELS = None
@@ -0,0 +1,45 @@
+#database/async_balance.py
+import database.balance
+from database.executor import run_blocking
+
+
+async def post_transaction(tg_id, amount, kind, reference=None):
+    """
+    Awaitable version of database.balance.post_transaction.
+    """
+    return await run_blocking(database.balance.post_transaction, tg_id, amount, kind, reference)
+
+
+async def reserve_balance(tg_id, amount, now_ts, ttl_ms):
+    """
+    Awaitable version of database.balance.reserve_balance.
+    """
+    return await run_blocking(database.balance.reserve_balance, tg_id, amount, now_ts, ttl_ms)
+
+
+async def hold_reservation(reservation_id, now_ts, ttl_ms):
+    """
+    Awaitable version of database.balance.hold_reservation.
+    """
+    return await run_blocking(database.balance.hold_reservation, reservation_id, now_ts, ttl_ms)
+
+
+async def commit_reservation(reservation_id, now_ts, reference):
+    """
+    Awaitable version of database.balance.commit_reservation.
+    """
+    return await run_blocking(database.balance.commit_reservation, reservation_id, now_ts, reference)
+
+
+async def release_reservation(reservation_id, now_ts):
+    """
+    Awaitable version of database.balance.release_reservation.
+    """
+    return await run_blocking(database.balance.release_reservation, reservation_id, now_ts)
+
+
+async def expire_reservations(now_ts):
+    """
+    Awaitable version of database.balance.expire_reservations.
+    """
+    return await run_blocking(database.balance.expire_reservations, now_ts)
@@ -0,0 +1,45 @@
+#database/async_broadcast.py
+import database.broadcast
+from database.executor import run_blocking
+
+
+async def start_broadcast_job(job_id, text, where, params, admin_chat_id, now_ts):
+    """
+    Awaitable version of database.broadcast.start_broadcast_job.
+    """
+    return await run_blocking(database.broadcast.start_broadcast_job, job_id, text, where, params, admin_chat_id, now_ts)
+
+
+async def select_broadcast_job(job_id):
+    """
+    Awaitable version of database.broadcast.select_broadcast_job.
+    """
+    return await run_blocking(database.broadcast.select_broadcast_job, job_id)
+
+
+async def select_running_broadcast_jobs():
+    """
+    Awaitable version of database.broadcast.select_running_broadcast_jobs.
+    """
+    return await run_blocking(database.broadcast.select_running_broadcast_jobs)
+
+
+async def select_broadcast_recipients(where, params, after_tg_id, limit):
+    """
+    Awaitable version of database.broadcast.select_broadcast_recipients.
+    """
+    return await run_blocking(database.broadcast.select_broadcast_recipients, where, params, after_tg_id, limit)
+
+
+async def record_broadcast_deliveries(job_id, results, last_tg_id, now_ts):
+    """
+    Awaitable version of database.broadcast.record_broadcast_deliveries.
+    """
+    return await run_blocking(database.broadcast.record_broadcast_deliveries, job_id, results, last_tg_id, now_ts)
+
+
+async def finish_broadcast_job(job_id, status, now_ts):
+    """
+    Awaitable version of database.broadcast.finish_broadcast_job.
+    """
+    return await run_blocking(database.broadcast.finish_broadcast_job, job_id, status, now_ts)
@@ -0,0 +1,46 @@
+#database/async_outbox.py
+import database.outbox
+from database.executor import run_blocking
+
+
+async def insert_user_with_intent(tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel, idempotency_key, now_ts):
+    """
+    Awaitable version of database.outbox.insert_user_with_intent.
+    """
+    return await run_blocking(database.outbox.insert_user_with_intent, tg_id, user_id, email, date, sub_id,
+                              vless_profile, login_date, panel, idempotency_key, now_ts)
+
+
+async def update_user_date_with_intent(date, tg_id, idempotency_key, now_ts):
+    """
+    Awaitable version of database.outbox.update_user_date_with_intent.
+    """
+    return await run_blocking(database.outbox.update_user_date_with_intent, date, tg_id, idempotency_key, now_ts)
+
+
+async def claim_outbox(limit, lease_ms, now_ts):
+    """
+    Awaitable version of database.outbox.claim_outbox.
+    """
+    return await run_blocking(database.outbox.claim_outbox, limit, lease_ms, now_ts)
+
+
+async def complete_outbox(outbox_ids, now_ts):
+    """
+    Awaitable version of database.outbox.complete_outbox.
+    """
+    return await run_blocking(database.outbox.complete_outbox, outbox_ids, now_ts)
+
+
+async def fail_outbox(outbox_id, error, retry_at, dead=False):
+    """
+    Awaitable version of database.outbox.fail_outbox.
+    """
+    return await run_blocking(database.outbox.fail_outbox, outbox_id, error, retry_at, dead)
+
+
+async def select_outbox_stats(now_ts):
+    """
+    Awaitable version of database.outbox.select_outbox_stats.
+    """
+    return await run_blocking(database.outbox.select_outbox_stats, now_ts)
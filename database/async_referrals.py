@@ -0,0 +1,88 @@
+#database/async_referrals.py
+import database.referrals
+from database.cache import read_through
+from database.executor import run_blocking
+
+
+async def ensure_referral_record(tg_id, referrer_id):
+    """
+    Awaitable version of database.referrals.ensure_referral_record.
+    """
+    return await run_blocking(database.referrals.ensure_referral_record, tg_id, referrer_id)
+
+
+async def insert_update_referrer(tg_id, referrer_id):
+    """
+    Awaitable version of database.referrals.insert_update_referrer.
+    """
+    return await run_blocking(database.referrals.insert_update_referrer, tg_id, referrer_id)
+
+
+async def insert_user_referrals(tg_id):
+    """
+    Awaitable version of database.referrals.insert_user_referrals.
+    """
+    return await run_blocking(database.referrals.insert_user_referrals, tg_id)
+
+
+async def get_balance(tg_id):
+    """
+    Cached awaitable version of database.referrals.get_balance.
+    """
+    return await read_through(database.referrals.get_balance, tg_id)
+
+
+async def get_refferer(tg_id):
+    """
+    Cached awaitable version of database.referrals.get_refferer.
+    """
+    return await read_through(database.referrals.get_refferer, tg_id)
+
+
+async def select_users_by_referrer(referrer_tg_id):
+    """
+    Awaitable version of database.referrals.select_users_by_referrer.
+    """
+    return await run_blocking(database.referrals.select_users_by_referrer, referrer_tg_id)
+
+
+async def select_active_referrals(referrer_tg_ids, now_ts):
+    """
+    Awaitable version of database.referrals.select_active_referrals.
+    """
+    return await run_blocking(database.referrals.select_active_referrals, referrer_tg_ids, now_ts)
+
+
+async def update_balance(tg_id, amount, kind='adjustment', reference=None):
+    """
+    Awaitable version of database.referrals.update_balance.
+    """
+    return await run_blocking(database.referrals.update_balance, tg_id, amount, kind, reference)
+
+
+async def select_all_referrals_with_every_user():
+    """
+    Awaitable version of database.referrals.select_all_referrals_with_every_user.
+    """
+    return await run_blocking(database.referrals.select_all_referrals_with_every_user)
+
+
+async def select_user_exists(tg_id):
+    """
+    Cached awaitable version of database.referrals.select_user_exists.
+    """
+    return await read_through(database.referrals.select_user_exists, tg_id)
+
+
+async def select_monthly_bonus_preview(now_ts, trial_threshold_ms, bonus_per_user):
+    """
+    Awaitable version of database.referrals.select_monthly_bonus_preview.
+    """
+    return await run_blocking(database.referrals.select_monthly_bonus_preview, now_ts, trial_threshold_ms, bonus_per_user)
+
+
+async def credit_monthly_bonus(period, now_ts, trial_threshold_ms, bonus_per_user):
+    """
+    Awaitable version of database.referrals.credit_monthly_bonus.
+    """
+    return await run_blocking(database.referrals.credit_monthly_bonus, period, now_ts, trial_threshold_ms, bonus_per_user)
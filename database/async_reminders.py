@@ -0,0 +1,17 @@
+#database/async_reminders.py
+import database.reminders
+from database.executor import run_blocking
+
+
+async def select_upcoming_reminders(offsets, from_ts, until_ts, now_ts):
+    """
+    Awaitable version of database.reminders.select_upcoming_reminders.
+    """
+    return await run_blocking(database.reminders.select_upcoming_reminders, offsets, from_ts, until_ts, now_ts)
+
+
+async def claim_reminder(tg_id, expiry, offset_name, now_ts):
+    """
+    Awaitable version of database.reminders.claim_reminder.
+    """
+    return await run_blocking(database.reminders.claim_reminder, tg_id, expiry, offset_name, now_ts)
@@ -0,0 +1,59 @@
+#database/async_renewal.py
+import database.renewal
+from database.executor import run_blocking
+
+
+async def start_renewal_run(run_id, period, where, params, now_ts):
+    """
+    Awaitable version of database.renewal.start_renewal_run.
+    """
+    return await run_blocking(database.renewal.start_renewal_run, run_id, period, where, params, now_ts)
+
+
+async def select_renewal_run(run_id):
+    """
+    Awaitable version of database.renewal.select_renewal_run.
+    """
+    return await run_blocking(database.renewal.select_renewal_run, run_id)
+
+
+async def select_renewal_candidates(where, params, after_tg_id, limit):
+    """
+    Awaitable version of database.renewal.select_renewal_candidates.
+    """
+    return await run_blocking(database.renewal.select_renewal_candidates, where, params, after_tg_id, limit)
+
+
+async def stage_renewals(run_id, items):
+    """
+    Awaitable version of database.renewal.stage_renewals.
+    """
+    return await run_blocking(database.renewal.stage_renewals, run_id, items)
+
+
+async def select_retry_renewals(run_id, statuses):
+    """
+    Awaitable version of database.renewal.select_retry_renewals.
+    """
+    return await run_blocking(database.renewal.select_retry_renewals, run_id, statuses)
+
+
+async def restage_renewals(run_id, items):
+    """
+    Awaitable version of database.renewal.restage_renewals.
+    """
+    return await run_blocking(database.renewal.restage_renewals, run_id, items)
+
+
+async def apply_renewals(run_id, renewed_tg_ids, failures, last_tg_id):
+    """
+    Awaitable version of database.renewal.apply_renewals.
+    """
+    return await run_blocking(database.renewal.apply_renewals, run_id, renewed_tg_ids, failures, last_tg_id)
+
+
+async def finish_renewal_run(run_id, now_ts):
+    """
+    Awaitable version of database.renewal.finish_renewal_run.
+    """
+    return await run_blocking(database.renewal.finish_renewal_run, run_id, now_ts)
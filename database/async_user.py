@@ -0,0 +1,99 @@
+#database/async_user.py
+import database.user
+from database.cache import read_through
+from database.executor import run_blocking, run_cleanup
+
+
+async def insert_user(tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel='main'):
+    """
+    Awaitable version of database.user.insert_user.
+    """
+    return await run_blocking(database.user.insert_user, tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel)
+
+
+async def insert_trial_date(tg_id, trial_date):
+    """
+    Awaitable version of database.user.insert_trial_date.
+    """
+    return await run_blocking(database.user.insert_trial_date, tg_id, trial_date)
+
+
+async def select_trial_date(tg_id):
+    """
+    Cached awaitable version of database.user.select_trial_date.
+    """
+    return await read_through(database.user.select_trial_date, tg_id)
+
+
+async def select_user(tg_id):
+    """
+    Cached awaitable version of database.user.select_user.
+    """
+    return await read_through(database.user.select_user, tg_id)
+
+
+async def update_user_date(date, tg_id):
+    """
+    Awaitable version of database.user.update_user_date.
+    """
+    return await run_blocking(database.user.update_user_date, date, tg_id)
+
+
+async def select_user_exists(tg_id):
+    """
+    Cached awaitable version of database.user.select_user_exists.
+    """
+    return await read_through(database.user.select_user_exists, tg_id)
+
+
+async def select_user_vless_profile(tg_id):
+    """
+    Cached awaitable version of database.user.select_user_vless_profile.
+    """
+    return await read_through(database.user.select_user_vless_profile, tg_id)
+
+
+async def select_user_date(tg_id):
+    """
+    Cached awaitable version of database.user.select_user_date.
+    """
+    return await read_through(database.user.select_user_date, tg_id)
+
+
+async def select_user_snapshot(tg_id):
+    """
+    Cached awaitable version of database.user.select_user_snapshot.
+    """
+    return await read_through(database.user.select_user_snapshot, tg_id)
+
+
+async def select_panel_loads():
+    """
+    Awaitable version of database.user.select_panel_loads.
+    """
+    return await run_blocking(database.user.select_panel_loads)
+
+
+async def select_all_users():
+    """
+    Awaitable version of database.user.select_all_users.
+    """
+    return await run_blocking(database.user.select_all_users)
+
+
+async def iter_users(columns=None, where=None, params=None, batch_size=1000):
+    """
+    Async generator over user rows; every batch is fetched in the DB executor.
+    Closing the generator early releases the pooled connection.
+    """
+    batches = database.user.iter_user_batches(columns, where, params, batch_size)
+    try:
+        while True:
+            rows = await run_blocking(next, batches, None)
+            if rows is None:
+                break
+            for row in rows:
+                yield row
+    finally:
+        # Закрытие идёт мимо предохранителя: при открытом он отказал бы, и соединение не вернулось бы в пул
+        await run_cleanup(batches.close)
@@ -0,0 +1,251 @@
+#database/balance.py
+from database.cache import USER_CACHE
+from database.connection import get_cursor, get_transaction
+from utils.logging_utils import setup_logger, log_function_call
+
+logger = setup_logger('balance.database', 'database.log')
+
+# Снимает просроченные резервы: статус меняется пачкой, а reserved_coins
+# уменьшается одной строкой на пользователя
+EXPIRE_HELD_SQL = """
+WITH expired AS (
+    UPDATE balance_reservations
+    SET status = 'expired', settled_at = %(now_ts)s
+    WHERE status = 'held' AND expires_at <= %(now_ts)s {condition}
+    RETURNING tg_id, amount
+),
+totals AS (
+    SELECT tg_id, SUM(amount) AS amount FROM expired GROUP BY tg_id
+)
+UPDATE referrals r
+SET reserved_coins = r.reserved_coins - t.amount
+FROM totals t
+WHERE r.tg_id = t.tg_id
+RETURNING r.tg_id
+"""
+
+
+@log_function_call(logger)
+def post_transaction(tg_id, amount, kind, reference=None):
+    """
+    Appends a ledger entry and applies it to the materialized balance in one statement.
+    A repeated (tg_id, kind, reference) is ignored, so retries never post twice.
+    Returns the new balance, or None if nothing was posted.
+    """
+    try:
+        query = """
+        WITH posted AS (
+            INSERT INTO balance_transactions (tg_id, amount, kind, reference)
+            SELECT tg_id, %(amount)s, %(kind)s, %(reference)s
+            FROM referrals
+            WHERE tg_id = %(tg_id)s
+            ON CONFLICT (tg_id, kind, reference) DO NOTHING
+            RETURNING tg_id, amount
+        )
+        UPDATE referrals r
+        SET meow_coins_balance = r.meow_coins_balance + p.amount
+        FROM posted p
+        WHERE r.tg_id = p.tg_id
+        RETURNING r.meow_coins_balance
+        """
+        params = {'tg_id': tg_id, 'amount': amount, 'kind': kind, 'reference': reference}
+        with get_cursor() as cur:
+            cur.execute(query, params)
+            row = cur.fetchone()
+        USER_CACHE.invalidate(tg_id)
+        if row is None:
+            logger.info(f"Ledger entry {kind}/{reference} for tg_id={tg_id} was not posted.")
+            return None
+        logger.info(f"Posted {amount} ({kind}) for tg_id={tg_id}, balance is {row[0]}.")
+        return row[0]
+    except Exception as e:
+        logger.error(f"Error in post_transaction: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def reserve_balance(tg_id, amount, now_ts, ttl_ms):
+    """
+    Holds amount coins for an invoice if that much is available.
+    Returns the reservation id, or None if the available balance is too low.
+    """
+    try:
+        query = """
+        WITH held AS (
+            UPDATE referrals
+            SET reserved_coins = reserved_coins + %(amount)s
+            WHERE tg_id = %(tg_id)s AND meow_coins_balance - reserved_coins >= %(amount)s
+            RETURNING tg_id
+        )
+        INSERT INTO balance_reservations (tg_id, amount, status, created_at, expires_at)
+        SELECT tg_id, %(amount)s, 'held', %(now_ts)s, %(expires_at)s
+        FROM held
+        RETURNING id
+        """
+        params = {'tg_id': tg_id, 'amount': amount, 'now_ts': now_ts, 'expires_at': now_ts + ttl_ms}
+        with get_transaction() as cur:
+            # Сначала отпускаем просроченные резервы этого пользователя
+            cur.execute(EXPIRE_HELD_SQL.format(condition="AND tg_id = %(tg_id)s"), params)
+            cur.execute(query, params)
+            row = cur.fetchone()
+        USER_CACHE.invalidate(tg_id)
+        if row is None:
+            logger.info(f"Not enough available coins to reserve {amount} for tg_id={tg_id}.")
+            return None
+        logger.info(f"Reserved {amount} coins for tg_id={tg_id}: reservation {row[0]}.")
+        return row[0]
+    except Exception as e:
+        logger.error(f"Error in reserve_balance: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def hold_reservation(reservation_id, now_ts, ttl_ms):
+    """
+    Extends a held reservation, or holds an expired one again if the coins are
+    still available. Returns True if the reservation is held afterwards.
+    """
+    try:
+        query = """
+        WITH current AS (
+            SELECT id, tg_id, amount, status
+            FROM balance_reservations
+            WHERE id = %(reservation_id)s AND status IN ('held', 'expired')
+            FOR UPDATE
+        ),
+        reheld AS (
+            UPDATE referrals r
+            SET reserved_coins = r.reserved_coins + c.amount
+            FROM current c
+            WHERE c.status = 'expired' AND r.tg_id = c.tg_id
+              AND r.meow_coins_balance - r.reserved_coins >= c.amount
+            RETURNING c.id
+        )
+        UPDATE balance_reservations b
+        SET status = 'held', expires_at = %(expires_at)s, settled_at = NULL
+        FROM current c
+        WHERE b.id = c.id AND (c.status = 'held' OR c.id IN (SELECT id FROM reheld))
+        RETURNING b.tg_id
+        """
+        params = {'reservation_id': reservation_id, 'expires_at': now_ts + ttl_ms}
+        with get_cursor() as cur:
+            cur.execute(query, params)
+            row = cur.fetchone()
+        if row is None:
+            logger.info(f"Reservation {reservation_id} can no longer be held.")
+            return False
+        USER_CACHE.invalidate(row[0])
+        return True
+    except Exception as e:
+        logger.error(f"Error in hold_reservation: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def commit_reservation(reservation_id, now_ts, reference):
+    """
+    Charges a reservation after payment: writes the ledger entry and lowers the
+    balance and the reserved amount together. An expired reservation is still
+    charged, because the discounted invoice has already been paid. If the
+    reference is already in the ledger the reservation is only released.
+    Returns (tg_id, amount), or None if the reservation was released or already committed.
+    """
+    try:
+        query = """
+        WITH current AS (
+            SELECT id, status
+            FROM balance_reservations
+            WHERE id = %(reservation_id)s AND status IN ('held', 'expired')
+            FOR UPDATE
+        ),
+        settled AS (
+            UPDATE balance_reservations b
+            SET status = 'committed', settled_at = %(now_ts)s
+            FROM current c
+            WHERE b.id = c.id
+            RETURNING b.tg_id, b.amount, c.status AS previous_status
+        ),
+        posted AS (
+            INSERT INTO balance_transactions (tg_id, amount, kind, reference, created_at)
+            SELECT tg_id, -amount, 'payment', %(reference)s, %(now_ts)s
+            FROM settled
+            ON CONFLICT (tg_id, kind, reference) DO NOTHING
+            RETURNING tg_id
+        ),
+        charged AS (
+            -- Резерв снимается всегда; баланс не списывается, если платёж по этой ссылке уже проведён
+            UPDATE referrals r
+            SET meow_coins_balance = r.meow_coins_balance
+                    - CASE WHEN s.tg_id IN (SELECT tg_id FROM posted) THEN s.amount ELSE 0 END,
+                reserved_coins = r.reserved_coins - CASE WHEN s.previous_status = 'held' THEN s.amount ELSE 0 END
+            FROM settled s
+            WHERE r.tg_id = s.tg_id
+        )
+        SELECT tg_id, amount FROM settled
+        """
+        params = {'reservation_id': reservation_id, 'now_ts': now_ts, 'reference': reference}
+        with get_cursor() as cur:
+            cur.execute(query, params)
+            row = cur.fetchone()
+        if row is None:
+            logger.warning(f"Reservation {reservation_id} is not held, nothing committed.")
+            return None
+        USER_CACHE.invalidate(row[0])
+        logger.info(f"Committed reservation {reservation_id}: {row[1]} coins from tg_id={row[0]}.")
+        return row[0], row[1]
+    except Exception as e:
+        logger.error(f"Error in commit_reservation: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def release_reservation(reservation_id, now_ts):
+    """
+    Returns held coins to the available balance when an invoice is abandoned.
+    Returns the tg_id of the released reservation, or None if it was not held.
+    """
+    try:
+        query = """
+        WITH released AS (
+            UPDATE balance_reservations
+            SET status = 'released', settled_at = %(now_ts)s
+            WHERE id = %(reservation_id)s AND status = 'held'
+            RETURNING tg_id, amount
+        )
+        UPDATE referrals r
+        SET reserved_coins = r.reserved_coins - rel.amount
+        FROM released rel
+        WHERE r.tg_id = rel.tg_id
+        RETURNING r.tg_id
+        """
+        with get_cursor() as cur:
+            cur.execute(query, {'reservation_id': reservation_id, 'now_ts': now_ts})
+            row = cur.fetchone()
+        if row is None:
+            return None
+        USER_CACHE.invalidate(row[0])
+        logger.info(f"Released reservation {reservation_id} for tg_id={row[0]}.")
+        return row[0]
+    except Exception as e:
+        logger.error(f"Error in release_reservation: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def expire_reservations(now_ts):
+    """
+    Expires every held reservation past its deadline in one statement.
+    Returns the tg_ids whose available balance changed.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute(EXPIRE_HELD_SQL.format(condition=""), {'now_ts': now_ts})
+            tg_ids = [row[0] for row in cur.fetchall()]
+        for tg_id in tg_ids:
+            USER_CACHE.invalidate(tg_id)
+        if tg_ids:
+            logger.info(f"Expired reservations of {len(tg_ids)} users.")
+        return tg_ids
+    except Exception as e:
+        logger.error(f"Error in expire_reservations: {str(e)}")
+        raise
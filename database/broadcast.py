@@ -0,0 +1,148 @@
+#database/broadcast.py
+from collections import namedtuple
+from psycopg2 import sql
+from psycopg2.extras import Json
+from database.connection import get_cursor, get_transaction
+from utils.logging_utils import setup_logger, log_function_call
+
+logger = setup_logger('broadcast.database', 'database.log')
+
+BroadcastJob = namedtuple('BroadcastJob', [
+    'job_id', 'text', 'where_sql', 'params', 'admin_chat_id', 'status', 'started_at', 'finished_at',
+    'last_tg_id', 'delivered', 'blocked', 'failed',
+])
+
+JOB_COLUMNS = """
+job_id, text, where_sql, params, admin_chat_id, status, started_at, finished_at,
+last_tg_id, delivered, blocked, failed
+"""
+
+
+@log_function_call(logger)
+def start_broadcast_job(job_id, text, where, params, admin_chat_id, now_ts):
+    """
+    Creates the job record, or returns the existing one when resuming job_id.
+    """
+    try:
+        with get_transaction() as cur:
+            cur.execute("""
+            INSERT INTO broadcast_jobs (job_id, text, where_sql, params, admin_chat_id, started_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (job_id) DO NOTHING
+            """, (job_id, text, where, Json(list(params or ())), admin_chat_id, now_ts))
+            cur.execute(f"SELECT {JOB_COLUMNS} FROM broadcast_jobs WHERE job_id = %s", (job_id,))
+            return BroadcastJob(*cur.fetchone())
+    except Exception as e:
+        logger.error(f"Error in start_broadcast_job: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def select_broadcast_job(job_id):
+    """
+    Returns the job record, or None if job_id is unknown.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute(f"SELECT {JOB_COLUMNS} FROM broadcast_jobs WHERE job_id = %s", (job_id,))
+            row = cur.fetchone()
+        return BroadcastJob(*row) if row else None
+    except Exception as e:
+        logger.error(f"Error in select_broadcast_job: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def select_running_broadcast_jobs():
+    """
+    Returns jobs that were neither finished nor cancelled, oldest first.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute(f"SELECT {JOB_COLUMNS} FROM broadcast_jobs WHERE status = 'running' ORDER BY started_at")
+            return [BroadcastJob(*row) for row in cur.fetchall()]
+    except Exception as e:
+        logger.error(f"Error in select_running_broadcast_jobs: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def select_broadcast_recipients(where, params, after_tg_id, limit):
+    """
+    Returns the next limit tg_id greater than after_tg_id of users matching
+    the where predicate, ordered by tg_id.
+    """
+    try:
+        conditions = [sql.SQL("tg_id > %s")]
+        if where:
+            conditions.insert(0, sql.SQL("(") + sql.SQL(where) + sql.SQL(")"))
+        query = (
+            sql.SQL("SELECT tg_id FROM users WHERE ")
+            + sql.SQL(" AND ").join(conditions)
+            + sql.SQL(" ORDER BY tg_id LIMIT %s")
+        )
+        with get_cursor() as cur:
+            cur.execute(query, tuple(params or ()) + (after_tg_id if after_tg_id is not None else -1, limit))
+            return [row[0] for row in cur.fetchall()]
+    except Exception as e:
+        logger.error(f"Error in select_broadcast_recipients: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def record_broadcast_deliveries(job_id, results, last_tg_id, now_ts):
+    """
+    Stores [(tg_id, status, error)] results of a batch and moves the job
+    checkpoint to last_tg_id in one statement. A recipient recorded by an
+    earlier attempt keeps its first result.
+    Returns the job totals (delivered, blocked, failed).
+    """
+    try:
+        query = """
+        WITH recorded AS (
+            INSERT INTO broadcast_deliveries (job_id, tg_id, status, error, sent_at)
+            SELECT %(job_id)s, r.tg_id, r.status, r.error, %(now)s
+            FROM unnest(%(tg_ids)s::bigint[], %(statuses)s::text[], %(errors)s::text[]) AS r(tg_id, status, error)
+            ON CONFLICT (job_id, tg_id) DO NOTHING
+            RETURNING status
+        )
+        UPDATE broadcast_jobs
+        SET last_tg_id = %(last_tg_id)s,
+            delivered = delivered + (SELECT count(*) FROM recorded WHERE status = 'delivered'),
+            blocked = blocked + (SELECT count(*) FROM recorded WHERE status = 'blocked'),
+            failed = failed + (SELECT count(*) FROM recorded WHERE status = 'failed')
+        WHERE job_id = %(job_id)s
+        RETURNING delivered, blocked, failed
+        """
+        params = {
+            'job_id': job_id,
+            'tg_ids': [result[0] for result in results],
+            'statuses': [result[1] for result in results],
+            'errors': [result[2] for result in results],
+            'last_tg_id': last_tg_id,
+            'now': now_ts,
+        }
+        with get_cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchone()
+    except Exception as e:
+        logger.error(f"Error in record_broadcast_deliveries: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def finish_broadcast_job(job_id, status, now_ts):
+    """
+    Marks a running job as 'finished' or 'cancelled'.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            UPDATE broadcast_jobs
+            SET status = %s, finished_at = %s
+            WHERE job_id = %s AND status = 'running'
+            """, (status, now_ts, job_id))
+        logger.info(f"Broadcast job {job_id} {status}.")
+    except Exception as e:
+        logger.error(f"Error in finish_broadcast_job: {str(e)}")
+        raise
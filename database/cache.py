@@ -0,0 +1,148 @@
+#database/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from database.executor import run_blocking
+from utils.config import USER_CACHE_SIZE, USER_CACHE_TTL
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('cache.database', 'database.log')
+
+
+class UserCache:
+    """
+    Thread-safe LRU of per-user read results with a TTL.
+
+    Entries are keyed by (tg_id, name), where name is the read function, so one
+    invalidate(tg_id) drops everything cached about a user after a write.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300, clock=time.monotonic):
+        if maxsize < 1 or ttl <= 0:
+            raise ValueError(f"Invalid cache settings: maxsize={maxsize}, ttl={ttl}")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()  # (tg_id, name) -> (value, expires_at)
+        self._names = {}  # tg_id -> set(name)
+        # Растёт при каждой инвалидации: чтение, начатое до записи, не кладёт
+        # в кэш уже устаревшее значение
+        self._version = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _user_key(tg_id):
+        try:
+            return int(tg_id)
+        except (TypeError, ValueError):
+            return tg_id
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        names = self._names.get(key[0])
+        if names is not None:
+            names.discard(key[1])
+            if not names:
+                del self._names[key[0]]
+
+    def get(self, tg_id, name):
+        """
+        Returns (True, value) on a fresh hit, otherwise (False, None).
+        """
+        key = (self._user_key(tg_id), name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return False, None
+
+    def version(self):
+        """
+        Returns the invalidation counter to pass to put() after loading a value.
+        """
+        with self._lock:
+            return self._version
+
+    def put(self, tg_id, name, value, version=None):
+        """
+        Stores value unless an invalidation happened since version was taken.
+        """
+        key = (self._user_key(tg_id), name)
+        with self._lock:
+            if version is not None and version != self._version:
+                return False
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            self._names.setdefault(key[0], set()).add(name)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, tg_id):
+        """
+        Drops every cached read for tg_id.
+        """
+        user_key = self._user_key(tg_id)
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            for name in self._names.pop(user_key, ()):
+                self._entries.pop((user_key, name), None)
+
+    def clear(self):
+        """
+        Drops everything, e.g. after a bulk write that touched many users.
+        """
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            self._entries.clear()
+            self._names.clear()
+
+    def stats(self):
+        """
+        Returns a snapshot of cache counters.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+USER_CACHE = UserCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+async def read_through(func, tg_id, cache=None):
+    """
+    Returns func(tg_id) from the cache, running it in the DB executor on a miss.
+    """
+    cache = USER_CACHE if cache is None else cache
+    name = f"{func.__module__}.{func.__name__}"
+    hit, value = cache.get(tg_id, name)
+    if hit:
+        return value
+    version = cache.version()
+    value = await run_blocking(func, tg_id)
+    cache.put(tg_id, name, value, version)
+    return value
@@ -1,65 +1,158 @@
-#databse/connection.py
-from utils.config import API_IP, API_PORT_SSH, API_USERNAME_SSH, API_PRIVATE_KEY_SSH, API_PASSWORD_SSH, DB_NAME, DB_USERNAME, DB_PASSWORD, DB_PORT
+#database/connection.py
+from utils.config import (
+    API_IP, API_PORT_SSH, API_USERNAME_SSH, API_PRIVATE_KEY_SSH, API_PASSWORD_SSH, DB_NAME, DB_USERNAME, DB_PASSWORD, DB_PORT,
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_VALIDATE_INTERVAL,
+    DB_TRANSPORT, DB_HOST, DB_SSLMODE, DB_SSLROOTCERT, DB_CONNECT_TIMEOUT, DB_TUNNEL_KEEPALIVE, DB_TUNNEL_PROBE_INTERVAL
+)
 import psycopg2
-from utils.logging_utils import setup_logger, retry_on_error, log_function_call
-from sshtunnel import SSHTunnelForwarder
+import const.const_db
+from database.pool import ConnectionPool
+from database.tunnel import TunnelManager, is_reachable
+from utils.logging_utils import setup_logger, log_function_call
 
 logger = setup_logger('connection.database', 'database.log')
 
-@retry_on_error(retries=3, delay=5)
+TRANSPORTS = ('ssh', 'direct', 'auto')
+
+# TCP keepalive на стороне libpq: мёртвое соединение обнаруживается за ~1 минуту,
+# а не висит до таймаута ОС
+CONNECT_OPTIONS = {
+    'connect_timeout': DB_CONNECT_TIMEOUT,
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+}
+
+
+def resolve_transport(transport=None):
+    """
+    Returns 'ssh' or 'direct'; 'auto' picks direct when the database port is reachable.
+    """
+    transport = transport or DB_TRANSPORT
+    if transport not in TRANSPORTS:
+        raise ValueError(f"Unknown DB_TRANSPORT {transport!r}, expected one of {TRANSPORTS}")
+    if transport == 'auto':
+        transport = 'direct' if DB_HOST and is_reachable(DB_HOST, DB_PORT) else 'ssh'
+        logger.info(f"DB_TRANSPORT=auto resolved to {transport}.")
+    return transport
+
+
+def open_tunnel(on_reconnect=None, monitor=True):
+    """
+    Starts a monitored SSH tunnel to the database port on the API host.
+    """
+    return TunnelManager(
+        (API_IP, API_PORT_SSH),
+        ssh_username=API_USERNAME_SSH,
+        ssh_pkey=API_PRIVATE_KEY_SSH,
+        ssh_private_key_password=API_PASSWORD_SSH,
+        remote_bind_address=('localhost', DB_PORT),
+        keepalive=DB_TUNNEL_KEEPALIVE,
+        probe_interval=DB_TUNNEL_PROBE_INTERVAL,
+        on_reconnect=on_reconnect,
+    ).start(monitor=monitor)
+
+
+def make_connect(transport, tunnel=None):
+    """
+    Returns a function opening one psycopg2 connection over the given transport.
+    Over ssh the tunnel address is read on every call, so new connections
+    follow the tunnel when it is re-established on another port.
+    """
+    def connect():
+        if transport == 'direct':
+            return psycopg2.connect(
+                database=DB_NAME, user=DB_USERNAME, password=DB_PASSWORD,
+                host=DB_HOST, port=DB_PORT, sslmode=DB_SSLMODE, sslrootcert=DB_SSLROOTCERT,
+                **CONNECT_OPTIONS,
+            )
+        host, port = tunnel.local_address
+        return psycopg2.connect(
+            database=DB_NAME, user=DB_USERNAME, password=DB_PASSWORD,
+            host=host, port=port, **CONNECT_OPTIONS,
+        )
+    return connect
+
+
 @log_function_call(logger)
-def connect_to_db():
+def connect_to_db(transport=None):
     """
-    Establishes a secure connection to the database via SSH tunnel.
+    Establishes the database connection pool over an SSH tunnel or a direct TLS connection.
+    Returns (tunnel, pool); tunnel is None for the direct transport.
     """
     tunnel = None
-    conn = None
+    pool = None
     try:
-        tunnel = SSHTunnelForwarder(
-            (API_IP, API_PORT_SSH),
-            ssh_username=API_USERNAME_SSH,
-            ssh_private_key=API_PRIVATE_KEY_SSH,
-            ssh_private_key_password=API_PASSWORD_SSH,
-            remote_bind_address=('localhost', DB_PORT),
-            local_bind_address=('localhost', 6349),
-        )
-        tunnel.start()
-        logger.info("SSH tunnel established successfully.")
-
-        conn = psycopg2.connect(
-            database=DB_NAME,
-            user=DB_USERNAME,
-            password=DB_PASSWORD,
-            host=tunnel.local_bind_host,
-            port=tunnel.local_bind_port,
-        )
-        conn.autocommit = True
+        transport = resolve_transport(transport)
+        if transport == 'ssh':
+            tunnel = open_tunnel()
+            logger.info("SSH tunnel established successfully.")
 
-        cur = conn.cursor()
-        logger.info("Database connection established successfully.")
-        return tunnel, conn, cur
+        pool = ConnectionPool(
+            make_connect(transport, tunnel),
+            minconn=DB_POOL_MIN,
+            maxconn=DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
+            validate_interval=DB_POOL_VALIDATE_INTERVAL,
+        )
+        if tunnel:
+            # Соединения через старый туннель мертвы: пул закрывает их и открывает новые
+            tunnel.on_reconnect = lambda host, port: pool.reset()
+        logger.info(f"Database connection pool established successfully over {transport}.")
+        return tunnel, pool
 
     except Exception as e:
         logger.error(f"Error while connecting to database: {str(e)}")
+        if pool:
+            pool.closeall()
         if tunnel:
-            tunnel.close()
-        if conn:
-            conn.close()
+            tunnel.stop()
         raise
 
 
 @log_function_call(logger)
-def disconnect_from_db(conn, tunnel):
+def disconnect_from_db(pool, tunnel):
     """
-    Closes database and SSH tunnel connections safely.
+    Closes database pool and SSH tunnel connections safely.
     """
     logger.info("Disconnecting from the database and stopping SSH tunnel.")
     try:
-        if conn:
-            conn.close()
+        if pool:
+            pool.closeall()
         if tunnel:
             tunnel.stop()
         logger.info("Database connections closed successfully.")
     except Exception as e:
         logger.error(f"Error while disconnecting from database: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def get_pool():
+    """
+    Returns the active connection pool or raises if login_db was not called.
+    """
+    if const.const_db.POOL is None:
+        raise RuntimeError("Database pool is not initialised, call middleware.connection.login_db() first")
+    return const.const_db.POOL
+
+
+def get_cursor():
+    """
+    Checks out a cursor on its own pooled connection for a single operation.
+    """
+    return get_pool().cursor()
+
+
+def get_transaction():
+    """
+    Checks out a cursor whose statements run in one transaction.
+    """
+    return get_pool().transaction()
+
+
+def get_server_cursor(name, itersize=1000):
+    """
+    Checks out a named server-side cursor that streams rows in batches of itersize.
+    """
+    return get_pool().transaction(name=name, itersize=itersize)
@@ -0,0 +1,65 @@
+#database/executor.py
+import psycopg2
+from utils.config import DB_POOL_MAX, DB_CONNECT_WORKERS
+from utils.executors import ExecutorBridge, register_executor
+from utils.logging_utils import setup_logger
+from utils.resilience import get_breaker
+
+logger = setup_logger('executor.database', 'database.log')
+
+
+def is_db_failure(e):
+    """
+    True for errors meaning Postgres or the way to it is down, not a bad query.
+    A busy pool, a deadlock or a cancelled statement is load, not an outage, and does not count.
+    """
+    if isinstance(e, (psycopg2.extensions.TransactionRollbackError, psycopg2.extensions.QueryCanceledError)):
+        return False
+    return isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError, OSError))
+
+
+DB_BREAKER = get_breaker('postgres', is_failure=is_db_failure)
+
+# Каждый запрос берёт своё соединение из пула, поэтому потоков столько же,
+# сколько соединений: больше держать бессмысленно, они будут ждать пул.
+DB_EXECUTOR = register_executor(ExecutorBridge('postgres', DB_POOL_MAX, DB_BREAKER))
+# Подключение, миграции и отключение (SSH-туннель, создание пула) идут
+# отдельно и не занимают потоки запросов. Без предохранителя: отключение
+# должно пройти и при недоступной БД, а вход проверяет его сам.
+DB_CONNECT_EXECUTOR = register_executor(ExecutorBridge('postgres-connect', DB_CONNECT_WORKERS))
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking database call in DB_EXECUTOR and awaits its result.
+    While the postgres circuit is open the call fails with CircuitOpenError at once.
+    """
+    try:
+        return await DB_EXECUTOR.run(func, *args, **kwargs)
+    except Exception as e:
+        logger.error(f"Error in run_blocking for {getattr(func, '__name__', func)}: {str(e)}")
+        raise
+
+
+async def run_connect(func, *args, **kwargs):
+    """
+    Runs a blocking connect, migrate or disconnect call in DB_CONNECT_EXECUTOR.
+    """
+    try:
+        return await DB_CONNECT_EXECUTOR.run(func, *args, **kwargs)
+    except Exception as e:
+        logger.error(f"Error in run_connect for {getattr(func, '__name__', func)}: {str(e)}")
+        raise
+
+
+async def run_cleanup(func, *args, **kwargs):
+    """
+    Runs a blocking call that gives a connection back to the pool in
+    DB_EXECUTOR, past the postgres circuit: it must not be rejected during
+    an outage, or the pool slot is lost.
+    """
+    try:
+        return await DB_EXECUTOR.run_unguarded(func, *args, **kwargs)
+    except Exception as e:
+        logger.error(f"Error in run_cleanup for {getattr(func, '__name__', func)}: {str(e)}")
+        raise
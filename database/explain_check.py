@@ -0,0 +1,266 @@
+#database/explain_check.py
+import argparse
+import inspect
+import json
+import os
+import sys
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import psycopg2
+import database.balance
+import database.broadcast
+import database.outbox
+import database.referrals
+import database.reminders
+import database.renewal
+import database.user
+from database.migrate import apply_migrations
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('explain_check.database', 'database.log')
+
+# Модули, все запросы которых проверяются планировщиком
+CHECKED_MODULES = [database.user, database.referrals, database.balance, database.renewal, database.outbox,
+                   database.broadcast, database.reminders]
+
+# Таблицы, которые заполняются синтетическими данными: Seq Scan по ним считается регрессией
+LARGE_TABLES = {'users', 'referrals'}
+SYNTHETIC_ROWS = 200000
+NOW_TS = 1_760_000_000_000
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Функции, которые по смыслу читают всю таблицу целиком
+FULL_SCAN_ALLOWED = {
+    'select_all_users',
+    'select_panel_loads',
+    'select_all_referrals_with_every_user',
+    'select_monthly_bonus_preview',
+    'credit_monthly_bonus',
+}
+
+# Значения аргументов по имени параметра. Новая функция в database/*.py с
+# незнакомым параметром роняет проверку, пока сюда не добавят пример.
+SAMPLE_ARGS = {
+    'tg_id': 500,
+    'user_id': '6f1c7c84-0b55-4a4f-9a43-3b0f4f3f8c11',
+    'email': 'user500',
+    'date': NOW_TS + 30 * DAY_MS,
+    'sub_id': 'abcdefgh12345678',
+    'vless_profile': 'vless://sample',
+    'login_date': NOW_TS,
+    'trial_date': NOW_TS,
+    'referrer_id': '700',
+    'referrer_tg_id': 700,
+    'referrer_tg_ids': [700, 701, 702],
+    'amount': 20,
+    'now_ts': NOW_TS,
+    'trial_threshold_ms': 3 * DAY_MS,
+    'bonus_per_user': 20,
+    'period': '2025-10',
+    'kind': 'adjustment',
+    'reference': 'sample',
+    'reservation_id': 42,
+    'ttl_ms': 30 * 60 * 1000,
+    'columns': ('tg_id', 'date'),
+    'where': 'date > %s AND date <= %s',
+    'params': (NOW_TS + DAY_MS - 60 * 60 * 1000, NOW_TS + DAY_MS),
+    'run_id': 'renew-sample',
+    'after_tg_id': 500,
+    'limit': 200,
+    'items': [(500, NOW_TS, NOW_TS + 30 * DAY_MS), (501, NOW_TS, NOW_TS + 30 * DAY_MS)],
+    'renewed_tg_ids': [500, 501],
+    'failures': [(502, 'timeout')],
+    'last_tg_id': 502,
+    'panel': 'main',
+    'idempotency_key': 'add:500:sample',
+    'lease_ms': 60 * 1000,
+    'outbox_ids': [1, 2],
+    'outbox_id': 1,
+    'error': 'timeout',
+    'retry_at': NOW_TS + 60 * 1000,
+    'job_id': 'broadcast-sample',
+    'text': 'sample',
+    'admin_chat_id': 700,
+    'results': [(500, 'delivered', None), (501, 'blocked', 'Forbidden')],
+    'status': 'finished',
+    'statuses': ['failed', 'pending'],
+    'offsets': [('7d', 7 * DAY_MS), ('1d', DAY_MS), ('1h', 60 * 60 * 1000)],
+    'from_ts': NOW_TS,
+    'until_ts': NOW_TS + 60 * 60 * 1000,
+    'expiry': NOW_TS + DAY_MS,
+    'offset_name': '1d',
+}
+
+
+class RecordingCursor:
+    """
+    Cursor stand-in that records every statement instead of running it.
+    """
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+
+    def fetchone(self):
+        return (1,)
+
+    def fetchall(self):
+        return []
+
+    def fetchmany(self, size=None):
+        return []
+
+    def __iter__(self):
+        return iter([])
+
+    def close(self):
+        pass
+
+
+def collect_queries():
+    """
+    Calls every public function of CHECKED_MODULES against a recording cursor.
+    Returns a list of (function_name, query, params).
+    """
+    collected = []
+    for module in CHECKED_MODULES:
+        functions = [
+            (name, func) for name, func in inspect.getmembers(module, inspect.isfunction)
+            if func.__module__ == module.__name__ and not name.startswith('_')
+        ]
+        for name, func in functions:
+            params = inspect.signature(func).parameters
+            missing = [param for param in params if param not in SAMPLE_ARGS and params[param].default is inspect.Parameter.empty]
+            if missing:
+                raise KeyError(f"No sample value for {module.__name__}.{name} parameters {missing}, add them to SAMPLE_ARGS")
+            kwargs = {param: SAMPLE_ARGS[param] for param in params if param in SAMPLE_ARGS}
+
+            statements = []
+
+            @contextmanager
+            def recording_cursor(*args, **kw):
+                yield RecordingCursor(statements)
+
+            # Функция может звать другой проверяемый модуль, поэтому подменяются все
+            patches = [patch.object(checked, helper, recording_cursor)
+                       for checked in CHECKED_MODULES
+                       for helper in ('get_cursor', 'get_transaction', 'get_server_cursor') if hasattr(checked, helper)]
+            for item in patches:
+                item.start()
+            try:
+                result = func(**kwargs)
+                if inspect.isgenerator(result):
+                    list(result)
+            except Exception as e:
+                # Заглушка курсора не знает формы строк: функция может упасть,
+                # разбирая результат, но её запросы к этому моменту уже записаны
+                if not statements:
+                    raise
+                logger.info(f"{module.__name__}.{name} failed on recorded results: {str(e)}")
+            finally:
+                for item in patches:
+                    item.stop()
+
+            for query, query_params in statements:
+                collected.append((f"{module.__name__}.{name}", query, query_params))
+    return collected
+
+
+def seed_synthetic_data(cur, rows=SYNTHETIC_ROWS):
+    """
+    Fills users and referrals with rows of realistic shape and refreshes statistics.
+    """
+    cur.execute("""
+    INSERT INTO users (tg_id, user_id, email, date, sub_id, vless_profile, login_date, trial_date)
+    SELECT g, md5(g::text), 'user' || g, %(now)s + ((g %% 120) - 30)::bigint * %(day)s, md5(g::text),
+           'vless://' || md5(g::text) || repeat('x', 200), %(now)s,
+           CASE WHEN g %% 3 = 0 THEN %(now)s - %(day)s END
+    FROM generate_series(1, %(rows)s) g
+    """, {'now': NOW_TS, 'day': DAY_MS, 'rows': rows})
+    cur.execute("""
+    INSERT INTO referrals (tg_id, referrer_tg_id, meow_coins_balance)
+    SELECT g, CASE WHEN g %% 4 = 0 THEN NULL ELSE (g %% 5000) + 1 END, g %% 500
+    FROM generate_series(1, %(rows)s) g
+    """, {'rows': rows})
+    cur.execute("ANALYZE users")
+    cur.execute("ANALYZE referrals")
+
+
+def find_seq_scans(plan):
+    """
+    Returns relation names read by Seq Scan nodes anywhere in an EXPLAIN JSON plan.
+    """
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+def check_plans(conn, rows=SYNTHETIC_ROWS, migrations=None):
+    """
+    Builds the schema and synthetic data in a scratch schema inside one transaction,
+    EXPLAINs every collected query and rolls everything back.
+    Returns (plans, regressions) where regressions lists (function, tables, query).
+    """
+    queries = collect_queries()
+    plans = []
+    regressions = []
+    previous_autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE SCHEMA explain_check")
+            cur.execute("SET LOCAL search_path TO explain_check")
+            apply_migrations(cur, migrations)
+            seed_synthetic_data(cur, rows)
+
+            for name, query, params in queries:
+                if not isinstance(query, str):
+                    query = query.as_string(cur)
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                plan = plan[0]['Plan']
+                plans.append((name, query, plan))
+
+                tables = sorted({table for table in find_seq_scans(plan) if table in LARGE_TABLES})
+                if tables and name.rsplit('.', 1)[1] not in FULL_SCAN_ALLOWED:
+                    regressions.append((name, tables, query))
+    finally:
+        conn.rollback()
+        conn.autocommit = previous_autocommit
+    return plans, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail if a query in database/*.py regresses to a sequential scan.")
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_DSN'), required=os.getenv('DATABASE_DSN') is None,
+                        help="libpq connection string of a scratch Postgres (default: $DATABASE_DSN)")
+    parser.add_argument('--rows', type=int, default=SYNTHETIC_ROWS, help="synthetic rows per table")
+    parser.add_argument('--verbose', action='store_true', help="print every plan")
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        plans, regressions = check_plans(conn, args.rows)
+    finally:
+        conn.close()
+
+    for name, query, plan in plans:
+        if args.verbose:
+            print(f"--- {name}\n{json.dumps(plan, indent=2)}")
+    for name, tables, query in regressions:
+        print(f"SEQ SCAN on {', '.join(tables)} in {name}:\n{query.strip()}\n", file=sys.stderr)
+    print(f"{len(plans)} queries checked, {len(regressions)} regressions.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
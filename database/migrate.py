@@ -0,0 +1,192 @@
+#database/migrate.py
+import argparse
+import hashlib
+import os
+import re
+import sys
+from collections import namedtuple
+
+import psycopg2
+from utils.logging_utils import setup_logger, log_function_call
+
+logger = setup_logger('migrate.database', 'database.log')
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_([a-z0-9_]+)\.sql$')
+# Ключ pg_advisory_lock: два процесса бота не накатывают миграции одновременно
+MIGRATIONS_LOCK_ID = 4823001
+
+Migration = namedtuple('Migration', ['version', 'name', 'sql', 'checksum'])
+
+
+class MigrationError(Exception):
+    """
+    Raised when the migrations directory or the applied history is inconsistent.
+    """
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """
+    Reads NNNN_name.sql files from directory, ordered by version.
+    """
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), 'r', encoding='utf-8') as file:
+            sql = file.read()
+        checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        migrations.append(Migration(int(match.group(1)), match.group(2), sql, checksum))
+
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def ensure_migrations_table(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """)
+
+
+def select_applied(cur):
+    """
+    Returns {version: checksum} of already applied migrations.
+    """
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cur.fetchall())
+
+
+def pending_migrations(applied, migrations):
+    """
+    Returns migrations that are not applied yet, failing if an applied file was edited.
+    """
+    pending = []
+    for migration in migrations:
+        if migration.version not in applied:
+            pending.append(migration)
+        elif applied[migration.version] != migration.checksum:
+            raise MigrationError(
+                f"Migration {migration.version:04d}_{migration.name} was changed after being applied"
+            )
+    return pending
+
+
+def apply_migrations(cur, migrations=None):
+    """
+    Applies pending migrations on cur without committing.
+    Used by migrate() and by checks that run inside a throwaway transaction.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    ensure_migrations_table(cur)
+    applied = []
+    for migration in pending_migrations(select_applied(cur), migrations):
+        cur.execute(migration.sql)
+        cur.execute(
+            "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+            (migration.version, migration.name, migration.checksum)
+        )
+        applied.append(migration)
+    return applied
+
+
+@log_function_call(logger)
+def migrate(conn, migrations=None):
+    """
+    Applies pending migrations, each in its own transaction, under an advisory lock.
+    Returns the list of applied migrations.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        try:
+            conn.autocommit = False
+            applied = []
+            with conn.cursor() as cur:
+                ensure_migrations_table(cur)
+                pending = pending_migrations(select_applied(cur), migrations)
+            conn.commit()
+
+            for migration in pending:
+                try:
+                    with conn.cursor() as cur:
+                        applied.extend(apply_migrations(cur, [migration]))
+                    conn.commit()
+                    logger.info(f"Applied migration {migration.version:04d}_{migration.name}.")
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Migration {migration.version:04d}_{migration.name} failed: {str(e)}")
+                    raise
+
+            if not applied:
+                logger.info("Database schema is up to date.")
+            return applied
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_ID,))
+    finally:
+        conn.autocommit = previous_autocommit
+
+
+@log_function_call(logger)
+def migrate_pool(pool):
+    """
+    Applies pending migrations using a connection checked out from the bot's pool.
+    """
+    with pool.connection() as conn:
+        return migrate(conn)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply database migrations.")
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_DSN'),
+                        help="libpq connection string, e.g. postgresql://postgres@localhost/nowmeow "
+                             "(default: $DATABASE_DSN, otherwise the bot's SSH tunnel settings)")
+    parser.add_argument('--status', action='store_true', help="only list pending migrations")
+    args = parser.parse_args(argv)
+
+    if args.dsn:
+        conn = psycopg2.connect(args.dsn)
+        tunnel = None
+    else:
+        import database.connection
+        tunnel, pool = database.connection.connect_to_db()
+        conn = pool.getconn()
+
+    try:
+        if args.status:
+            with conn.cursor() as cur:
+                ensure_migrations_table(cur)
+                pending = pending_migrations(select_applied(cur), load_migrations())
+            conn.commit()
+            for migration in pending:
+                print(f"pending {migration.version:04d}_{migration.name}")
+            if not pending:
+                print("up to date")
+        else:
+            for migration in migrate(conn):
+                print(f"applied {migration.version:04d}_{migration.name}")
+        return 0
+    except MigrationError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+        if tunnel:
+            tunnel.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,17 @@
+-- Базовые таблицы бота. IF NOT EXISTS: на рабочей базе они уже созданы вручную.
+CREATE TABLE IF NOT EXISTS users (
+    tg_id BIGINT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    date BIGINT NOT NULL,
+    sub_id TEXT NOT NULL,
+    vless_profile TEXT NOT NULL,
+    login_date BIGINT,
+    trial_date BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS referrals (
+    tg_id BIGINT PRIMARY KEY,
+    referrer_tg_id BIGINT,
+    meow_coins_balance INTEGER NOT NULL DEFAULT 0
+);
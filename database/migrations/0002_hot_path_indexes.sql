@@ -0,0 +1,7 @@
+-- users.date: напоминания об истечении и выборки активных пользователей.
+CREATE INDEX IF NOT EXISTS idx_users_date ON users (date);
+
+-- referrals.referrer_tg_id: статистика рефералов и проверка симметричной пары
+-- (referrer_tg_id = %s AND tg_id = %s) обслуживаются одним составным индексом.
+-- referrals.tg_id покрыт первичным ключом.
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer_tg_id ON referrals (referrer_tg_id, tg_id);
@@ -0,0 +1,17 @@
+-- Журнал ежемесячных реферальных бонусов: одна строка на период и одна на реферера.
+CREATE TABLE IF NOT EXISTS referral_bonus_runs (
+    period TEXT PRIMARY KEY,
+    started_at BIGINT NOT NULL,
+    referrers INTEGER NOT NULL DEFAULT 0,
+    active_users INTEGER NOT NULL DEFAULT 0,
+    total_amount BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS referral_bonus_ledger (
+    period TEXT NOT NULL REFERENCES referral_bonus_runs (period),
+    referrer_tg_id BIGINT NOT NULL,
+    active_users INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    credited_at BIGINT NOT NULL,
+    PRIMARY KEY (period, referrer_tg_id)
+);
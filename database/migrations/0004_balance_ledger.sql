@@ -0,0 +1,36 @@
+-- Журнал движений мяу-коинов и резервы под выставленные счета.
+-- referrals.meow_coins_balance остаётся материализованным балансом (сумма журнала),
+-- referrals.reserved_coins - сумма активных резервов; доступно = баланс - резерв.
+ALTER TABLE referrals ADD COLUMN IF NOT EXISTS reserved_coins INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS balance_transactions (
+    id BIGSERIAL PRIMARY KEY,
+    tg_id BIGINT NOT NULL,
+    amount INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    reference TEXT,
+    created_at BIGINT NOT NULL DEFAULT (extract(epoch FROM now()) * 1000)::bigint,
+    UNIQUE (tg_id, kind, reference)
+);
+
+CREATE INDEX IF NOT EXISTS idx_balance_transactions_tg_id ON balance_transactions (tg_id, id);
+
+-- Стартовые записи, чтобы сумма журнала совпадала с уже накопленными балансами
+INSERT INTO balance_transactions (tg_id, amount, kind, reference)
+SELECT tg_id, meow_coins_balance, 'opening', 'opening'
+FROM referrals
+WHERE meow_coins_balance <> 0
+ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS balance_reservations (
+    id BIGSERIAL PRIMARY KEY,
+    tg_id BIGINT NOT NULL,
+    amount INTEGER NOT NULL CHECK (amount > 0),
+    status TEXT NOT NULL DEFAULT 'held' CHECK (status IN ('held', 'committed', 'released', 'expired')),
+    created_at BIGINT NOT NULL,
+    expires_at BIGINT NOT NULL,
+    settled_at BIGINT
+);
+
+CREATE INDEX IF NOT EXISTS idx_balance_reservations_held_expires_at
+    ON balance_reservations (expires_at) WHERE status = 'held';
@@ -0,0 +1,24 @@
+-- Массовое продление подписок: запуск с контрольной точкой и строка на пользователя.
+-- new_date фиксируется при первой обработке, поэтому повтор после сбоя
+-- отправляет в панель ту же дату и не продлевает подписку дважды.
+CREATE TABLE IF NOT EXISTS renewal_runs (
+    run_id TEXT PRIMARY KEY,
+    period TEXT NOT NULL,
+    where_sql TEXT,
+    params JSONB NOT NULL DEFAULT '[]',
+    started_at BIGINT NOT NULL,
+    finished_at BIGINT,
+    last_tg_id BIGINT,
+    renewed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS renewal_items (
+    run_id TEXT NOT NULL REFERENCES renewal_runs (run_id),
+    tg_id BIGINT NOT NULL,
+    old_date BIGINT NOT NULL,
+    new_date BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'failed')),
+    error TEXT,
+    PRIMARY KEY (run_id, tg_id)
+);
@@ -0,0 +1,6 @@
+-- Панель 3X-UI, на которой размещён клиент пользователя.
+-- Все существующие клиенты живут на основной панели 'main'.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS panel TEXT NOT NULL DEFAULT 'main';
+
+-- Подсчёт клиентов по панелям при старте читает только индекс
+CREATE INDEX IF NOT EXISTS idx_users_panel ON users (panel);
@@ -0,0 +1,24 @@
+-- Намерения изменить клиента на панели 3X-UI. Пишутся в одной транзакции
+-- с изменением users и доставляются на панель фоновым воркером.
+-- action: 'add' - создать клиента, 'update' - отправить текущую дату из users.
+-- Строка users читается при доставке, поэтому повторная отправка идемпотентна.
+CREATE TABLE IF NOT EXISTS provisioning_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    tg_id BIGINT NOT NULL,
+    action TEXT NOT NULL CHECK (action IN ('add', 'update')),
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'dead')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    -- Не раньше этого момента (мс): время следующей попытки или конец аренды воркером
+    available_at BIGINT NOT NULL,
+    last_error TEXT,
+    created_at BIGINT NOT NULL,
+    done_at BIGINT
+);
+
+-- Воркер выбирает только ожидающие строки
+CREATE INDEX IF NOT EXISTS idx_provisioning_outbox_pending
+    ON provisioning_outbox (available_at, id) WHERE status = 'pending';
+-- Намерения одного пользователя доставляются по порядку
+CREATE INDEX IF NOT EXISTS idx_provisioning_outbox_pending_tg_id
+    ON provisioning_outbox (tg_id, id) WHERE status = 'pending';
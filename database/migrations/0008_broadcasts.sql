@@ -0,0 +1,27 @@
+-- Рассылки администратора: задание с контрольной точкой и строка на получателя.
+-- Результат каждой отправки сохраняется, поэтому после перезапуска задание
+-- продолжается с контрольной точки и не пишет одному человеку дважды.
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    job_id TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    where_sql TEXT,
+    params JSONB NOT NULL DEFAULT '[]',
+    -- Чат администратора, куда пишется ход рассылки
+    admin_chat_id BIGINT,
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'finished', 'cancelled')),
+    started_at BIGINT NOT NULL,
+    finished_at BIGINT,
+    last_tg_id BIGINT,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    job_id TEXT NOT NULL REFERENCES broadcast_jobs (job_id),
+    tg_id BIGINT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('delivered', 'blocked', 'failed')),
+    error TEXT,
+    sent_at BIGINT NOT NULL,
+    PRIMARY KEY (job_id, tg_id)
+);
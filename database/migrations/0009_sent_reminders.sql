@@ -0,0 +1,10 @@
+-- Отправленные напоминания об окончании подписки: одна строка на дату окончания
+-- и отступ ('7d', '1d', '1h'). Строка пишется до отправки, поэтому после
+-- перезапуска напоминание не уходит второй раз, а продление даёт новые.
+CREATE TABLE IF NOT EXISTS sent_reminders (
+    tg_id BIGINT NOT NULL,
+    expiry BIGINT NOT NULL,
+    offset_name TEXT NOT NULL,
+    sent_at BIGINT NOT NULL,
+    PRIMARY KEY (tg_id, expiry, offset_name)
+);
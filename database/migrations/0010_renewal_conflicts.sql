@@ -0,0 +1,8 @@
+-- Продление не перезаписывает дату, которую успели изменить после постановки
+-- пользователя в запуск (оплата, другое продление, outbox): такая строка
+-- получает статус 'conflict', а панель сверяется с текущей датой через outbox.
+ALTER TABLE renewal_items DROP CONSTRAINT IF EXISTS renewal_items_status_check;
+ALTER TABLE renewal_items ADD CONSTRAINT renewal_items_status_check
+    CHECK (status IN ('pending', 'done', 'failed', 'conflict'));
+
+ALTER TABLE renewal_runs ADD COLUMN IF NOT EXISTS conflicts INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,147 @@
+#database/outbox.py
+from collections import namedtuple
+from database.cache import USER_CACHE
+from database.connection import get_cursor, get_transaction
+from utils.logging_utils import setup_logger, log_function_call
+
+logger = setup_logger('outbox.database', 'database.log')
+
+# Намерение вместе с текущей строкой users; поля пользователя None, если его уже нет
+OutboxItem = namedtuple('OutboxItem', [
+    'id', 'action', 'attempts', 'tg_id', 'user_id', 'email', 'date', 'sub_id', 'panel',
+])
+
+ENQUEUE_QUERY = """
+INSERT INTO provisioning_outbox (idempotency_key, tg_id, action, available_at, created_at)
+VALUES (%s, %s, %s, %s, %s)
+ON CONFLICT (idempotency_key) DO NOTHING
+"""
+
+
+@log_function_call(logger)
+def insert_user_with_intent(tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel, idempotency_key, now_ts):
+    """
+    Inserts the users row and the 'add' intent for its panel client in one transaction.
+    """
+    try:
+        with get_transaction() as cur:
+            cur.execute("""
+            INSERT INTO users (tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, (tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel))
+            cur.execute(ENQUEUE_QUERY, (idempotency_key, tg_id, 'add', now_ts, now_ts))
+        USER_CACHE.invalidate(tg_id)
+        logger.info(f"Inserted user tg_id={tg_id} with provisioning intent {idempotency_key}.")
+    except Exception as e:
+        logger.error(f"Error in insert_user_with_intent: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def update_user_date_with_intent(date, tg_id, idempotency_key, now_ts):
+    """
+    Sets the user's expiry date and records the 'update' intent in one transaction.
+    """
+    try:
+        with get_transaction() as cur:
+            cur.execute("UPDATE users SET date = %s WHERE tg_id = %s", (date, tg_id))
+            cur.execute(ENQUEUE_QUERY, (idempotency_key, tg_id, 'update', now_ts, now_ts))
+        USER_CACHE.invalidate(tg_id)
+        logger.info(f"Updated date of tg_id={tg_id} with provisioning intent {idempotency_key}.")
+    except Exception as e:
+        logger.error(f"Error in update_user_date_with_intent: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def claim_outbox(limit, lease_ms, now_ts):
+    """
+    Leases up to limit due intents for lease_ms and returns them as OutboxItem.
+    An intent waits while an older one of the same user is pending, and
+    SKIP LOCKED lets several workers claim without blocking each other.
+    Intents of a worker that died come back when the lease runs out.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            WITH claimed AS (
+                UPDATE provisioning_outbox o
+                SET available_at = %(lease_until)s, attempts = o.attempts + 1
+                WHERE o.id IN (
+                    SELECT p.id
+                    FROM provisioning_outbox p
+                    WHERE p.status = 'pending' AND p.available_at <= %(now)s
+                      AND NOT EXISTS (
+                          SELECT 1 FROM provisioning_outbox e
+                          WHERE e.tg_id = p.tg_id AND e.status = 'pending' AND e.id < p.id
+                      )
+                    ORDER BY p.available_at, p.id
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING o.id, o.action, o.attempts, o.tg_id
+            )
+            SELECT c.id, c.action, c.attempts, c.tg_id, u.user_id, u.email, u.date, u.sub_id, u.panel
+            FROM claimed c
+            LEFT JOIN users u ON u.tg_id = c.tg_id
+            ORDER BY c.id
+            """, {'lease_until': now_ts + lease_ms, 'now': now_ts, 'limit': limit})
+            return [OutboxItem(*row) for row in cur.fetchall()]
+    except Exception as e:
+        logger.error(f"Error in claim_outbox: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def complete_outbox(outbox_ids, now_ts):
+    """
+    Marks delivered intents as done.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            UPDATE provisioning_outbox
+            SET status = 'done', done_at = %s, last_error = NULL
+            WHERE id = ANY(%s) AND status = 'pending'
+            """, (now_ts, list(outbox_ids)))
+    except Exception as e:
+        logger.error(f"Error in complete_outbox: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def fail_outbox(outbox_id, error, retry_at, dead=False):
+    """
+    Records a failed delivery: the intent is retried at retry_at, or given up as dead.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            UPDATE provisioning_outbox
+            SET status = CASE WHEN %s THEN 'dead' ELSE status END, available_at = %s, last_error = %s
+            WHERE id = %s AND status = 'pending'
+            """, (dead, retry_at, error, outbox_id))
+    except Exception as e:
+        logger.error(f"Error in fail_outbox: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def select_outbox_stats(now_ts):
+    """
+    Returns (pending, due, dead, oldest_pending_created_at) of the outbox.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            SELECT count(*) FILTER (WHERE status = 'pending'),
+                   count(*) FILTER (WHERE status = 'pending' AND available_at <= %s),
+                   count(*) FILTER (WHERE status = 'dead'),
+                   min(created_at) FILTER (WHERE status = 'pending')
+            FROM provisioning_outbox
+            WHERE status <> 'done'
+            """, (now_ts,))
+            return cur.fetchone()
+    except Exception as e:
+        logger.error(f"Error in select_outbox_stats: {str(e)}")
+        raise
@@ -0,0 +1,242 @@
+#database/pool.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import PoolError
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('pool.database', 'database.log')
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no connection becomes available within the checkout timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    Every operation checks out its own connection and cursor, so queries from
+    different coroutines (running in the DB executor) no longer share one cursor.
+    Connections are validated on checkout and silently replaced when dead.
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=10, timeout=30, validate_interval=30):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+        self.connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        # Соединение, простоявшее меньше validate_interval секунд, проверяется
+        # только по флагам psycopg2, без лишнего SELECT 1 через туннель
+        self.validate_interval = validate_interval
+
+        self._idle = deque()  # (connection, returned_at)
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        # Поколение растёт при reset(): соединения старого поколения (например,
+        # через упавший туннель) закрываются при возврате в пул
+        self._generation = 0
+        self._generations = {}  # id(connection) -> generation
+
+        for _ in range(minconn):
+            conn = self._open()
+            self._idle.append((conn, time.monotonic()))
+            self._size += 1
+        logger.info(f"Connection pool created: minconn={minconn}, maxconn={maxconn}.")
+
+    def _open(self):
+        generation = self._generation
+        conn = self.connect()
+        conn.autocommit = True
+        with self._cond:
+            self._generations[id(conn)] = generation
+        return conn
+
+    def _close(self, conn):
+        self._generations.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error while closing pooled connection: {str(e)}")
+
+    def _is_healthy(self, conn, idle_for):
+        """
+        Returns True if the connection can be handed out.
+        """
+        if conn.closed:
+            return False
+        if idle_for < self.validate_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed validation: {str(e)}")
+            return False
+
+    def getconn(self):
+        """
+        Checks out a healthy connection, waiting up to timeout seconds if the pool is exhausted.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    conn, returned_at = None, None
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"No free connection after {self.timeout} seconds")
+                self._cond.wait(remaining)
+
+        # Открытие и проверка соединения идут вне блокировки, чтобы медленный
+        # туннель не задерживал остальные потоки
+        try:
+            if conn is not None and not self._is_healthy(conn, time.monotonic() - returned_at):
+                logger.warning("Replacing dead pooled connection.")
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard=False):
+        """
+        Returns a connection to the pool, closing it if discard is set or it is broken.
+        """
+        if not discard and not conn.closed:
+            try:
+                if not conn.autocommit:
+                    conn.rollback()
+                    conn.autocommit = True
+            except Exception as e:
+                logger.warning(f"Discarding connection that failed to reset: {str(e)}")
+                discard = True
+
+        with self._cond:
+            stale = self._generations.get(id(conn)) != self._generation
+            if discard or stale or conn.closed or self._closed:
+                self._size -= 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that checks out a connection and always returns it.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    @contextmanager
+    def cursor(self):
+        """
+        Context manager that yields a cursor on its own autocommit connection.
+        """
+        with self.connection() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    @contextmanager
+    def transaction(self, name=None, itersize=None):
+        """
+        Context manager that yields a cursor inside a single transaction.
+        Commits on success and rolls back on any exception.
+        With name set the cursor is a server-side (named) cursor that
+        fetches itersize rows per round trip.
+        """
+        with self.connection() as conn:
+            conn.autocommit = False
+            cur = conn.cursor(name=name) if name else conn.cursor()
+            if itersize:
+                cur.itersize = itersize
+            try:
+                yield cur
+                # Именованный курсор живёт только внутри транзакции: закрываем до commit
+                cur.close()
+                conn.commit()
+            except Exception:
+                try:
+                    if not conn.closed:
+                        conn.rollback()
+                except Exception as e:
+                    logger.error(f"Error while rolling back transaction: {str(e)}")
+                raise
+            finally:
+                if not cur.closed:
+                    try:
+                        cur.close()
+                    except psycopg2.Error:
+                        pass
+
+    def reset(self):
+        """
+        Drops every connection opened so far: idle ones are closed now,
+        checked-out ones when they are returned. Called after the transport
+        under the pool (the SSH tunnel) was re-established.
+        """
+        with self._cond:
+            self._generation += 1
+            stale = list(self._idle)
+            self._idle.clear()
+            self._size -= len(stale)
+            self._cond.notify_all()
+        for conn, _ in stale:
+            self._close(conn)
+        logger.info(f"Connection pool reset: closed {len(stale)} idle connections.")
+
+    def closeall(self):
+        """
+        Closes every idle connection and refuses further checkouts.
+        """
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._close(conn)
+            self._cond.notify_all()
+        logger.info("Connection pool closed.")
+
+    def stats(self):
+        """
+        Returns a snapshot of pool usage.
+        """
+        with self._cond:
+            return {'size': self._size, 'idle': len(self._idle), 'in_use': self._size - len(self._idle)}
@@ -1,5 +1,7 @@
 #database/referrals.py
-import const.const_db
+import database.balance
+from database.cache import USER_CACHE
+from database.connection import get_cursor, get_transaction
 from utils.logging_utils import setup_logger, retry_on_error, log_function_call
 
 logger = setup_logger('referrals.database', 'database.log')
@@ -33,8 +35,9 @@ def ensure_referral_record(tg_id, referrer_id):
     # Verify that the referrer exists in the referrals table
     try:
         check_referrer_query = "SELECT 1 FROM referrals WHERE tg_id = %s"
-        const.const_db.CUR.execute(check_referrer_query, (referrer_id,))
-        referrer_exists = const.const_db.CUR.fetchone()
+        with get_cursor() as cur:
+            cur.execute(check_referrer_query, (referrer_id,))
+            referrer_exists = cur.fetchone()
         if not referrer_exists:
             logger.info(f"Referrer does not exist: referrer_id={referrer_id}.")
             return False
@@ -51,8 +54,9 @@ def ensure_referral_record(tg_id, referrer_id):
               AND tg_id = %s
             LIMIT 1
         """
-        const.const_db.CUR.execute(symmetrical_check_query, (tg_id, referrer_id))
-        symmetrical_row = const.const_db.CUR.fetchone()
+        with get_cursor() as cur:
+            cur.execute(symmetrical_check_query, (tg_id, referrer_id))
+            symmetrical_row = cur.fetchone()
         if symmetrical_row:
             logger.info(f"Symmetrical referral detected between tg_id={tg_id} and referrer_id={referrer_id}.")
             return False
@@ -81,7 +85,9 @@ def insert_update_referrer(tg_id, referrer_id):
         ON CONFLICT (tg_id)
         DO UPDATE SET referrer_tg_id = EXCLUDED.referrer_tg_id;
         """
-        const.const_db.CUR.execute(query, (tg_id, referrer_id))
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id, referrer_id))
+        USER_CACHE.invalidate(tg_id)
         logger.info(f"Successfully set referrer_id={referrer_id} for tg_id={tg_id}.")
 
         return True
@@ -96,7 +102,9 @@ def insert_user_referrals(tg_id):
     """
     try:
         insert_query = "INSERT INTO referrals (tg_id) VALUES (%s)"
-        const.const_db.CUR.execute(insert_query, (tg_id,))
+        with get_cursor() as cur:
+            cur.execute(insert_query, (tg_id,))
+        USER_CACHE.invalidate(tg_id)
         logger.info(f"Successfully inserted user with tg_id={tg_id} into referrals.")
     except Exception as e:
         logger.error(f"Error in insert_user_referrals: {str(e)}")
@@ -106,12 +114,14 @@ def insert_user_referrals(tg_id):
 @log_function_call(logger)
 def get_balance(tg_id):
     """
-    Retrieves the user's meow-coins balance from referrals table.
+    Retrieves the user's available meow-coins balance (balance minus coins
+    reserved for open invoices) from referrals table.
     """
     try:
-        query = "SELECT meow_coins_balance FROM referrals WHERE tg_id = %s"
-        const.const_db.CUR.execute(query, (tg_id,))
-        row = const.const_db.CUR.fetchone()
+        query = "SELECT meow_coins_balance - reserved_coins FROM referrals WHERE tg_id = %s"
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            row = cur.fetchone()
         balance = row[0] if row else 0
         logger.info(f"Balance for tg_id={tg_id} is {balance}.")
         return balance
@@ -123,8 +133,9 @@ def get_balance(tg_id):
 def get_refferer(tg_id):
     try:
         query = "SELECT referrer_tg_id FROM referrals WHERE tg_id = %s"
-        const.const_db.CUR.execute(query, (tg_id,))
-        row = const.const_db.CUR.fetchone()
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            row = cur.fetchone()
         referrer = row[0] if row else None
         logger.info(f"Referrer for tg_id={tg_id} is {referrer}.")
         return referrer
@@ -144,8 +155,9 @@ def select_users_by_referrer(referrer_tg_id):
         FROM referrals
         WHERE referrer_tg_id = %s
         """
-        const.const_db.CUR.execute(query, (referrer_tg_id,))
-        users = const.const_db.CUR.fetchall()
+        with get_cursor() as cur:
+            cur.execute(query, (referrer_tg_id,))
+            users = cur.fetchall()
         result = [user[0] for user in users]
         logger.info(f"Found {result} users referred by {referrer_tg_id}.")
         return result
@@ -155,13 +167,45 @@ def select_users_by_referrer(referrer_tg_id):
 
 
 @log_function_call(logger)
-def update_balance(tg_id, amount):
+def select_active_referrals(referrer_tg_ids, now_ts):
     """
-    Updates (adds to) meow-coins balance for the specified tg_id.
+    Returns {referrer_tg_id: (active_count, [active tg_ids])} for every requested referrer
+    in a single query joining referrals with users. Referrers without active
+    referrals are present with (0, []).
     """
     try:
-        query = "UPDATE referrals SET meow_coins_balance = meow_coins_balance + %s WHERE tg_id = %s"
-        const.const_db.CUR.execute(query, (amount, tg_id))
+        referrer_tg_ids = list(referrer_tg_ids)
+        result = {referrer_tg_id: (0, []) for referrer_tg_id in referrer_tg_ids}
+        if not referrer_tg_ids:
+            return result
+
+        query = """
+        SELECT r.referrer_tg_id, COUNT(*), ARRAY_AGG(r.tg_id ORDER BY r.tg_id)
+        FROM referrals r
+        JOIN users u ON u.tg_id = r.tg_id
+        WHERE r.referrer_tg_id = ANY(%s)
+          AND u.date > %s
+        GROUP BY r.referrer_tg_id
+        """
+        with get_cursor() as cur:
+            cur.execute(query, (referrer_tg_ids, now_ts))
+            rows = cur.fetchall()
+        for referrer_tg_id, count, tg_ids in rows:
+            result[referrer_tg_id] = (count, tg_ids)
+        logger.info(f"Fetched active referrals for {len(referrer_tg_ids)} referrers.")
+        return result
+    except Exception as e:
+        logger.error(f"Error in select_active_referrals: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def update_balance(tg_id, amount, kind='adjustment', reference=None):
+    """
+    Updates (adds to) meow-coins balance for the specified tg_id through the balance ledger.
+    """
+    try:
+        database.balance.post_transaction(tg_id, amount, kind, reference)
         logger.info(f"Updated meow_coins_balance by {amount} for tg_id={tg_id}.")
     except Exception as e:
         logger.error(f"Error in update_balance: {str(e)}")
@@ -174,13 +218,14 @@ def select_all_referrals_with_every_user():
     Returns a list of (referrer_tg_id, array_of_referred_users).
     """
     try:
-        const.const_db.CUR.execute("""
-        SELECT referrer_tg_id, ARRAY_AGG(tg_id) AS referred_users
-        FROM referrals
-        WHERE referrer_tg_id IS NOT NULL
-        GROUP BY referrer_tg_id
-        """)
-        results = const.const_db.CUR.fetchall()
+        with get_cursor() as cur:
+            cur.execute("""
+            SELECT referrer_tg_id, ARRAY_AGG(tg_id) AS referred_users
+            FROM referrals
+            WHERE referrer_tg_id IS NOT NULL
+            GROUP BY referrer_tg_id
+            """)
+            results = cur.fetchall()
         logger.info(f"Fetched {results} referrer records.")
         return results
     except Exception as e:
@@ -195,11 +240,112 @@ def select_user_exists(tg_id):
     """
     try:
         query = "SELECT EXISTS(SELECT 1 FROM referrals WHERE tg_id = %s)"
-        const.const_db.CUR.execute(query, (tg_id,))
-        exists = const.const_db.CUR.fetchone()[0]
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            exists = cur.fetchone()[0]
         logger.info(f"Referrals existence for tg_id={tg_id}: {exists}")
         return exists
     except Exception as e:
         logger.error(f"Error while checking user existence in referrals: {str(e)}")
         raise
 
+
+
+# Правило активности для месячного бонуса: подписка не истекла и
+# (date - trial_date) больше порога, т.е. пользователь не остался на пробном периоде
+MONTHLY_BONUS_ELIGIBLE_CTE = """
+    eligible AS (
+        SELECT r.referrer_tg_id, COUNT(*) AS active_users
+        FROM referrals r
+        JOIN users u ON u.tg_id = r.tg_id
+        WHERE r.referrer_tg_id IS NOT NULL
+          AND u.date > %(now_ts)s
+          AND (u.trial_date IS NULL OR u.date - u.trial_date > %(trial_threshold_ms)s)
+        GROUP BY r.referrer_tg_id
+    )
+"""
+
+
+@log_function_call(logger)
+def select_monthly_bonus_preview(now_ts, trial_threshold_ms, bonus_per_user):
+    """
+    Returns (referrer_tg_id, active_users, amount) for every referrer eligible right now.
+    Read-only, used for the dry run.
+    """
+    try:
+        query = "WITH " + MONTHLY_BONUS_ELIGIBLE_CTE + """
+        SELECT e.referrer_tg_id, e.active_users, e.active_users * %(bonus)s
+        FROM eligible e
+        JOIN referrals ref ON ref.tg_id = e.referrer_tg_id
+        ORDER BY e.referrer_tg_id
+        """
+        params = {'now_ts': now_ts, 'trial_threshold_ms': trial_threshold_ms, 'bonus': bonus_per_user}
+        with get_cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        logger.info(f"Monthly bonus preview: {len(rows)} eligible referrers.")
+        return rows
+    except Exception as e:
+        logger.error(f"Error in select_monthly_bonus_preview: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def credit_monthly_bonus(period, now_ts, trial_threshold_ms, bonus_per_user):
+    """
+    Credits the monthly referral bonus for period in one transaction.
+    Returns the list of (referrer_tg_id, active_users, amount) credited,
+    or None if the period was already credited by an earlier run.
+    """
+    try:
+        params = {'period': period, 'now_ts': now_ts, 'trial_threshold_ms': trial_threshold_ms, 'bonus': bonus_per_user}
+        with get_transaction() as cur:
+            # Строка запуска блокирует параллельный запуск того же периода
+            # и фиксируется только вместе с начислениями
+            cur.execute("""
+            INSERT INTO referral_bonus_runs (period, started_at)
+            VALUES (%(period)s, %(now_ts)s)
+            ON CONFLICT (period) DO NOTHING
+            RETURNING period
+            """, params)
+            if cur.fetchone() is None:
+                logger.info(f"Monthly bonus for period {period} was already credited.")
+                return None
+
+            cur.execute("WITH " + MONTHLY_BONUS_ELIGIBLE_CTE + """,
+            credited AS (
+                INSERT INTO referral_bonus_ledger (period, referrer_tg_id, active_users, amount, credited_at)
+                SELECT %(period)s, e.referrer_tg_id, e.active_users, e.active_users * %(bonus)s, %(now_ts)s
+                FROM eligible e
+                JOIN referrals ref ON ref.tg_id = e.referrer_tg_id
+                ON CONFLICT (period, referrer_tg_id) DO NOTHING
+                RETURNING referrer_tg_id, active_users, amount
+            ),
+            posted AS (
+                INSERT INTO balance_transactions (tg_id, amount, kind, reference, created_at)
+                SELECT referrer_tg_id, amount, 'monthly_bonus', %(period)s, %(now_ts)s
+                FROM credited
+                ON CONFLICT (tg_id, kind, reference) DO NOTHING
+            ),
+            updated AS (
+                UPDATE referrals r
+                SET meow_coins_balance = r.meow_coins_balance + c.amount
+                FROM credited c
+                WHERE r.tg_id = c.referrer_tg_id
+            )
+            SELECT referrer_tg_id, active_users, amount FROM credited
+            """, params)
+            rows = cur.fetchall()
+
+            cur.execute("""
+            UPDATE referral_bonus_runs
+            SET referrers = %s, active_users = %s, total_amount = %s
+            WHERE period = %s
+            """, (len(rows), sum(row[1] for row in rows), sum(row[2] for row in rows), period))
+        # Начисление затронуло балансы многих пользователей сразу
+        USER_CACHE.clear()
+        logger.info(f"Monthly bonus for period {period} credited to {len(rows)} referrers.")
+        return rows
+    except Exception as e:
+        logger.error(f"Error in credit_monthly_bonus: {str(e)}")
+        raise
@@ -0,0 +1,57 @@
+#database/reminders.py
+from database.connection import get_cursor
+from utils.logging_utils import setup_logger, log_function_call
+
+logger = setup_logger('reminders.database', 'database.log')
+
+
+@log_function_call(logger)
+def select_upcoming_reminders(offsets, from_ts, until_ts, now_ts):
+    """
+    Returns (tg_id, date, offset_name) for every reminder due in (from_ts, until_ts]
+    that was not sent yet. offsets: [(offset_name, offset_ms)]; a reminder is due
+    offset_ms before the expiry. Each offset is one range scan of idx_users_date.
+    """
+    try:
+        ranges = " UNION ALL ".join(
+            "SELECT tg_id, date, %s::text AS offset_name FROM users WHERE date > %s AND date <= %s" for _ in offsets
+        )
+        params = []
+        for offset_name, offset_ms in offsets:
+            params += [offset_name, from_ts + offset_ms, until_ts + offset_ms]
+        with get_cursor() as cur:
+            cur.execute(f"""
+            SELECT c.tg_id, c.date, c.offset_name
+            FROM ({ranges}) c
+            WHERE c.date > %s
+              AND NOT EXISTS (
+                  SELECT 1 FROM sent_reminders s
+                  WHERE s.tg_id = c.tg_id AND s.expiry = c.date AND s.offset_name = c.offset_name
+              )
+            ORDER BY c.date
+            """, params + [now_ts])
+            return cur.fetchall()
+    except Exception as e:
+        logger.error(f"Error in select_upcoming_reminders: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def claim_reminder(tg_id, expiry, offset_name, now_ts):
+    """
+    Records the reminder as sent. Returns False if it was sent already or
+    the user's expiry is no longer expiry, so nothing must be sent.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            INSERT INTO sent_reminders (tg_id, expiry, offset_name, sent_at)
+            SELECT %s, %s, %s, %s
+            WHERE EXISTS (SELECT 1 FROM users WHERE tg_id = %s AND date = %s)
+            ON CONFLICT (tg_id, expiry, offset_name) DO NOTHING
+            RETURNING tg_id
+            """, (tg_id, expiry, offset_name, now_ts, tg_id, expiry))
+            return cur.fetchone() is not None
+    except Exception as e:
+        logger.error(f"Error in claim_reminder: {str(e)}")
+        raise
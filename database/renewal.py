@@ -0,0 +1,274 @@
+#database/renewal.py
+from collections import namedtuple
+from psycopg2 import sql
+from psycopg2.extras import Json
+from database.cache import USER_CACHE
+from database.connection import get_cursor, get_transaction
+from utils.logging_utils import setup_logger, log_function_call
+
+logger = setup_logger('renewal.database', 'database.log')
+
+RenewalRun = namedtuple('RenewalRun', [
+    'run_id', 'period', 'where_sql', 'params', 'started_at', 'finished_at', 'last_tg_id', 'renewed', 'failed',
+    'conflicts',
+])
+
+
+@log_function_call(logger)
+def start_renewal_run(run_id, period, where, params, now_ts):
+    """
+    Creates the run record, or returns the existing one when resuming run_id.
+    """
+    try:
+        with get_transaction() as cur:
+            cur.execute("""
+            INSERT INTO renewal_runs (run_id, period, where_sql, params, started_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (run_id) DO NOTHING
+            """, (run_id, period, where, Json(list(params or ())), now_ts))
+            cur.execute("""
+            SELECT run_id, period, where_sql, params, started_at, finished_at, last_tg_id, renewed, failed, conflicts
+            FROM renewal_runs
+            WHERE run_id = %s
+            """, (run_id,))
+            return RenewalRun(*cur.fetchone())
+    except Exception as e:
+        logger.error(f"Error in start_renewal_run: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def select_renewal_run(run_id):
+    """
+    Returns the run record, or None if run_id is unknown.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            SELECT run_id, period, where_sql, params, started_at, finished_at, last_tg_id, renewed, failed, conflicts
+            FROM renewal_runs
+            WHERE run_id = %s
+            """, (run_id,))
+            row = cur.fetchone()
+        return RenewalRun(*row) if row else None
+    except Exception as e:
+        logger.error(f"Error in select_renewal_run: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def select_renewal_candidates(where, params, after_tg_id, limit):
+    """
+    Returns the next limit users (tg_id, user_id, email, date, sub_id, panel) with
+    tg_id greater than after_tg_id that match the where predicate, ordered by tg_id.
+    """
+    try:
+        conditions = [sql.SQL("tg_id > %s")]
+        if where:
+            conditions.insert(0, sql.SQL("(") + sql.SQL(where) + sql.SQL(")"))
+        query = (
+            sql.SQL("SELECT tg_id, user_id, email, date, sub_id, panel FROM users WHERE ")
+            + sql.SQL(" AND ").join(conditions)
+            + sql.SQL(" ORDER BY tg_id LIMIT %s")
+        )
+        with get_cursor() as cur:
+            cur.execute(query, tuple(params or ()) + (after_tg_id if after_tg_id is not None else -1, limit))
+            return cur.fetchall()
+    except Exception as e:
+        logger.error(f"Error in select_renewal_candidates: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def stage_renewals(run_id, items):
+    """
+    Records (tg_id, old_date, new_date) items of a run. Items staged by an
+    earlier attempt keep their original new_date.
+    Returns {tg_id: (new_date, status)} for every item.
+    """
+    try:
+        tg_ids = [item[0] for item in items]
+        with get_transaction() as cur:
+            cur.execute("""
+            INSERT INTO renewal_items (run_id, tg_id, old_date, new_date)
+            SELECT %s, t.tg_id, t.old_date, t.new_date
+            FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[]) AS t(tg_id, old_date, new_date)
+            ON CONFLICT (run_id, tg_id) DO NOTHING
+            """, (run_id, tg_ids, [item[1] for item in items], [item[2] for item in items]))
+            cur.execute("""
+            SELECT tg_id, new_date, status
+            FROM renewal_items
+            WHERE run_id = %s AND tg_id = ANY(%s)
+            """, (run_id, tg_ids))
+            return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    except Exception as e:
+        logger.error(f"Error in stage_renewals: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def select_retry_renewals(run_id, statuses):
+    """
+    Returns the users whose items in the run have one of statuses as (tg_id,
+    user_id, email, date, sub_id, panel) rows, ordered by tg_id, with
+    {tg_id: (new_date, status)} of their staged items.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            SELECT u.tg_id, u.user_id, u.email, u.date, u.sub_id, u.panel, i.new_date, i.status
+            FROM renewal_items i
+            JOIN users u ON u.tg_id = i.tg_id
+            WHERE i.run_id = %s AND i.status = ANY(%s)
+            ORDER BY i.tg_id
+            """, (run_id, list(statuses)))
+            rows = cur.fetchall()
+        return [row[:6] for row in rows], {row[0]: (row[6], row[7]) for row in rows}
+    except Exception as e:
+        logger.error(f"Error in select_retry_renewals: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def restage_renewals(run_id, items):
+    """
+    Re-stages (tg_id, old_date, new_date) items that are not done yet and whose
+    user date moved away from the staged old_date, so the renewal is counted
+    from the current date. Returns {tg_id: (new_date, status)} for every item.
+    """
+    try:
+        tg_ids = [item[0] for item in items]
+        with get_transaction() as cur:
+            cur.execute("""
+            UPDATE renewal_items i
+            SET old_date = t.old_date, new_date = t.new_date
+            FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[]) AS t(tg_id, old_date, new_date)
+            WHERE i.run_id = %s AND i.tg_id = t.tg_id AND i.status IN ('pending', 'failed')
+              AND i.old_date <> t.old_date
+            """, (tg_ids, [item[1] for item in items], [item[2] for item in items], run_id))
+            cur.execute("""
+            SELECT tg_id, new_date, status
+            FROM renewal_items
+            WHERE run_id = %s AND tg_id = ANY(%s)
+            """, (run_id, tg_ids))
+            return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    except Exception as e:
+        logger.error(f"Error in restage_renewals: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def apply_renewals(run_id, renewed_tg_ids, failures, last_tg_id):
+    """
+    Writes the staged new dates of renewed_tg_ids to users, marks failures
+    [(tg_id, error)] and moves the run checkpoint to last_tg_id (None keeps it),
+    all in one statement.
+    A user whose date is no longer the staged old_date was changed by someone
+    else meanwhile: the newer date is kept and the item goes back to 'pending'
+    to be re-staged from it.
+    Returns the run totals (renewed, failed, conflicts) and the conflicted tg_ids.
+    """
+    try:
+        query = """
+        WITH prior AS (
+            SELECT tg_id, status, old_date, new_date
+            FROM renewal_items
+            WHERE run_id = %(run_id)s AND tg_id = ANY(%(renewed)s::bigint[] || %(failed)s::bigint[])
+              AND status IN ('pending', 'failed')
+        ),
+        dated AS (
+            UPDATE users u
+            SET date = p.new_date
+            FROM prior p
+            WHERE p.tg_id = ANY(%(renewed)s::bigint[]) AND u.tg_id = p.tg_id AND u.date = p.old_date
+            RETURNING u.tg_id
+        ),
+        done_items AS (
+            UPDATE renewal_items i
+            SET status = 'done', error = NULL
+            FROM dated d
+            WHERE i.run_id = %(run_id)s AND i.tg_id = d.tg_id
+            RETURNING i.tg_id
+        ),
+        conflict_items AS (
+            UPDATE renewal_items i
+            SET status = 'pending', error = 'users.date changed during the renewal'
+            FROM prior p
+            WHERE i.run_id = %(run_id)s AND i.tg_id = p.tg_id AND p.tg_id = ANY(%(renewed)s::bigint[])
+              AND p.tg_id NOT IN (SELECT tg_id FROM dated)
+            RETURNING i.tg_id
+        ),
+        failed_items AS (
+            UPDATE renewal_items i
+            SET status = 'failed', error = f.error
+            FROM unnest(%(failed)s::bigint[], %(errors)s::text[]) AS f(tg_id, error), prior p
+            WHERE i.run_id = %(run_id)s AND i.tg_id = f.tg_id AND p.tg_id = f.tg_id
+            RETURNING i.tg_id
+        )
+        UPDATE renewal_runs
+        SET last_tg_id = COALESCE(%(last_tg_id)s, last_tg_id),
+            renewed = renewed + (SELECT count(*) FROM done_items),
+            -- Новые отказы прибавляются, повторно доставленные отказы вычитаются
+            failed = failed
+                + (SELECT count(*) FROM prior WHERE status = 'pending' AND tg_id IN (SELECT tg_id FROM failed_items))
+                - (SELECT count(*) FROM prior WHERE status = 'failed' AND tg_id NOT IN (SELECT tg_id FROM failed_items)),
+            conflicts = conflicts + (SELECT count(*) FROM conflict_items)
+        WHERE run_id = %(run_id)s
+        RETURNING renewed, failed, conflicts, ARRAY(SELECT tg_id FROM conflict_items)
+        """
+        params = {
+            'run_id': run_id,
+            'renewed': list(renewed_tg_ids),
+            'failed': [failure[0] for failure in failures],
+            'errors': [failure[1] for failure in failures],
+            'last_tg_id': last_tg_id,
+        }
+        with get_cursor() as cur:
+            cur.execute(query, params)
+            row = cur.fetchone()
+        for tg_id in renewed_tg_ids:
+            USER_CACHE.invalidate(tg_id)
+        if row[3]:
+            logger.warning(f"Renewal run {run_id}: dates of {row[3]} changed meanwhile, they will be re-staged.")
+        return row
+    except Exception as e:
+        logger.error(f"Error in apply_renewals: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def finish_renewal_run(run_id, now_ts):
+    """
+    Marks the run as finished. Items still pending were not applied, because
+    their date kept changing or the run was told to keep changed dates: they
+    become 'conflict' and an outbox intent re-sends the current date to the panel.
+    Returns the tg_ids of those items.
+    """
+    try:
+        with get_cursor() as cur:
+            cur.execute("""
+            WITH conflict_items AS (
+                UPDATE renewal_items
+                SET status = 'conflict'
+                WHERE run_id = %(run_id)s AND status = 'pending'
+                RETURNING tg_id
+            ),
+            resynced AS (
+                INSERT INTO provisioning_outbox (idempotency_key, tg_id, action, available_at, created_at)
+                SELECT 'renewal-conflict:' || %(run_id)s || ':' || tg_id, tg_id, 'update', %(now)s, %(now)s
+                FROM conflict_items
+                ON CONFLICT (idempotency_key) DO NOTHING
+            )
+            UPDATE renewal_runs
+            SET finished_at = %(now)s
+            WHERE run_id = %(run_id)s
+            RETURNING ARRAY(SELECT tg_id FROM conflict_items)
+            """, {'run_id': run_id, 'now': now_ts})
+            conflicted = cur.fetchone()[0]
+        if conflicted:
+            logger.warning(f"Renewal run {run_id}: kept the changed dates of {conflicted}.")
+        logger.info(f"Renewal run {run_id} finished.")
+        return conflicted
+    except Exception as e:
+        logger.error(f"Error in finish_renewal_run: {str(e)}")
+        raise
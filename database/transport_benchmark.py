@@ -0,0 +1,120 @@
+#database/transport_benchmark.py
+import argparse
+import statistics
+import sys
+import threading
+import time
+
+import psycopg2
+from database.connection import make_connect, open_tunnel
+from database.pool import ConnectionPool
+
+# Запрос из горячего пути (снимок пользователя), а не только SELECT 1
+SNAPSHOT_QUERY = """
+SELECT k.tg_id, u.tg_id IS NOT NULL, r.tg_id IS NOT NULL, u.date, COALESCE(r.meow_coins_balance, 0)
+FROM (SELECT %s::bigint AS tg_id) k
+LEFT JOIN users u ON u.tg_id = k.tg_id
+LEFT JOIN referrals r ON r.tg_id = k.tg_id
+"""
+
+
+def percentile(samples, share):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def measure_latency(connect, queries):
+    """
+    Runs queries sequential round trips on one connection.
+    Returns (connect_ms, [query_ms]).
+    """
+    started = time.perf_counter()
+    conn = connect()
+    connect_ms = (time.perf_counter() - started) * 1000
+    conn.autocommit = True
+    samples = []
+    try:
+        with conn.cursor() as cur:
+            for i in range(queries):
+                started = time.perf_counter()
+                cur.execute(SNAPSHOT_QUERY, (i,))
+                cur.fetchone()
+                samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        conn.close()
+    return connect_ms, samples
+
+
+def measure_throughput(connect, threads, duration):
+    """
+    Runs the snapshot query from threads workers over a pool for duration seconds.
+    Returns queries per second.
+    """
+    pool = ConnectionPool(connect, minconn=threads, maxconn=threads)
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        while time.perf_counter() < deadline:
+            with pool.cursor() as cur:
+                cur.execute(SNAPSHOT_QUERY, (index,))
+                cur.fetchone()
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.closeall()
+    return sum(counts) / elapsed
+
+
+def run(label, connect, args):
+    connect_ms, samples = measure_latency(connect, args.queries)
+    qps = measure_throughput(connect, args.threads, args.duration)
+    return {
+        'transport': label,
+        'connect_ms': connect_ms,
+        'p50_ms': statistics.median(samples),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+        'qps': qps,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare query latency and throughput over the SSH tunnel and direct TLS.")
+    parser.add_argument('--transports', nargs='*', default=['ssh', 'direct'], choices=['ssh', 'direct'])
+    parser.add_argument('--dsn', action='append', default=[], metavar='LABEL=DSN',
+                        help="extra libpq target to measure, e.g. local=postgresql://localhost/nowmeow")
+    parser.add_argument('--queries', type=int, default=500, help="sequential queries for the latency run")
+    parser.add_argument('--threads', type=int, default=8, help="workers for the throughput run")
+    parser.add_argument('--duration', type=float, default=10, help="seconds of the throughput run")
+    args = parser.parse_args(argv)
+
+    results = []
+    for transport in args.transports:
+        tunnel = open_tunnel(monitor=False) if transport == 'ssh' else None
+        try:
+            results.append(run(transport, make_connect(transport, tunnel), args))
+        except psycopg2.Error as e:
+            print(f"{transport}: {str(e).strip()}", file=sys.stderr)
+        finally:
+            if tunnel:
+                tunnel.stop()
+    for target in args.dsn:
+        label, _, dsn = target.partition('=')
+        results.append(run(label, lambda dsn=dsn: psycopg2.connect(dsn), args))
+
+    print(f"{'transport':<12}{'connect ms':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'qps':>10}")
+    for row in results:
+        print(f"{row['transport']:<12}{row['connect_ms']:>12.2f}{row['p50_ms']:>10.3f}"
+              f"{row['p95_ms']:>10.3f}{row['p99_ms']:>10.3f}{row['qps']:>10.0f}")
+    return 0 if results else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#database/tunnel.py
+import socket
+import threading
+
+from sshtunnel import SSHTunnelForwarder
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('tunnel.database', 'database.log')
+
+
+class TunnelManager:
+    """
+    Owns the SSH tunnel to the database host and keeps it alive.
+
+    The local end binds to a free port chosen by the OS, so several bot processes
+    can run on one host. A monitor thread probes the tunnel every probe_interval
+    seconds and rebuilds it when the probe fails; on_reconnect(host, port) is then
+    called so the connection pool can drop connections made through the old tunnel.
+    """
+
+    def __init__(self, ssh_address, ssh_username, remote_bind_address, ssh_pkey=None,
+                 ssh_private_key_password=None, keepalive=30, probe_interval=15,
+                 max_backoff=60, on_reconnect=None, forwarder_factory=SSHTunnelForwarder):
+        self.ssh_address = ssh_address
+        self.ssh_username = ssh_username
+        self.ssh_pkey = ssh_pkey
+        self.ssh_private_key_password = ssh_private_key_password
+        self.remote_bind_address = remote_bind_address
+        self.keepalive = keepalive
+        self.probe_interval = probe_interval
+        self.max_backoff = max_backoff
+        self.on_reconnect = on_reconnect
+        self.forwarder_factory = forwarder_factory
+
+        self.reconnects = 0
+        self._forwarder = None
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._monitor = None
+
+    def _open_forwarder(self):
+        forwarder = self.forwarder_factory(
+            self.ssh_address,
+            ssh_username=self.ssh_username,
+            ssh_pkey=self.ssh_pkey,
+            ssh_private_key_password=self.ssh_private_key_password,
+            remote_bind_address=self.remote_bind_address,
+            # Порт 0: свободный порт выбирает ОС
+            local_bind_address=('127.0.0.1', 0),
+            set_keepalive=self.keepalive,
+        )
+        forwarder.start()
+        return forwarder
+
+    @staticmethod
+    def _close_forwarder(forwarder):
+        try:
+            forwarder.stop()
+        except Exception as e:
+            logger.warning(f"Error while stopping SSH tunnel: {str(e)}")
+
+    @property
+    def local_address(self):
+        """
+        Returns (host, port) of the local end of the current tunnel.
+        """
+        with self._lock:
+            if self._forwarder is None:
+                raise RuntimeError("SSH tunnel is not started")
+            return self._forwarder.local_bind_host, self._forwarder.local_bind_port
+
+    def start(self, monitor=True):
+        """
+        Opens the tunnel and, with monitor set, starts the liveness monitor thread.
+        """
+        with self._lock:
+            if self._forwarder is None:
+                self._forwarder = self._open_forwarder()
+                logger.info(f"SSH tunnel established on {self.local_address[0]}:{self.local_address[1]}.")
+        if monitor and self._monitor is None:
+            self._stop_event.clear()
+            self._monitor = threading.Thread(target=self._monitor_loop, name='db-tunnel-monitor', daemon=True)
+            self._monitor.start()
+        return self
+
+    def is_alive(self):
+        """
+        Returns True if the SSH transport is up and the forwarded port accepts connections.
+        """
+        with self._lock:
+            forwarder = self._forwarder
+        if forwarder is None or not forwarder.is_active:
+            return False
+        try:
+            forwarder.check_tunnels()
+            return all(forwarder.tunnel_is_up.values())
+        except Exception as e:
+            logger.warning(f"SSH tunnel probe failed: {str(e)}")
+            return False
+
+    def restart(self):
+        """
+        Replaces the tunnel with a fresh one and notifies on_reconnect.
+        """
+        with self._lock:
+            old = self._forwarder
+            self._forwarder = None
+            if old is not None:
+                self._close_forwarder(old)
+            self._forwarder = self._open_forwarder()
+            self.reconnects += 1
+            host, port = self.local_address
+        logger.warning(f"SSH tunnel re-established on {host}:{port}.")
+        if self.on_reconnect:
+            try:
+                self.on_reconnect(host, port)
+            except Exception as e:
+                logger.error(f"Error in tunnel reconnect callback: {str(e)}")
+
+    def _monitor_loop(self):
+        backoff = 1
+        while not self._stop_event.wait(self.probe_interval):
+            if self.is_alive():
+                backoff = 1
+                continue
+            logger.warning("SSH tunnel is down, reconnecting.")
+            while not self._stop_event.is_set():
+                try:
+                    self.restart()
+                    backoff = 1
+                    break
+                except Exception as e:
+                    logger.error(f"Failed to re-establish SSH tunnel, retrying in {backoff} s: {str(e)}")
+                    self._stop_event.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+
+    def stop(self):
+        """
+        Stops the monitor thread and closes the tunnel.
+        """
+        self._stop_event.set()
+        monitor, self._monitor = self._monitor, None
+        if monitor is not None and monitor is not threading.current_thread():
+            monitor.join(timeout=self.probe_interval + 5)
+        with self._lock:
+            forwarder, self._forwarder = self._forwarder, None
+        if forwarder is not None:
+            self._close_forwarder(forwarder)
+        logger.info("SSH tunnel stopped.")
+
+    def stats(self):
+        """
+        Returns a snapshot of the tunnel state.
+        """
+        with self._lock:
+            port = self._forwarder.local_bind_port if self._forwarder is not None else None
+        return {'transport': 'ssh', 'local_port': port, 'alive': self.is_alive(), 'reconnects': self.reconnects}
+
+
+def is_reachable(host, port, timeout=3):
+    """
+    Returns True if a TCP connection to host:port can be opened.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
@@ -1,20 +1,37 @@
 #database/user.py
-import const.const_db
+import itertools
+from collections import namedtuple
+from psycopg2 import sql
+from database.cache import USER_CACHE
+from database.connection import get_cursor, get_server_cursor
 from utils.logging_utils import setup_logger, retry_on_error, log_function_call
 
 logger = setup_logger('user.database', 'database.log')
 
+USER_COLUMNS = ('tg_id', 'user_id', 'email', 'date', 'sub_id', 'vless_profile', 'login_date', 'trial_date', 'panel')
+_cursor_counter = itertools.count()
+
+# Всё, что нужно обработчику о пользователе, одной строкой:
+# users и referrals могут отсутствовать независимо друг от друга
+UserSnapshot = namedtuple('UserSnapshot', [
+    'tg_id', 'exists_in_users', 'exists_in_referrals', 'email', 'date', 'trial_date',
+    'sub_id', 'vless_profile', 'referrer_tg_id', 'balance',
+])
+
 @log_function_call(logger)
-def insert_user(tg_id, user_id, email, date, sub_id, vless_profile, login_date):
+def insert_user(tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel='main'):
     """
     Inserts a new user record into the users table.
+    panel is the name of the 3X-UI panel holding the client.
     """
     try:
         insert_query = """
-        INSERT INTO users (tg_id, user_id, email, date, sub_id, vless_profile, login_date)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        INSERT INTO users (tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
-        const.const_db.CUR.execute(insert_query, (tg_id, user_id, email, date, sub_id, vless_profile, login_date))
+        with get_cursor() as cur:
+            cur.execute(insert_query, (tg_id, user_id, email, date, sub_id, vless_profile, login_date, panel))
+        USER_CACHE.invalidate(tg_id)
         logger.info(f"Successfully inserted user with tg_id={tg_id}.")
     except Exception as e:
         logger.error(f"Error while inserting user: {str(e)}")
@@ -31,7 +48,9 @@ def insert_trial_date(tg_id, trial_date):
         SET trial_date = %s
         WHERE tg_id = %s
         """
-        const.const_db.CUR.execute(update_query, (trial_date, tg_id))
+        with get_cursor() as cur:
+            cur.execute(update_query, (trial_date, tg_id))
+        USER_CACHE.invalidate(tg_id)
         logger.info(f"Successfully inserted trial date for tg_id={tg_id}.")
     except Exception as e:
         logger.error(f"Error while inserting trial date: {str(e)}")
@@ -44,8 +63,9 @@ def select_trial_date(tg_id):
     """
     try:
         query = "SELECT trial_date FROM users WHERE tg_id = %s;"
-        const.const_db.CUR.execute(query, (tg_id,))
-        trial_date = const.const_db.CUR.fetchone()
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            trial_date = cur.fetchone()
         logger.info(f"Retrieved ({trial_date}) from the database.")
         return trial_date[0] if trial_date else None
     except Exception as e:
@@ -58,9 +78,11 @@ def select_user(tg_id):
     Retrieves user data from the users table by tg_id.
     """
     try:
-        query = "SELECT * FROM users WHERE tg_id = %s"
-        const.const_db.CUR.execute(query, (tg_id,))
-        data = const.const_db.CUR.fetchall()
+        query = sql.SQL("SELECT {} FROM users WHERE tg_id = %s").format(
+            sql.SQL(', ').join(map(sql.Identifier, USER_COLUMNS)))
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            data = cur.fetchall()
         if not data:
             logger.warning(f"User with tg_id={tg_id} not found.")
             return None
@@ -82,7 +104,9 @@ def update_user_date(date, tg_id):
         SET date = %s
         WHERE tg_id = %s
         """
-        const.const_db.CUR.execute(update_query, (date, tg_id))
+        with get_cursor() as cur:
+            cur.execute(update_query, (date, tg_id))
+        USER_CACHE.invalidate(tg_id)
         logger.info(f"Successfully updated date for user with tg_id={tg_id}.")
     except Exception as e:
         logger.error(f"Error while updating user date: {str(e)}")
@@ -96,8 +120,9 @@ def select_user_exists(tg_id):
     """
     try:
         query = "SELECT EXISTS(SELECT 1 FROM users WHERE tg_id = %s)"
-        const.const_db.CUR.execute(query, (tg_id,))
-        exists = const.const_db.CUR.fetchone()[0]
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            exists = cur.fetchone()[0]
         logger.info(f"User existence for tg_id={tg_id}: {exists}.")
         return exists
     except Exception as e:
@@ -112,8 +137,9 @@ def select_user_vless_profile(tg_id):
     """
     try:
         query = "SELECT vless_profile FROM users WHERE tg_id = %s;"
-        const.const_db.CUR.execute(query, (tg_id,))
-        vless = const.const_db.CUR.fetchone()
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            vless = cur.fetchone()
         logger.info(f"Retrieved ({vless}) from the database.")
         return vless[0] if vless else None
     except Exception as e:
@@ -128,8 +154,9 @@ def select_user_date(tg_id):
     """
     try:
         query = "SELECT date FROM users WHERE tg_id = %s;"
-        const.const_db.CUR.execute(query, (tg_id,))
-        date = const.const_db.CUR.fetchone()
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            date = cur.fetchone()
         logger.info(f"Retrieved ({date}) from the database.")
         return date[0] if date else None
     except Exception as e:
@@ -137,6 +164,49 @@ def select_user_date(tg_id):
         raise
 
 
+@log_function_call(logger)
+def select_user_snapshot(tg_id):
+    """
+    Retrieves the user row, referral row, referrer, balance, expiry and trial date
+    for tg_id in a single query. Returns a UserSnapshot.
+    """
+    try:
+        query = """
+        SELECT k.tg_id, u.tg_id IS NOT NULL, r.tg_id IS NOT NULL,
+               u.email, u.date, u.trial_date, u.sub_id, u.vless_profile,
+               r.referrer_tg_id, COALESCE(r.meow_coins_balance, 0)
+        FROM (SELECT %s::bigint AS tg_id) k
+        LEFT JOIN users u ON u.tg_id = k.tg_id
+        LEFT JOIN referrals r ON r.tg_id = k.tg_id
+        """
+        with get_cursor() as cur:
+            cur.execute(query, (tg_id,))
+            row = cur.fetchone()
+        snapshot = UserSnapshot(*row)
+        logger.info(f"Snapshot for tg_id={tg_id}: users={snapshot.exists_in_users}, referrals={snapshot.exists_in_referrals}.")
+        return snapshot
+    except Exception as e:
+        logger.error(f"Error while selecting user snapshot: {str(e)}")
+        raise
+
+
+@log_function_call(logger)
+def select_panel_loads():
+    """
+    Returns {panel: number of users} for placing new clients.
+    """
+    try:
+        query = "SELECT panel, count(*) FROM users GROUP BY panel"
+        with get_cursor() as cur:
+            cur.execute(query)
+            loads = dict(cur.fetchall())
+        logger.info(f"Panel loads: {loads}.")
+        return loads
+    except Exception as e:
+        logger.error(f"Error while counting users per panel: {str(e)}")
+        raise
+
+
 @log_function_call(logger)
 def select_all_users():
     """
@@ -144,10 +214,52 @@ def select_all_users():
     """
     try:
         query = "SELECT * FROM users"
-        const.const_db.CUR.execute(query)
-        data = const.const_db.CUR.fetchall()
+        with get_cursor() as cur:
+            cur.execute(query)
+            data = cur.fetchall()
         logger.info(f"Retrieved {len(data)} users from the database.")
         return data
     except Exception as e:
         logger.error(f"Error while retrieving all users: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def iter_user_batches(columns=None, where=None, params=None, batch_size=1000):
+    """
+    Yields lists of at most batch_size user rows, ordered by tg_id, streamed
+    through a named server-side cursor so memory stays constant.
+    columns: names from USER_COLUMNS (default: all of them);
+    where: SQL predicate with %s placeholders filled from params.
+    """
+    columns = tuple(columns) if columns else USER_COLUMNS
+    unknown = [column for column in columns if column not in USER_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown users columns: {unknown}")
+
+    query = sql.SQL("SELECT {} FROM users").format(sql.SQL(', ').join(map(sql.Identifier, columns)))
+    if where:
+        query = query + sql.SQL(" WHERE ") + sql.SQL(where)
+    query = query + sql.SQL(" ORDER BY tg_id")
+
+    total = 0
+    try:
+        with get_server_cursor(f"iter_users_{next(_cursor_counter)}", itersize=batch_size) as cur:
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                total += len(rows)
+                yield rows
+        logger.info(f"Streamed {total} users from the database.")
+    except Exception as e:
+        logger.error(f"Error while streaming users: {str(e)}")
+        raise
+
+
+def iter_users(columns=None, where=None, params=None, batch_size=1000):
+    """
+    Yields user rows one by one, see iter_user_batches.
+    """
+    for rows in iter_user_batches(columns, where, params, batch_size):
+        yield from rows
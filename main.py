@@ -2,36 +2,66 @@
 import asyncio
 
 import middleware.connection
+import middleware.outbox
 from bot.bot_init import bot
+from bot.broadcast import resume_broadcasts
 import utils.config
 from bot.bot_base_fun import remove_message
 from bot.tasks import reminder_task, setup_scheduler
+from bot.webhook import run_webhook
 from utils.logging_utils import setup_logger
+from utils.json_fun import preload_templates
 from bot.handlers import instructions, payments, profiles, referrals, start, subscriptions, support, admin, bonus_payment
 
 logger = setup_logger('main', 'main.log')
 
+BOT_MODES = ('polling', 'webhook')
+
 async def run_bot():
     """
     Runs the Telegram bot with automatic reconnection and reminder task.
+    Updates come by polling or by webhook, chosen by BOT_MODE.
     """
-    logger.info("Starting reminder_task in background.")
-    asyncio.create_task(reminder_task())
+    if utils.config.BOT_MODE not in BOT_MODES:
+        raise ValueError(f"Unknown BOT_MODE {utils.config.BOT_MODE!r}, expected one of {BOT_MODES}")
+    if utils.config.BOT_MODE == 'webhook' and not (utils.config.WEBHOOK_URL and utils.config.WEBHOOK_SECRET):
+        raise ValueError("BOT_MODE=webhook needs WEBHOOK_URL and WEBHOOK_SECRET")
     setup_scheduler()
 
-    # Подключаемся к 3X-UI и БД один раз
+    # Шаблоны запросов и подключения к 3X-UI и БД - один раз при старте
     try:
+        preload_templates()
         logger.info("Logging in to 3X-UI and DB at bot startup.")
-        middleware.connection.login_3x()
-        middleware.connection.login_db()
+        await middleware.connection.login_3x()
+        await middleware.connection.login_db()
+        await middleware.connection.migrate_db()
+        await middleware.connection.load_panel_loads()
         logger.info("Connections to 3X-UI and DB established successfully.")
+        # Доставка клиентов в 3X-UI из outbox, в том числе оставшихся с прошлого запуска
+        asyncio.create_task(middleware.outbox.outbox_worker())
+        # Рассылки, прерванные перезапуском, продолжаются с контрольной точки
+        await resume_broadcasts(bot)
+        # Напоминания читают БД с первого запуска, поэтому стартуют после подключения
+        logger.info("Starting reminder_task in background.")
+        asyncio.create_task(reminder_task())
     except Exception as e:
         logger.error(f"Failed initial login: {str(e)}")
         raise
 
+    if utils.config.BOT_MODE == 'webhook':
+        await serve_webhook()
+    else:
+        await serve_polling()
+
+async def serve_polling():
+    """
+    Long-polls Telegram for updates, restarting after errors.
+    """
     while True:
         try:
             logger.info("Starting bot polling...")
+            # Пока установлен webhook, getUpdates не работает
+            await bot.delete_webhook()
             await bot.polling()
         except Exception as e:
             logger.error(f"Bot polling error: {str(e)}")
@@ -39,10 +69,26 @@ async def run_bot():
             await asyncio.sleep(5)
         finally:
             try:
-                middleware.connection.logout()
+                await middleware.connection.logout()
             except Exception as e:
                 logger.error(f"Error during logout: {str(e)}")
 
+async def serve_webhook():
+    """
+    Serves Telegram updates pushed to the local webhook server.
+    """
+    try:
+        await run_webhook(
+            bot, utils.config.WEBHOOK_URL, utils.config.WEBHOOK_SECRET,
+            host=utils.config.WEBHOOK_HOST, port=utils.config.WEBHOOK_PORT, path=utils.config.WEBHOOK_PATH,
+            max_in_flight=utils.config.WEBHOOK_MAX_IN_FLIGHT, max_connections=utils.config.WEBHOOK_MAX_CONNECTIONS,
+        )
+    finally:
+        try:
+            await middleware.connection.logout()
+        except Exception as e:
+            logger.error(f"Error during logout: {str(e)}")
+
 def main():
     """
     Main entry point to run the asynchronous bot.
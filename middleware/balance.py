@@ -0,0 +1,62 @@
+#middleware/balance.py
+import database.async_balance
+from const.const_bot import BONUS_RESERVATION_TTL_MS
+from utils.logging_utils import log_function_call, setup_logger
+from utils.timestamp import current_timestamp
+
+logger = setup_logger('balance.middleware', 'middleware.log')
+
+@log_function_call(logger)
+async def reserve_bonus(tg_id, amount):
+    """
+    Reserves amount meow-coins for an invoice. Returns the reservation id or None if not enough coins.
+    """
+    try:
+        return await database.async_balance.reserve_balance(tg_id, amount, current_timestamp(), BONUS_RESERVATION_TTL_MS)
+    except Exception as e:
+        logger.error(f"Error reserving bonus: {e}")
+        raise
+
+@log_function_call(logger)
+async def hold_reservation(reservation_id):
+    """
+    Keeps a reservation alive until the payment completes. Returns False if the coins are gone.
+    """
+    try:
+        return await database.async_balance.hold_reservation(reservation_id, current_timestamp(), BONUS_RESERVATION_TTL_MS)
+    except Exception as e:
+        logger.error(f"Error holding reservation: {e}")
+        raise
+
+@log_function_call(logger)
+async def commit_reservation(reservation_id, reference):
+    """
+    Charges the reserved coins after a successful payment.
+    """
+    try:
+        return await database.async_balance.commit_reservation(reservation_id, current_timestamp(), reference)
+    except Exception as e:
+        logger.error(f"Error committing reservation: {e}")
+        raise
+
+@log_function_call(logger)
+async def release_reservation(reservation_id):
+    """
+    Returns reserved coins when the invoice is abandoned.
+    """
+    try:
+        return await database.async_balance.release_reservation(reservation_id, current_timestamp())
+    except Exception as e:
+        logger.error(f"Error releasing reservation: {e}")
+        raise
+
+@log_function_call(logger)
+async def expire_reservations():
+    """
+    Expires reservations whose invoices were never paid.
+    """
+    try:
+        return await database.async_balance.expire_reservations(current_timestamp())
+    except Exception as e:
+        logger.error(f"Error expiring reservations: {e}")
+        raise
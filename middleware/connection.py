@@ -1,19 +1,32 @@
 #middleware/connection.py
+import asyncio
+
 import const.const_db
+import database.async_user
 import database.connection
+import database.migrate
+from database.cache import USER_CACHE
+from database.executor import DB_BREAKER, run_connect
 from api import auth as auth
 from utils.logging_utils import log_function_call, setup_logger, retry_on_error
+from utils.executors import executor_stats
+from utils.resilience import breaker_stats
 
 logger = setup_logger('connection.middleware', 'middleware.log')
 
+# Один вход в БД на всех: остальные обработчики ждут его, а не подключаются сами
+_DB_LOGIN_LOCK = asyncio.Lock()
+
 @retry_on_error(retries=3, delay=5)
 @log_function_call(logger)
-def login_3x():
+async def login_3x():
     """
-    Logs into 3X-UI and stores the session in const_db.
+    Ensures the session of every 3X-UI panel in const_db is authenticated.
+    Costs no panel request once logged in; expired cookies are renewed
+    by the session itself on the next call.
     """
     try:
-        const.const_db.SESSION = auth.login()
+        const.const_db.PANELS = await auth.login(const.const_db.PANELS)
         logger.info("Successfully connected to 3X-UI.")
     except Exception as e:
         logger.error(f"Failed to connect to 3X-UI: {str(e)}")
@@ -21,27 +34,75 @@ def login_3x():
 
 @retry_on_error(retries=3, delay=5)
 @log_function_call(logger)
-def login_db():
+async def login_db():
     """
-    Ensures a connection to the local database is established.
+    Ensures the database connection pool is established.
+    Dead pooled connections are replaced on checkout, so this only runs once.
+    Connecting runs in the DB connect executor behind the postgres circuit
+    breaker, so a dead database never blocks the event loop.
     """
     try:
-        if const.const_db.CONN is None:
-            const.const_db.TUNNEL, const.const_db.CONN, const.const_db.CUR = database.connection.connect_to_db()
-            logger.info("Successfully connected to database.")
+        if const.const_db.POOL is not None:
+            return
+        async with _DB_LOGIN_LOCK:
+            if const.const_db.POOL is None:
+                const.const_db.TUNNEL, const.const_db.POOL = await DB_BREAKER.call(
+                    run_connect, database.connection.connect_to_db)
+                logger.info("Successfully connected to database.")
     except Exception as e:
         logger.error(f"Failed to connect to DB: {str(e)}")
         raise
 
+@log_function_call(logger)
+async def load_panel_loads():
+    """
+    Seeds the panel registry with the number of clients on each panel,
+    so new clients go to the least loaded one.
+    """
+    try:
+        loads = await database.async_user.select_panel_loads()
+        auth.get_registry().set_loads(loads)
+    except Exception as e:
+        logger.error(f"Failed to load panel loads: {str(e)}")
+        raise
+
+@log_function_call(logger)
+async def migrate_db():
+    """
+    Applies pending schema migrations through the connection pool.
+    """
+    try:
+        await run_connect(database.migrate.migrate_pool, const.const_db.POOL)
+    except Exception as e:
+        logger.error(f"Failed to migrate DB: {str(e)}")
+        raise
+
+def get_db_stats():
+    """
+    Returns counters of the user cache, the connection pool, the SSH tunnel,
+    the 3X-UI panels, the circuit breakers and the blocking-call executors.
+    """
+    pool, tunnel, panels = const.const_db.POOL, const.const_db.TUNNEL, const.const_db.PANELS
+    return {
+        'cache': USER_CACHE.stats(),
+        'pool': pool.stats() if pool is not None else None,
+        'tunnel': tunnel.stats() if tunnel is not None else None,
+        'panels': panels.stats() if panels is not None else None,
+        'breakers': breaker_stats(),
+        'executors': executor_stats(),
+    }
+
 @retry_on_error(retries=3, delay=5)
 @log_function_call(logger)
-def logout():
+async def logout():
     """
     Disconnects from 3X-UI and the local DB.
     """
     try:
-        auth.logout(const.const_db.SESSION)
-        database.connection.disconnect_from_db(const.const_db.CONN, const.const_db.TUNNEL)
+        await auth.logout(const.const_db.PANELS)
+        const.const_db.PANELS = None
+        await run_connect(database.connection.disconnect_from_db, const.const_db.POOL, const.const_db.TUNNEL)
+        const.const_db.POOL, const.const_db.TUNNEL = None, None
         logger.info("Successfully disconnected from all services.")
     except Exception as e:
         logger.error(f"Failed to disconnect: {str(e)}")
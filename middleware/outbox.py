@@ -0,0 +1,98 @@
+#middleware/outbox.py
+import asyncio
+
+import database.async_outbox
+import utils.timestamp
+from api import client as client
+from utils.config import (
+    OUTBOX_BATCH_SIZE, OUTBOX_CONCURRENCY, OUTBOX_POLL_INTERVAL, OUTBOX_LEASE, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_DELAY, OUTBOX_MAX_RETRY_DELAY
+)
+from utils.logging_utils import backoff_delay, setup_logger
+
+logger = setup_logger('outbox.middleware', 'middleware.log')
+
+# Будит воркер сразу после записи намерения, не дожидаясь опроса
+_WAKEUP = asyncio.Event()
+
+OUTBOX_COUNTERS = {'delivered': 0, 'retried': 0, 'dead': 0}
+
+
+def notify():
+    """
+    Tells the worker a new intent was committed.
+    """
+    _WAKEUP.set()
+
+
+async def _deliver(item, semaphore):
+    async with semaphore:
+        if item.user_id is None:
+            raise LookupError(f"User tg_id={item.tg_id} no longer exists")
+        await client.deliver_intent(item.action, item.tg_id, item.user_id, item.email, item.date, item.sub_id, item.panel)
+
+
+async def _record_failure(item, error, now_ts, max_attempts, retry_delay, max_retry_delay):
+    message = str(error) or type(error).__name__
+    dead = item.attempts >= max_attempts or isinstance(error, LookupError)
+    retry_at = now_ts + int(backoff_delay(item.attempts - 1, retry_delay, 2, max_retry_delay) * 1000)
+    await database.async_outbox.fail_outbox(item.id, message, retry_at, dead)
+    if dead:
+        OUTBOX_COUNTERS['dead'] += 1
+        logger.error(f"Gave up provisioning {item.action} for tg_id={item.tg_id} after {item.attempts} attempts: {message}")
+    else:
+        OUTBOX_COUNTERS['retried'] += 1
+        logger.warning(f"Provisioning {item.action} for tg_id={item.tg_id} failed (attempt {item.attempts}): {message}")
+
+
+async def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, concurrency=OUTBOX_CONCURRENCY, lease=OUTBOX_LEASE,
+                       max_attempts=OUTBOX_MAX_ATTEMPTS, retry_delay=OUTBOX_RETRY_DELAY,
+                       max_retry_delay=OUTBOX_MAX_RETRY_DELAY):
+    """
+    Claims one batch of due intents and delivers it to the panels with at most
+    concurrency requests in flight. Failed intents are rescheduled with
+    jittered exponential backoff and given up after max_attempts.
+    Returns the number of intents claimed.
+    """
+    items = await database.async_outbox.claim_outbox(batch_size, int(lease * 1000), utils.timestamp.current_timestamp())
+    if not items:
+        return 0
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(_deliver(item, semaphore) for item in items), return_exceptions=True)
+
+    now_ts = utils.timestamp.current_timestamp()
+    delivered = [item.id for item, result in zip(items, results) if not isinstance(result, Exception)]
+    if delivered:
+        await database.async_outbox.complete_outbox(delivered, now_ts)
+        OUTBOX_COUNTERS['delivered'] += len(delivered)
+    for item, result in zip(items, results):
+        if isinstance(result, Exception):
+            await _record_failure(item, result, now_ts, max_attempts, retry_delay, max_retry_delay)
+    logger.info(f"Outbox batch: {len(delivered)} of {len(items)} intents delivered.")
+    return len(items)
+
+
+async def outbox_worker(poll_interval=OUTBOX_POLL_INTERVAL, **kwargs):
+    """
+    Background task delivering the outbox: drains while intents are due, then
+    sleeps until notify() or poll_interval, whichever comes first.
+    """
+    while True:
+        try:
+            _WAKEUP.clear()
+            if await drain_outbox(**kwargs):
+                continue
+        except Exception as e:
+            logger.error(f"Error in outbox_worker: {str(e)}")
+        try:
+            await asyncio.wait_for(_WAKEUP.wait(), timeout=poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def get_outbox_stats():
+    """
+    Returns backlog counts of the outbox and the worker counters.
+    """
+    pending, due, dead, oldest = await database.async_outbox.select_outbox_stats(utils.timestamp.current_timestamp())
+    return {'pending': pending, 'due': due, 'dead': dead, 'oldest_pending_at': oldest, **OUTBOX_COUNTERS}
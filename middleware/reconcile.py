@@ -0,0 +1,156 @@
+#middleware/reconcile.py
+import asyncio
+from collections import namedtuple
+
+import database.async_user
+from api import auth as auth
+from api import client as client
+from api.panel import inbound_clients
+from utils.config import RECONCILE_BATCH_SIZE
+from utils.logging_utils import log_function_call, setup_logger
+
+logger = setup_logger('reconcile.middleware', 'middleware.log')
+
+# Строка users для сверки: (tg_id, user_id, email, date, sub_id, panel)
+RECONCILE_COLUMNS = ('tg_id', 'user_id', 'email', 'date', 'sub_id', 'panel')
+
+PanelClientRow = namedtuple('PanelClientRow', ['panel', 'uuid', 'email', 'expiry_time'])
+
+
+class ReconcileReport:
+    """
+    Drift between the users table and the panels.
+
+    missing: users without a client on their panel;
+    expiry_mismatch / email_mismatch: users whose client differs from the row;
+    wrong_panel: users whose client lives on another panel than users.panel;
+    orphaned: panel clients without a user row.
+    Repair fixes missing and mismatched clients; wrong_panel and orphaned
+    need a human and are only reported.
+    """
+
+    def __init__(self):
+        self.users = 0
+        self.panel_clients = 0
+        self.missing = []
+        self.expiry_mismatch = []
+        self.email_mismatch = []
+        self.wrong_panel = []
+        self.orphaned = []
+        self.repaired = 0
+        self.repair_failed = 0
+
+    @property
+    def drift(self):
+        return len(self.missing) + len(self.expiry_mismatch) + len(self.email_mismatch) + len(self.wrong_panel)
+
+    def summary(self):
+        return {
+            'users': self.users,
+            'panel_clients': self.panel_clients,
+            'missing': len(self.missing),
+            'expiry_mismatch': len(self.expiry_mismatch),
+            'email_mismatch': len(self.email_mismatch),
+            'wrong_panel': len(self.wrong_panel),
+            'orphaned': len(self.orphaned),
+            'repaired': self.repaired,
+            'repair_failed': self.repair_failed,
+        }
+
+
+async def fetch_panel_clients(registry):
+    """
+    Fetches the client list of every panel's inbound, one request per panel.
+    Returns {uuid: PanelClientRow}.
+    """
+    async def fetch(name, config):
+        inbound = await registry.session(name).get_inbound(config.inbound_id)
+        return [
+            PanelClientRow(name, item.get('id'), item.get('email'), item.get('expiryTime', 0))
+            for item in inbound_clients(inbound)
+        ]
+
+    results = await asyncio.gather(*(fetch(name, config) for name, config in registry.configs.items()))
+    return {row.uuid: row for rows in results for row in rows}
+
+
+def compare_user(user, panel_clients, report, default_panel):
+    """
+    Checks one users row against the panel clients, recording drift in report.
+    The matched client is removed from panel_clients, so what remains at the end is orphaned.
+    """
+    tg_id, user_id, email, date, sub_id, panel = user
+    panel = panel or default_panel
+    found = panel_clients.pop(user_id, None)
+    if found is None:
+        report.missing.append(user)
+        return
+    if found.panel != panel:
+        report.wrong_panel.append((user, found.panel))
+        return
+    if found.expiry_time != date:
+        report.expiry_mismatch.append((user, found.expiry_time))
+    elif found.email != email:
+        report.email_mismatch.append((user, found.email))
+
+
+async def repair(report, batch_size):
+    """
+    Recreates missing clients with batched addClient requests and pushes the
+    users row to clients with a wrong expiry or email, batch_size at a time.
+    """
+    by_panel = {}
+    for tg_id, user_id, email, date, sub_id, panel in report.missing:
+        by_panel.setdefault(panel, []).append((tg_id, user_id, email, date, sub_id))
+    for panel, users in by_panel.items():
+        for start in range(0, len(users), batch_size):
+            chunk = users[start:start + batch_size]
+            try:
+                await client.add_clients_batch(panel, chunk)
+                report.repaired += len(chunk)
+            except Exception as e:
+                report.repair_failed += len(chunk)
+                logger.error(f"Failed to recreate {len(chunk)} clients on panel {panel}: {str(e)}")
+
+    stale = [user for user, _ in report.expiry_mismatch + report.email_mismatch]
+    for start in range(0, len(stale), batch_size):
+        chunk = stale[start:start + batch_size]
+        results = await asyncio.gather(
+            *(client.push_client_expiry(tg_id, user_id, email, date, sub_id, panel)
+              for tg_id, user_id, email, date, sub_id, panel in chunk),
+            return_exceptions=True,
+        )
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        report.repaired += len(chunk) - failed
+        report.repair_failed += failed
+
+
+@log_function_call(logger)
+async def reconcile(repair_drift=False, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Compares every users row with the clients of the panels.
+
+    The panels' client lists are loaded once into a hash map by uuid and the
+    users table is streamed through it, so memory grows with the panel client
+    count and the drift found, not with the users table. With repair_drift the users table is treated as the source of
+    truth and the drift is fixed in batches. Returns a ReconcileReport.
+    """
+    try:
+        registry = auth.get_registry()
+        panel_clients = await fetch_panel_clients(registry)
+        report = ReconcileReport()
+        report.panel_clients = len(panel_clients)
+
+        async for user in database.async_user.iter_users(columns=RECONCILE_COLUMNS):
+            report.users += 1
+            compare_user(user, panel_clients, report, registry.default)
+        report.orphaned = list(panel_clients.values())
+
+        logger.info(f"Reconciliation: {report.summary()}")
+        if repair_drift and report.drift:
+            await repair(report, batch_size)
+            logger.info(f"Reconciliation repair: {report.repaired} fixed, {report.repair_failed} failed.")
+        return report
+    except Exception as e:
+        logger.error(f"Reconciliation failed: {str(e)}")
+        raise
@@ -0,0 +1,184 @@
+#middleware/reminders.py
+import asyncio
+import heapq
+
+import database.async_reminders
+import database.async_user
+import utils.timestamp
+from utils.config import REMINDER_OFFSETS, REMINDER_HORIZON, REMINDER_CATCHUP
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('reminders.middleware', 'middleware.log')
+
+OFFSET_UNITS = {'s': 1000, 'm': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000}
+
+# Работающий планировщик; None, пока reminder_worker не запущен
+REMINDERS = None
+
+
+def parse_offsets(spec):
+    """
+    Parses '7d,1d,1h' into [('7d', ms), ('1d', ms), ('1h', ms)], longest first.
+    """
+    offsets = []
+    for item in spec.split(','):
+        item = item.strip()
+        if len(item) < 2 or item[-1] not in OFFSET_UNITS or not item[:-1].isdigit() or int(item[:-1]) <= 0:
+            raise ValueError(f"Bad reminder offset {item!r}, expected e.g. 7d, 1d, 1h, 30m")
+        offsets.append((item, int(item[:-1]) * OFFSET_UNITS[item[-1]]))
+    return sorted(offsets, key=lambda offset: offset[1], reverse=True)
+
+
+class ReminderWheel:
+    """
+    Fires expiry reminders at their exact time from an in-memory heap.
+
+    Only reminders due within the next horizon seconds are held in memory;
+    they are loaded by one indexed range query per offset, and the window is
+    reloaded from the previous load when half of it has passed. Dates changed
+    through reschedule() are re-queued right away, other changes are found by
+    the next reload. Every reminder is recorded
+    in sent_reminders before it is sent, so it goes out at most once even
+    across restarts; after a restart reminders missed within catchup seconds
+    are still sent.
+    """
+
+    def __init__(self, offsets, send, horizon=REMINDER_HORIZON, catchup=REMINDER_CATCHUP,
+                 clock=utils.timestamp.current_timestamp):
+        self.offsets = offsets
+        self.send = send
+        self.horizon_ms = int(horizon * 1000)
+        self.catchup_ms = int(catchup * 1000)
+        self.clock = clock
+        self._heap = []
+        # (tg_id, offset_name) -> дата окончания, для которой напоминание в куче актуально
+        self._scheduled = {}
+        self._loaded_at = None
+        self._loaded_until = None
+        self._wakeup = asyncio.Event()
+        self.loads = 0
+        self.sent = 0
+        self.skipped = 0
+
+    def _push(self, tg_id, expiry, offset_name, fire_at):
+        self._scheduled[(tg_id, offset_name)] = expiry
+        heapq.heappush(self._heap, (fire_at, tg_id, offset_name, expiry))
+
+    def reschedule(self, tg_id, date):
+        """
+        Replaces the reminders of tg_id with ones for the new expiry date.
+        Reminders beyond the loaded window are left to the next load.
+        """
+        now = self.clock()
+        for offset_name, offset_ms in self.offsets:
+            fire_at = date - offset_ms
+            if self._loaded_until is not None and now <= fire_at <= self._loaded_until:
+                self._push(tg_id, date, offset_name, fire_at)
+            else:
+                self._scheduled.pop((tg_id, offset_name), None)
+        self._wakeup.set()
+
+    async def load(self, now):
+        """
+        Loads reminders due since the previous load (catchup before the first one) until now + horizon.
+        """
+        from_ts = self._loaded_at if self._loaded_at is not None else now - self.catchup_ms
+        until_ts = now + self.horizon_ms
+        rows = await database.async_reminders.select_upcoming_reminders(self.offsets, from_ts, until_ts, now)
+        offsets = dict(self.offsets)
+        for tg_id, expiry, offset_name in rows:
+            if self._scheduled.get((tg_id, offset_name)) != expiry:
+                self._push(tg_id, expiry, offset_name, expiry - offsets[offset_name])
+        self._loaded_at = now
+        self._loaded_until = until_ts
+        self.loads += 1
+        logger.info(f"Loaded {len(rows)} reminders due until {until_ts}.")
+
+    async def fire_due(self, now):
+        """
+        Sends every reminder whose time has come.
+        """
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, tg_id, offset_name, expiry = heapq.heappop(self._heap)
+            key = (tg_id, offset_name)
+            if self._scheduled.get(key) != expiry:
+                # Дата окончания изменилась после постановки в очередь
+                continue
+            del self._scheduled[key]
+            try:
+                if not await database.async_reminders.claim_reminder(tg_id, expiry, offset_name, now):
+                    self.skipped += 1
+                    continue
+                await self.send(tg_id, expiry)
+                self.sent += 1
+                logger.info(f"Renewal reminder {offset_name} sent to tg_id={tg_id}.")
+            except Exception as e:
+                logger.error(f"Failed to send reminder {offset_name} to tg_id={tg_id}: {str(e)}")
+
+    def _next_wakeup(self, now):
+        refill_at = self._loaded_until - self.horizon_ms // 2
+        if self._heap:
+            refill_at = min(refill_at, self._heap[0][0])
+        return max(refill_at - now, 0) / 1000
+
+    async def run(self):
+        """
+        Loads, fires and sleeps until the next reminder, refill or reschedule.
+        """
+        while True:
+            timeout = 60
+            try:
+                self._wakeup.clear()
+                now = self.clock()
+                if self._loaded_until is None or now >= self._loaded_until - self.horizon_ms // 2:
+                    await self.load(now)
+                await self.fire_due(now)
+                timeout = self._next_wakeup(self.clock())
+            except Exception as e:
+                logger.error(f"Error in reminder wheel: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {
+            'queued': len(self._scheduled),
+            'loaded_until': self._loaded_until,
+            'loads': self.loads,
+            'sent': self.sent,
+            'skipped': self.skipped,
+        }
+
+
+def reschedule(tg_id, date):
+    """
+    Tells the running scheduler that the user's expiry date changed.
+    """
+    if REMINDERS is not None:
+        REMINDERS.reschedule(tg_id, date)
+
+
+async def reschedule_user(tg_id):
+    """
+    Re-reads the user's expiry date for the running scheduler after it was changed.
+    """
+    if REMINDERS is None:
+        return
+    try:
+        REMINDERS.reschedule(tg_id, await database.async_user.select_user_date(tg_id))
+    except Exception as e:
+        # Пропущенное изменение подхватит следующая загрузка окна
+        logger.error(f"Failed to reschedule reminders of tg_id={tg_id}: {str(e)}")
+
+
+async def reminder_worker(send, offsets=REMINDER_OFFSETS, **kwargs):
+    """
+    Background task sending expiry reminders; send(tg_id, expiry) delivers one.
+    """
+    global REMINDERS
+    REMINDERS = ReminderWheel(parse_offsets(offsets), send, **kwargs)
+    try:
+        await REMINDERS.run()
+    finally:
+        REMINDERS = None
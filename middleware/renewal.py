@@ -0,0 +1,150 @@
+#middleware/renewal.py
+import asyncio
+
+import database.async_renewal
+import middleware.outbox
+import middleware.reminders
+import utils.timestamp
+from api import client as client
+from utils.config import RENEWAL_BATCH_SIZE, RENEWAL_CONCURRENCY
+from utils.logging_utils import log_function_call, setup_logger
+
+logger = setup_logger('renewal.middleware', 'middleware.log')
+
+# Сколько раз повторять пользователей, чья дата менялась во время запуска
+RETRY_PASSES = 3
+
+
+async def _push_batch(rows, staged, concurrency):
+    """
+    Sends the staged dates of a batch to the panel with at most concurrency
+    requests in flight. Returns (renewed_tg_ids, [(tg_id, error)]).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def push(tg_id, user_id, email, sub_id, panel, new_date):
+        async with semaphore:
+            await client.push_client_expiry(tg_id, user_id, email, new_date, sub_id, panel)
+
+    pending = [
+        (tg_id, user_id, email, sub_id, panel, staged[tg_id][0])
+        for tg_id, user_id, email, date, sub_id, panel in rows
+        if staged[tg_id][1] != 'done'
+    ]
+    results = await asyncio.gather(*(push(*item) for item in pending), return_exceptions=True)
+
+    renewed, failures = [], []
+    for item, result in zip(pending, results):
+        if isinstance(result, Exception):
+            failures.append((item[0], str(result) or type(result).__name__))
+        else:
+            renewed.append(item[0])
+    return renewed, failures
+
+
+async def _apply_batch(run, rows, staged, concurrency, last_tg_id):
+    """
+    Pushes a batch and applies it. Returns the run with the new totals.
+    """
+    renewed, failures = await _push_batch(rows, staged, concurrency)
+    renewed_count, failed_count, conflicts_count, conflicted = await database.async_renewal.apply_renewals(
+        run.run_id, renewed, failures, last_tg_id)
+    for tg_id in renewed:
+        if tg_id not in conflicted:
+            middleware.reminders.reschedule(tg_id, staged[tg_id][0])
+    if last_tg_id is not None:
+        run = run._replace(last_tg_id=last_tg_id)
+    return run._replace(renewed=renewed_count, failed=failed_count, conflicts=conflicts_count)
+
+
+@log_function_call(logger)
+async def renew_users(run_id, period, where=None, params=None, batch_size=RENEWAL_BATCH_SIZE,
+                      concurrency=RENEWAL_CONCURRENCY, progress=None, keep_changed_dates=False):
+    """
+    Extends the subscription of every user matching the where predicate by period.
+
+    Users are processed in tg_id order, batch_size at a time: new dates are
+    computed with update_date and staged, pushed to the panel concurrently,
+    then written to users in one statement together with the run checkpoint.
+    Users whose push failed get one more attempt before the run is finished.
+    A user whose date changed meanwhile (e.g. a payment) is re-staged from the
+    new date and pushed again; with keep_changed_dates the new date is kept
+    as is and only re-sent to the panel.
+    Calling again with the same run_id resumes after the last finished batch
+    with the selection and period stored for the run.
+    progress(run) is awaited after every batch with the run totals.
+    Returns the final RenewalRun.
+    """
+    try:
+        run = await database.async_renewal.start_renewal_run(
+            run_id, period, where, params, utils.timestamp.current_timestamp())
+        if run.finished_at is not None:
+            logger.info(f"Renewal run {run_id} is already finished.")
+            return run
+        # При возобновлении берём выборку и период из записи запуска
+        period, where, params = run.period, run.where_sql, run.params
+        after_tg_id = run.last_tg_id
+
+        while True:
+            rows = await database.async_renewal.select_renewal_candidates(where, params, after_tg_id, batch_size)
+            if not rows:
+                break
+            items = [(row[0], row[3], utils.timestamp.update_date(row[3], period)) for row in rows]
+            staged = await database.async_renewal.stage_renewals(run_id, items)
+            after_tg_id = rows[-1][0]
+            run = await _apply_batch(run, rows, staged, concurrency, after_tg_id)
+            logger.info(f"Renewal run {run_id}: {run.renewed} renewed, {run.failed} failed, "
+                        f"{run.conflicts} conflicts, checkpoint tg_id={after_tg_id}.")
+            if progress is not None:
+                await progress(run)
+
+        # Контрольная точка уже за неудачными пользователями и теми, чья дата
+        # изменилась во время запуска: повторяем их отдельно, неудачных - один раз
+        statuses = ['failed'] if keep_changed_dates else ['failed', 'pending']
+        for attempt in range(1 if keep_changed_dates else RETRY_PASSES):
+            rows, staged = await database.async_renewal.select_retry_renewals(run_id, statuses)
+            if not rows:
+                break
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                if not keep_changed_dates:
+                    items = [(row[0], row[3], utils.timestamp.update_date(row[3], period)) for row in batch]
+                    staged.update(await database.async_renewal.restage_renewals(run_id, items))
+                run = await _apply_batch(run, batch, staged, concurrency, None)
+                logger.info(f"Renewal run {run_id} retry: {run.renewed} renewed, {run.failed} still failed.")
+                if progress is not None:
+                    await progress(run)
+            statuses = ['pending']
+
+        finished_at = utils.timestamp.current_timestamp()
+        if await database.async_renewal.finish_renewal_run(run_id, finished_at):
+            # Панель получит текущую дату из users через outbox
+            middleware.outbox.notify()
+        return run._replace(finished_at=finished_at)
+    except Exception as e:
+        logger.error(f"Error in renewal run {run_id}: {str(e)}")
+        raise
+
+
+async def renew_tg_ids(run_id, period, tg_ids, **kwargs):
+    """
+    Extends the subscription of the given users, see renew_users.
+    """
+    return await renew_users(run_id, period, "tg_id = ANY(%s)", [sorted(set(tg_ids))], **kwargs)
+
+
+async def renew_active_users(run_id, period, **kwargs):
+    """
+    Extends the subscription of users whose subscription has not expired yet.
+    """
+    return await renew_users(run_id, period, "date > %s", [utils.timestamp.current_timestamp()], **kwargs)
+
+
+async def resume_renewal(run_id, **kwargs):
+    """
+    Continues an interrupted run. Returns None if run_id is unknown.
+    """
+    run = await database.async_renewal.select_renewal_run(run_id)
+    if run is None:
+        return None
+    return await renew_users(run_id, run.period, **kwargs)
@@ -0,0 +1,52 @@
+#middleware/traffic.py
+import api.traffic
+from api import auth as auth
+from api.traffic import TRAFFIC_CACHE
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('traffic.middleware', 'middleware.log')
+
+BYTE_UNITS = ('Б', 'КБ', 'МБ', 'ГБ', 'ТБ')
+
+
+async def sync_traffic():
+    """
+    Refreshes the traffic table from the inbound of every panel.
+    """
+    try:
+        registry = auth.get_registry()
+        targets = [(registry.session(name), config.inbound_id) for name, config in registry.configs.items()]
+        return await api.traffic.sync_traffic(targets, TRAFFIC_CACHE)
+    except Exception as e:
+        logger.error(f"Failed to sync traffic: {str(e)}")
+        raise
+
+
+def get_traffic(email):
+    """
+    Returns the cached ClientTraffic of a client, or None if it is not synced yet.
+    """
+    return TRAFFIC_CACHE.get(email) if email else None
+
+
+def top_traffic(limit=10):
+    """
+    Returns the clients with the most traffic, heaviest first.
+    """
+    return sorted(TRAFFIC_CACHE.rows(), key=lambda row: row.up + row.down, reverse=True)[:limit]
+
+
+def get_traffic_stats():
+    return TRAFFIC_CACHE.stats()
+
+
+def format_bytes(size):
+    """
+    Formats a byte count as e.g. '1.5 ГБ'.
+    """
+    size = float(size or 0)
+    for unit in BYTE_UNITS[:-1]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == BYTE_UNITS[0] else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} {BYTE_UNITS[-1]}"
@@ -1,45 +1,44 @@
 #middleware/user.py
 import const.const_bot
-import database.user
+import database.async_user
+import middleware.outbox
+import middleware.reminders
 import utils.timestamp
 from api import client as client
 from utils.logging_utils import log_function_call, setup_logger
 
 logger = setup_logger('user.middleware', 'middleware.log')
 
-@log_function_call(logger)
-def select_all_users():
+async def iter_all_users(columns=('tg_id',)):
     """
-    Returns all user ids from the local 'users' table.
+    Streams users from the local 'users' table without loading the whole table.
     """
     try:
-        return database.user.select_all_users()
+        async for user in database.async_user.iter_users(columns=columns):
+            yield user
     except Exception as e:
-        logger.error(f"Failed to select all users ids: {str(e)}")
+        logger.error(f"Failed to iterate all users: {str(e)}")
         raise
     
-def select_all_active_users():
+async def iter_active_users(columns=('tg_id',)):
     """
-    Returns all active user ids from the local 'users' table.
+    Streams users whose subscription has not expired yet.
     """
-    users=[]
     try:
-        for user in database.user.select_all_users():
-            if int(user[3]) > utils.timestamp.current_timestamp():
-                users.append(user)
-        
-        return users
+        now_ts = utils.timestamp.current_timestamp()
+        async for user in database.async_user.iter_users(columns=columns, where="date > %s", params=(now_ts,)):
+            yield user
     except Exception as e:
-        logger.error(f"Failed to select all active users ids: {str(e)}")
+        logger.error(f"Failed to iterate active users: {str(e)}")
         raise
 
 @log_function_call(logger)
-def post_new_user_and_get_vless(tg_id, period, username):
+async def post_new_user_and_get_vless(tg_id, period, username):
     """
     Creates a new user in 3x-ui and returns the vless profile.
     """
     try:
-        vless = client.add_client(tg_id, period, username)
+        vless = await client.add_client(tg_id, period, username)
         return vless
     except Exception as e:
         logger.error(f"Failed to add user in 3x-ui: {str(e)}")
@@ -47,40 +46,47 @@ def post_new_user_and_get_vless(tg_id, period, username):
 
 
 @log_function_call(logger)
-def get_user_exists_in_user(tg_id):
+async def get_user_exists_in_user(tg_id):
     """
     Checks if a user exists in the local 'users' table.
     """
     try:
-        return database.user.select_user_exists(tg_id)
+        return await database.async_user.select_user_exists(tg_id)
     except Exception as e:
         logger.error(f"Failed to get user existence: {str(e)}")
         raise
 
 
 @log_function_call(logger)
-def create_or_update_user(tg_id, period, username):
+async def create_or_update_user(tg_id, period, username):
     """
-    Creates or updates a user in 3X-UI, also reflects in local DB.
+    Creates or updates a user in the local DB and queues the 3X-UI change,
+    which the outbox worker delivers right after the commit. Reminders are
+    moved to the new expiry date.
     """
     try:
-        if get_user_exists_in_user(tg_id):
-            client.update_client(tg_id, period)
+        if await get_user_exists_in_user(tg_id):
+            await client.update_client(tg_id, period)
+            vless = None
         else:
-            return post_new_user_and_get_vless(tg_id, period, username)
+            vless = await post_new_user_and_get_vless(tg_id, period, username)
+        await middleware.reminders.reschedule_user(tg_id)
+        return vless
     except Exception as e:
         logger.error(f"Failed to create or update user: {str(e)}")
         raise
+    finally:
+        middleware.outbox.notify()
 
 
 @log_function_call(logger)
-def send_vless(tg_id):
+async def send_vless(tg_id):
     """
     Retrieves and returns the vless profile if user exists locally.
     """
     try:
-        if get_user_exists_in_user(tg_id):
-            data = database.user.select_user_vless_profile(tg_id)
+        if await get_user_exists_in_user(tg_id):
+            data = await database.async_user.select_user_vless_profile(tg_id)
             return data
         else:
             return 'Ой, вас, к сожалению нет в системе! Для начала купите подписку или используйте пробный период'
@@ -90,25 +96,56 @@ def send_vless(tg_id):
 
 
 @log_function_call(logger)
-def select_user_date(tg_id):
+async def select_user_date(tg_id):
     """
     Returns the expiration date for a user.
     """
     try:
-        return database.user.select_user_date(tg_id)
+        return await database.async_user.select_user_date(tg_id)
     except Exception as e:
         logger.error(f"Failed to select user date: {str(e)}")
         raise
 
 @log_function_call(logger)
-def get_users_expiration_date(tg_id):
+async def get_user_snapshot(tg_id):
+    """
+    Returns a UserSnapshot with everything handlers need about the user in one query.
+    """
+    try:
+        return await database.async_user.select_user_snapshot(tg_id)
+    except Exception as e:
+        logger.error(f"Failed to get user snapshot: {str(e)}")
+        raise
+
+
+def format_expiration_date(date_ts):
+    """
+    Formats a subscription expiry timestamp as 'HH:MM:SS DD-MM-YYYY'.
+    """
+    date_dt = utils.timestamp.timestamp_to_date(date_ts).replace(microsecond=0, tzinfo=None)
+    return date_dt.strftime('%H:%M:%S %d-%m-%Y')
+
+
+def format_time_left(date_ts):
+    """
+    Formats the time left until a subscription expiry timestamp in a human-readable way.
+    """
+    date_diff = utils.timestamp.calculate_time_difference(date_ts)
+    if const.const_bot.EXPIRED == date_diff:
+        return "муф.. твоя подписка уже закончилась😿"
+    if const.const_bot.LESS_THAN_HOUR == date_diff:
+        return "кошечки-божечки, у тебя осталось меньше часа🙀"
+    return date_diff
+
+
+@log_function_call(logger)
+async def get_users_expiration_date(tg_id):
     """
     Returns the formatted expiration date for a user's subscription.
     """
     try:
-        date_ts = database.user.select_user_date(tg_id)
-        date_dt = utils.timestamp.timestamp_to_date(date_ts).replace(microsecond=0, tzinfo=None)
-        final_date = date_dt.strftime('%H:%M:%S %d-%m-%Y')
+        date_ts = await database.async_user.select_user_date(tg_id)
+        final_date = format_expiration_date(date_ts)
         logger.info(f"Expiration date for tg_id={tg_id}: {final_date}.")
         return final_date
     except Exception as e:
@@ -116,44 +153,36 @@ def get_users_expiration_date(tg_id):
         raise
 
 @log_function_call(logger)
-def get_users_expiration_date_to_comfort_format(tg_id):
+async def get_users_expiration_date_to_comfort_format(tg_id):
     """
     Returns user subscription date in a more human-readable format.
     """
     try:
-        date_ts = database.user.select_user_date(tg_id)
-        date_diff = utils.timestamp.calculate_time_difference(date_ts)
-
-        if const.const_bot.EXPIRED == date_diff:
-            logger.info(f"User subscription expired for tg_id={tg_id}.")
-            return "муф.. твоя подписка уже закончилась😿"
-        if const.const_bot.LESS_THAN_HOUR == date_diff:
-            logger.info(f"User subscription less than an hour for tg_id={tg_id}.")
-            return "кошечки-божечки, у тебя осталось меньше часа🙀"
-        return date_diff
+        date_ts = await database.async_user.select_user_date(tg_id)
+        return format_time_left(date_ts)
     except Exception as e:
         logger.error(f"Failed to get user expiration date in comfort format: {str(e)}")
         raise
     
 @log_function_call(logger)
-def insert_trial_date(tg_id):
+async def insert_trial_date(tg_id):
     """
     Inserts a new user with a trial period.
     """
     trial_date = utils.timestamp.current_timestamp()
     try:
-        return database.user.insert_trial_date(tg_id, trial_date)
+        return await database.async_user.insert_trial_date(tg_id, trial_date)
     except Exception as e:
         logger.error(f"Failed to insert trial user: {str(e)}")
         raise
 
 @log_function_call(logger)
-def select_trial_date(tg_id):
+async def select_trial_date(tg_id):
     """
     Retrieves the trial date for a user.
     """
     try:
-        return database.user.select_trial_date(tg_id)
+        return await database.async_user.select_trial_date(tg_id)
     except Exception as e:
         logger.error(f"Failed to select trial date: {str(e)}")
-        raise
\ No newline at end of file
+        raise
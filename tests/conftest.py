@@ -2,7 +2,7 @@
 
 import pytest
 import asyncio
-from unittest.mock import patch, AsyncMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from telebot.async_telebot import AsyncTeleBot
 import sys
 import os
@@ -23,9 +23,13 @@ def event_loop():
 @pytest.fixture
 def mock_db_cursor():
     """
-    Пример фикстуры, которая подменяет const.const_db.CUR, чтобы он не был None.
+    Подменяет const.const_db.POOL: любой get_cursor() отдаёт один и тот же mock-курсор.
     """
-    with patch("const.const_db.CUR", autospec=True) as mock_cur:
+    mock_cur = MagicMock()
+    mock_pool = MagicMock()
+    mock_pool.cursor.return_value.__enter__.return_value = mock_cur
+    mock_pool.transaction.return_value.__enter__.return_value = mock_cur
+    with patch("const.const_db.POOL", mock_pool):
         yield mock_cur
 
 
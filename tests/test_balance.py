@@ -0,0 +1,120 @@
+# tests/test_balance.py
+import os
+import threading
+import pytest
+import psycopg2
+from unittest.mock import patch
+import database.balance
+import database.referrals
+from database.migrate import migrate
+from database.pool import ConnectionPool
+
+DATABASE_DSN = os.getenv('TEST_DATABASE_DSN')
+needs_postgres = pytest.mark.skipif(not DATABASE_DSN, reason="TEST_DATABASE_DSN is not set")
+
+TTL_MS = 60 * 1000
+
+
+@pytest.fixture
+def ledger_pool():
+    admin = psycopg2.connect(DATABASE_DSN)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS balance_test CASCADE")
+        cur.execute("CREATE SCHEMA balance_test")
+
+    pool = ConnectionPool(lambda: psycopg2.connect(DATABASE_DSN, options='-c search_path=balance_test'), maxconn=10)
+    with pool.connection() as conn:
+        migrate(conn)
+    with patch("const.const_db.POOL", pool):
+        with pool.cursor() as cur:
+            cur.execute("INSERT INTO referrals (tg_id) VALUES (1), (2)")
+        yield pool
+
+    pool.closeall()
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS balance_test CASCADE")
+    admin.close()
+
+
+def balances(pool, tg_id):
+    with pool.cursor() as cur:
+        cur.execute("SELECT meow_coins_balance, reserved_coins FROM referrals WHERE tg_id = %s", (tg_id,))
+        row = cur.fetchone()
+        cur.execute("SELECT COALESCE(SUM(amount), 0) FROM balance_transactions WHERE tg_id = %s", (tg_id,))
+        return row + cur.fetchone()
+
+
+@needs_postgres
+def test_posting_is_idempotent_per_reference(ledger_pool):
+    database.referrals.update_balance(1, 100, 'referral_code', 'first_use')
+    database.referrals.update_balance(1, 100, 'referral_code', 'first_use')
+
+    assert balances(ledger_pool, 1) == (100, 0, 100)
+
+
+@needs_postgres
+def test_concurrent_reservations_never_overspend(ledger_pool):
+    database.referrals.update_balance(1, 100)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(database.balance.reserve_balance(1, 70, 0, TTL_MS)))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len([result for result in results if result]) == 1
+    assert database.referrals.get_balance(1) == 30
+
+
+@needs_postgres
+def test_reservation_commit_release_and_expiry(ledger_pool):
+    database.referrals.update_balance(1, 100)
+    first = database.balance.reserve_balance(1, 60, 0, TTL_MS)
+    second = database.balance.reserve_balance(1, 40, 0, TTL_MS)
+
+    assert database.balance.release_reservation(second, 10) == 1
+    assert database.balance.expire_reservations(TTL_MS) == [1]
+    assert database.referrals.get_balance(1) == 100
+
+    # Оплата пришла после истечения резерва: коины всё равно списываются один раз
+    assert database.balance.commit_reservation(first, TTL_MS + 1, 'charge-1') == (1, 60)
+    assert database.balance.commit_reservation(first, TTL_MS + 2, 'charge-1') is None
+    assert balances(ledger_pool, 1) == (40, 0, 40)
+
+
+@needs_postgres
+def test_committing_same_reference_twice_releases_without_second_charge(ledger_pool):
+    database.referrals.update_balance(1, 100)
+    first = database.balance.reserve_balance(1, 30, 0, TTL_MS)
+    second = database.balance.reserve_balance(1, 30, 0, TTL_MS)
+
+    assert database.balance.commit_reservation(first, 1, 'charge-2') == (1, 30)
+    # Ссылка уже есть в журнале: второй резерв снимается, но коины не списываются повторно
+    assert database.balance.commit_reservation(second, 2, 'charge-2') == (1, 30)
+    assert balances(ledger_pool, 1) == (70, 0, 70)
+    assert database.referrals.get_balance(1) == 70
+
+
+@needs_postgres
+def test_expired_reservation_is_held_again_only_if_coins_remain(ledger_pool):
+    database.referrals.update_balance(1, 100)
+    reservation = database.balance.reserve_balance(1, 80, 0, TTL_MS)
+    database.balance.expire_reservations(TTL_MS)
+    database.balance.reserve_balance(1, 50, TTL_MS, TTL_MS)
+
+    assert database.balance.hold_reservation(reservation, TTL_MS + 1, TTL_MS) is False
+
+
+@needs_postgres
+def test_monthly_bonus_is_posted_to_ledger(ledger_pool):
+    with ledger_pool.cursor() as cur:
+        cur.execute("INSERT INTO users (tg_id, user_id, email, date, sub_id, vless_profile) "
+                    "VALUES (10, 'u10', 'user10', 10000000000, 's10', 'vless://10')")
+        cur.execute("INSERT INTO referrals (tg_id, referrer_tg_id) VALUES (10, 2)")
+
+    rows = database.referrals.credit_monthly_bonus('2026-10', 1000, 3 * 24 * 60 * 60 * 1000, 20)
+
+    assert rows == [(2, 1, 20)]
+    assert balances(ledger_pool, 2) == (20, 0, 20)
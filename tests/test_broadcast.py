@@ -0,0 +1,172 @@
+# tests/test_broadcast.py
+import asyncio
+import os
+import time
+import pytest
+import psycopg2
+from types import SimpleNamespace
+from unittest.mock import patch
+from telebot.asyncio_helper import ApiTelegramException
+import database.async_broadcast
+from bot.broadcast import BROADCASTS, cancel_broadcast, resume_broadcast, send_with_limits, start_broadcast
+from database.migrate import migrate
+from database.pool import ConnectionPool
+from utils.rate_limit import ChatSpacing, TokenBucket
+
+DATABASE_DSN = os.getenv('TEST_DATABASE_DSN')
+needs_postgres = pytest.mark.skipif(not DATABASE_DSN, reason="TEST_DATABASE_DSN is not set")
+
+
+def telegram_error(code, description, **parameters):
+    result = {'ok': False, 'error_code': code, 'description': description}
+    if parameters:
+        result['parameters'] = parameters
+    return ApiTelegramException('sendMessage', None, result)
+
+
+class FakeBot:
+    """
+    Records sent messages; errors[chat_id] is a list of errors raised by the next sends to that chat.
+    """
+
+    def __init__(self, errors=None, delay=0):
+        self.errors = errors or {}
+        self.delay = delay
+        self.sent = []
+        self.edits = []
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(self.delay)
+        pending = self.errors.get(chat_id)
+        if pending:
+            raise pending.pop(0)
+        self.sent.append(chat_id)
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.edits.append(text)
+
+
+@pytest.mark.asyncio
+async def test_bucket_limits_rate_and_pause_holds_everyone():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    await asyncio.gather(*(bucket.acquire() for _ in range(6)))
+    assert time.monotonic() - started >= 0.09
+
+    bucket.pause(0.1)
+    started = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - started >= 0.1
+    assert bucket.stats()['pauses'] == 1
+
+
+@pytest.mark.asyncio
+async def test_429_is_retried_after_pause_and_403_counts_as_blocked():
+    bot = FakeBot({1: [telegram_error(429, 'Too Many Requests', retry_after=0.05)],
+                   2: [telegram_error(403, 'Forbidden: bot was blocked by the user')],
+                   3: [telegram_error(400, 'Bad Request: chat not found')]})
+    bucket, spacing = TokenBucket(rate=1000), ChatSpacing(0)
+
+    started = time.monotonic()
+    assert await send_with_limits(bot, 1, 'hi', bucket, spacing, max_attempts=3) == ('delivered', None)
+    assert time.monotonic() - started >= 0.05
+    assert (await send_with_limits(bot, 2, 'hi', bucket, spacing, max_attempts=3))[0] == 'blocked'
+    assert (await send_with_limits(bot, 3, 'hi', bucket, spacing, max_attempts=3))[0] == 'failed'
+    assert bot.sent == [1]
+
+
+@pytest.mark.asyncio
+async def test_chat_spacing_delays_only_the_same_chat():
+    spacing = ChatSpacing(0.05)
+    started = time.monotonic()
+    await asyncio.gather(spacing.wait(1), spacing.wait(2))
+    assert time.monotonic() - started < 0.03
+    await spacing.wait(1)
+    assert time.monotonic() - started >= 0.04
+
+
+@pytest.fixture
+def broadcast_pool():
+    admin = psycopg2.connect(DATABASE_DSN)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS broadcast_test CASCADE")
+        cur.execute("CREATE SCHEMA broadcast_test")
+
+    pool = ConnectionPool(lambda: psycopg2.connect(DATABASE_DSN, options='-c search_path=broadcast_test'), maxconn=5)
+    with pool.connection() as conn:
+        migrate(conn)
+    with patch("const.const_db.POOL", pool):
+        with pool.cursor() as cur:
+            cur.execute("""
+            INSERT INTO users (tg_id, user_id, email, date, sub_id, vless_profile, login_date)
+            SELECT g, 'uuid-' || g, 'user' || g, g, 'sub' || g, 'vless://' || g, 0
+            FROM generate_series(1, 7) g
+            """)
+        yield pool
+
+    pool.closeall()
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS broadcast_test CASCADE")
+    admin.close()
+
+
+def deliveries(pool):
+    with pool.cursor() as cur:
+        cur.execute("SELECT tg_id, status FROM broadcast_deliveries ORDER BY tg_id")
+        return dict(cur.fetchall())
+
+
+def fast():
+    return {'batch_size': 3, 'bucket': TokenBucket(rate=1000), 'spacing': ChatSpacing(0), 'progress_interval': 0}
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_from_checkpoint(broadcast_pool):
+    record = database.async_broadcast.record_broadcast_deliveries
+    calls = []
+
+    async def crash_on_second_batch(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise OSError("connection lost")
+        return await record(*args)
+
+    first = FakeBot({2: [telegram_error(403, 'Forbidden: bot was blocked by the user')]})
+    with patch("database.async_broadcast.record_broadcast_deliveries", crash_on_second_batch):
+        broadcast = await start_broadcast(first, 'job-1', 'news', admin_chat_id=100, **fast())
+        with pytest.raises(OSError):
+            await broadcast.task
+    assert 'job-1' not in BROADCASTS
+
+    second = FakeBot()
+    broadcast = await resume_broadcast(second, 'job-1', **fast())
+    job = await broadcast.task
+
+    # Повторяется только пакет, результат которого не успели сохранить
+    assert second.sent[0] == 100
+    assert sorted(second.sent[1:]) == [4, 5, 6, 7]
+    assert deliveries(broadcast_pool) == {1: 'delivered', 2: 'blocked', 3: 'delivered', 4: 'delivered',
+                                          5: 'delivered', 6: 'delivered', 7: 'delivered'}
+    assert (job.status, job.delivered, job.blocked, job.failed) == ('finished', 6, 1, 0)
+    assert 'завершена' in second.edits[-1]
+    assert await resume_broadcast(second, 'job-1') is None
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_cancelled_job_stops_and_is_not_resumed(broadcast_pool):
+    bot = FakeBot(delay=0.02)
+    broadcast = await start_broadcast(bot, 'job-2', 'news', where="tg_id > %s", params=[2],
+                                      **{**fast(), 'batch_size': 2, 'concurrency': 1})
+    await asyncio.sleep(0.05)
+    assert await cancel_broadcast('job-2')
+    job = await broadcast.task
+
+    assert job.status == 'cancelled'
+    assert 0 < len(bot.sent) < 5
+    assert set(deliveries(broadcast_pool)) == set(bot.sent)
+    assert await resume_broadcast(bot, 'job-2') is None
+    assert not await cancel_broadcast('job-2')
@@ -0,0 +1,87 @@
+# tests/test_cache.py
+import pytest
+from unittest.mock import patch
+from database.cache import UserCache, read_through
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_expires_entries_after_ttl():
+    clock = FakeClock()
+    cache = UserCache(maxsize=10, ttl=60, clock=clock)
+    cache.put(1, 'date', 100)
+
+    assert cache.get(1, 'date') == (True, 100)
+    clock.now = 61
+    assert cache.get(1, 'date') == (False, None)
+    assert cache.stats()['size'] == 0
+
+
+def test_cache_evicts_least_recently_used():
+    cache = UserCache(maxsize=2, ttl=60)
+    cache.put(1, 'date', 100)
+    cache.put(2, 'date', 200)
+    cache.get(1, 'date')
+    cache.put(3, 'date', 300)
+
+    assert cache.get(2, 'date') == (False, None)
+    assert cache.get(1, 'date') == (True, 100)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_invalidate_drops_every_read_of_user():
+    cache = UserCache(maxsize=10, ttl=60)
+    cache.put(1, 'date', 100)
+    cache.put('1', 'balance', 50)
+    cache.put(2, 'date', 200)
+
+    cache.invalidate(1)
+
+    assert cache.get(1, 'date') == (False, None)
+    assert cache.get(1, 'balance') == (False, None)
+    assert cache.get(2, 'date') == (True, 200)
+
+
+def test_read_started_before_write_is_not_cached():
+    cache = UserCache(maxsize=10, ttl=60)
+    version = cache.version()
+    cache.invalidate(1)
+
+    assert not cache.put(1, 'date', 'stale', version)
+    assert cache.get(1, 'date') == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_read_through_counts_hits_and_misses():
+    cache = UserCache(maxsize=10, ttl=60)
+    calls = []
+
+    def select_user_date(tg_id):
+        calls.append(tg_id)
+        return 100
+
+    assert await read_through(select_user_date, 7, cache) == 100
+    assert await read_through(select_user_date, 7, cache) == 100
+    assert calls == [7]
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_write_paths_invalidate_cached_user(mock_db_cursor):
+    import database.user
+    import database.referrals
+    cache = UserCache(maxsize=10, ttl=60)
+    with patch("database.user.USER_CACHE", cache), patch("database.balance.USER_CACHE", cache):
+        cache.put(9, 'date', 100)
+        database.user.update_user_date(200, 9)
+        assert cache.get(9, 'date') == (False, None)
+
+        cache.put(9, 'balance', 10)
+        database.referrals.update_balance(9, 20)
+        assert cache.get(9, 'balance') == (False, None)
@@ -0,0 +1,95 @@
+# tests/test_executors.py
+import asyncio
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from utils.executors import ExecutorBridge
+from utils.resilience import CircuitBreaker, CircuitOpenError
+
+
+@pytest.mark.asyncio
+async def test_bridge_bounds_threads_and_reports_queue_and_wait():
+    bridge = ExecutorBridge('test', 2)
+    release = threading.Event()
+    try:
+        calls = [asyncio.create_task(bridge.run(release.wait, 5)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        # Цикл событий свободен, пока потоки заняты
+        stats = bridge.stats()
+        assert (stats['active'], stats['queued']) == (2, 3)
+
+        release.set()
+        assert await asyncio.gather(*calls) == [True] * 5
+    finally:
+        bridge.shutdown()
+
+    stats = bridge.stats()
+    assert (stats['active'], stats['queued'], stats['completed']) == (0, 0, 5)
+    assert stats['wait_ms_max'] >= 40
+    assert stats['wait_ms_p95'] <= stats['wait_ms_max']
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_call_leaves_the_queue():
+    bridge = ExecutorBridge('test', 1)
+    release = threading.Event()
+    try:
+        running = asyncio.create_task(bridge.run(release.wait, 5))
+        queued = asyncio.create_task(bridge.run(lambda: 'never'))
+        await asyncio.sleep(0.02)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert bridge.stats()['queued'] == 0
+        release.set()
+        await running
+    finally:
+        bridge.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_call_cancelled_as_its_thread_starts_leaves_the_queue_once():
+    bridge = ExecutorBridge('test', 1)
+    entered, resume = threading.Event(), threading.Event()
+
+    def perf_counter():
+        # Поток пула уже взял вызов, но ещё не отметил начало
+        if threading.current_thread() is not threading.main_thread():
+            entered.set()
+            resume.wait(5)
+        return time.perf_counter()
+
+    try:
+        with patch("utils.executors.time", SimpleNamespace(perf_counter=perf_counter)):
+            call = asyncio.create_task(bridge.run(lambda: 'ok'))
+            await asyncio.get_running_loop().run_in_executor(None, entered.wait, 5)
+            call.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await call
+            resume.set()
+            await asyncio.sleep(0.05)
+    finally:
+        bridge.shutdown()
+
+    stats = bridge.stats()
+    assert (stats['queued'], stats['active'], stats['completed']) == (0, 0, 1)
+
+
+@pytest.mark.asyncio
+async def test_bridge_calls_go_through_its_breaker():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+    bridge = ExecutorBridge('test', 1, breaker)
+
+    def broken():
+        raise OSError("connection refused")
+
+    try:
+        with pytest.raises(OSError):
+            await bridge.run(broken)
+        with pytest.raises(CircuitOpenError):
+            await bridge.run(lambda: 'ok')
+    finally:
+        bridge.shutdown()
+    assert bridge.stats()['completed'] == 1
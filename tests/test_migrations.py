@@ -0,0 +1,64 @@
+# tests/test_migrations.py
+import os
+import pytest
+import psycopg2
+from database.migrate import load_migrations, pending_migrations, migrate, MigrationError
+from database.explain_check import check_plans, collect_queries
+
+DATABASE_DSN = os.getenv('TEST_DATABASE_DSN')
+needs_postgres = pytest.mark.skipif(not DATABASE_DSN, reason="TEST_DATABASE_DSN is not set")
+
+
+def test_migrations_are_ordered_and_unique():
+    migrations = load_migrations()
+    versions = [migration.version for migration in migrations]
+    assert versions == sorted(versions)
+    assert versions[0] == 1
+
+
+def test_edited_migration_is_rejected():
+    migrations = load_migrations()
+    applied = {migrations[0].version: 'stale-checksum'}
+    with pytest.raises(MigrationError):
+        pending_migrations(applied, migrations)
+
+
+def test_every_database_function_is_explained():
+    names = {name for name, _, _ in collect_queries()}
+    assert 'database.user.select_user_date' in names
+    assert 'database.referrals.select_active_referrals' in names
+
+
+@pytest.fixture
+def scratch_conn():
+    conn = psycopg2.connect(DATABASE_DSN)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS migrate_test CASCADE")
+        cur.execute("CREATE SCHEMA migrate_test")
+        cur.execute("SET search_path TO migrate_test")
+    yield conn
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS migrate_test CASCADE")
+    conn.close()
+
+
+@needs_postgres
+def test_migrate_is_idempotent(scratch_conn):
+    applied = migrate(scratch_conn)
+    assert [migration.version for migration in applied] == [migration.version for migration in load_migrations()]
+    assert migrate(scratch_conn) == []
+
+
+@needs_postgres
+def test_hot_queries_use_indexes(scratch_conn):
+    plans, regressions = check_plans(scratch_conn, rows=50000)
+    assert plans
+    assert regressions == []
+
+
+@needs_postgres
+def test_missing_index_is_reported(scratch_conn):
+    migrations = [migration for migration in load_migrations() if migration.name != 'hot_path_indexes']
+    _, regressions = check_plans(scratch_conn, rows=50000, migrations=migrations)
+    assert 'database.referrals.select_active_referrals' in {name for name, _, _ in regressions}
@@ -0,0 +1,94 @@
+# tests/test_mock_panel.py
+import pytest
+from unittest.mock import patch, AsyncMock
+from aiohttp.test_utils import TestServer
+import api.client
+from api.mock_panel import MockPanel, parse_latency
+from api.panel import PanelClient, PanelError, is_panel_failure
+from api.panels import PanelRegistry, parse_panel_configs
+from api.session import SessionManager
+from api.traffic import fetch_traffic
+from utils.resilience import CircuitBreaker, CircuitOpenError
+
+
+def make_registry(url, inbound_id):
+    configs = parse_panel_configs([{'name': 'mock', 'url': url, 'username': 'admin', 'password': 'secret',
+                                    'inbound_id': inbound_id, 'host': 'mock.example.com'}])
+    return PanelRegistry(configs, lambda config: SessionManager(PanelClient(config.url, config.username, config.password)))
+
+
+def test_latency_specs():
+    assert parse_latency('fixed:0.25')() == 0.25
+    assert all(0.1 <= parse_latency('uniform:0.1,0.2')() <= 0.2 for _ in range(20))
+    assert parse_latency('')() == 0.0
+    with pytest.raises(ValueError):
+        parse_latency('normal:1')
+
+
+@pytest.mark.asyncio
+async def test_purchase_flow_provisions_and_renews_on_mock_panel():
+    panel = MockPanel(inbound_ids=(4,), latency='uniform:0,0.005', seed=1)
+    async with TestServer(panel.make_app()) as server:
+        registry = make_registry(str(server.make_url('')), 4)
+        insert_user = AsyncMock()
+        update_date = AsyncMock()
+        try:
+            with patch("const.const_db.PANELS", registry), \
+                    patch("database.async_outbox.insert_user_with_intent", insert_user), \
+                    patch("database.async_outbox.update_user_date_with_intent", update_date):
+                await api.client.add_client(42, 'month1', 'user42')
+                row = insert_user.call_args.args
+                user = (42, row[1], 'user42', row[3], row[4], row[5], row[6], None, 'mock')
+                with patch("database.async_user.select_user", AsyncMock(return_value=user)):
+                    assert await api.client.update_client(42, 'month1') is True
+                new_date = update_date.call_args.args[0]
+                await api.client.deliver_intent('add', 42, row[1], 'user42', row[3], row[4], 'mock')
+                # Повторная доставка после потерянного ответа панели не создаёт дубликат
+                await api.client.deliver_intent('add', 42, row[1], 'user42', new_date, row[4], 'mock')
+
+            assert len(panel.clients(4)) == 1
+            client = panel.clients(4)[0]
+            assert (client['id'], client['email']) == (row[1], 'user42')
+            assert client['expiryTime'] > row[3]
+
+            panel.set_traffic('user42', up=10, down=20)
+            panel.set_online(['user42'])
+            traffic = await fetch_traffic(registry.session('mock'), 4)
+            assert (traffic[0].uuid, traffic[0].up, traffic[0].down, traffic[0].online) == (row[1], 10, 20, True)
+        finally:
+            await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_session_is_renewed_transparently():
+    panel = MockPanel()
+    async with TestServer(panel.make_app()) as server:
+        session = SessionManager(PanelClient(str(server.make_url('')), 'admin', 'secret'))
+        try:
+            await session.get_inbounds()
+            panel.expire_sessions()
+            inbounds = await session.get_inbounds()
+        finally:
+            await session.close()
+
+    assert [inbound['id'] for inbound in inbounds] == [1]
+    assert panel.logins == 2
+    assert session.relogins == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_panel_opens_the_circuit():
+    panel = MockPanel(error_rate=1.0, error_status=502)
+    async with TestServer(panel.make_app()) as server:
+        breaker = CircuitBreaker('3x-ui:mock', failure_threshold=3, reset_timeout=60, is_failure=is_panel_failure)
+        session = SessionManager(PanelClient(str(server.make_url('')), 'admin', 'secret'), breaker=breaker)
+        try:
+            for _ in range(3):
+                with pytest.raises(PanelError):
+                    await session.get_inbounds()
+            with pytest.raises(CircuitOpenError):
+                await session.get_inbounds()
+        finally:
+            await session.close()
+
+    assert panel.requests == 3
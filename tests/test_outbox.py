@@ -0,0 +1,100 @@
+# tests/test_outbox.py
+import os
+import pytest
+import psycopg2
+from unittest.mock import patch
+import database.outbox
+import middleware.outbox
+from api.panel import PanelError
+from database.migrate import migrate
+from database.pool import ConnectionPool
+from utils.timestamp import current_timestamp
+
+DATABASE_DSN = os.getenv('TEST_DATABASE_DSN')
+needs_postgres = pytest.mark.skipif(not DATABASE_DSN, reason="TEST_DATABASE_DSN is not set")
+
+
+@pytest.fixture
+def outbox_pool():
+    admin = psycopg2.connect(DATABASE_DSN)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS outbox_test CASCADE")
+        cur.execute("CREATE SCHEMA outbox_test")
+
+    pool = ConnectionPool(lambda: psycopg2.connect(DATABASE_DSN, options='-c search_path=outbox_test'), maxconn=5)
+    with pool.connection() as conn:
+        migrate(conn)
+    with patch("const.const_db.POOL", pool):
+        yield pool
+
+    pool.closeall()
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS outbox_test CASCADE")
+    admin.close()
+
+
+def outbox_rows(pool):
+    with pool.cursor() as cur:
+        cur.execute("SELECT tg_id, action, status, attempts FROM provisioning_outbox ORDER BY id")
+        return cur.fetchall()
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_intents_are_committed_with_the_user_and_delivered_in_order(outbox_pool):
+    now = current_timestamp()
+    database.outbox.insert_user_with_intent(1, 'uuid-1', 'alice', now + 1000, 'sub1', 'vless://1', now, 'main', 'add:1', now)
+    database.outbox.update_user_date_with_intent(now + 5000, 1, 'update:1', now)
+    # Тот же ключ идемпотентности не создаёт второе намерение
+    database.outbox.update_user_date_with_intent(now + 5000, 1, 'update:1', now)
+    database.outbox.insert_user_with_intent(2, 'uuid-2', 'bob', now + 2000, 'sub2', 'vless://2', now, 'main', 'add:2', now)
+
+    delivered = []
+
+    async def deliver(action, tg_id, user_id, email, date, sub_id, panel):
+        delivered.append((action, tg_id, date))
+
+    with patch("api.client.deliver_intent", deliver):
+        # Обновление alice ждёт, пока не доставлено её создание
+        assert await middleware.outbox.drain_outbox(batch_size=10) == 2
+        assert await middleware.outbox.drain_outbox(batch_size=10) == 1
+        assert await middleware.outbox.drain_outbox(batch_size=10) == 0
+
+    assert delivered == [('add', 1, now + 5000), ('add', 2, now + 2000), ('update', 1, now + 5000)]
+    assert [row[2] for row in outbox_rows(outbox_pool)] == ['done', 'done', 'done']
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_failed_delivery_is_retried_with_backoff_then_given_up(outbox_pool):
+    now = current_timestamp()
+    database.outbox.insert_user_with_intent(1, 'uuid-1', 'alice', now + 1000, 'sub1', 'vless://1', now, 'main', 'add:1', now)
+
+    async def deliver(*args):
+        raise PanelError("panel timed out")
+
+    with patch("api.client.deliver_intent", deliver):
+        assert await middleware.outbox.drain_outbox(max_attempts=2, retry_delay=60) == 1
+        # Следующая попытка отложена
+        assert await middleware.outbox.drain_outbox(max_attempts=2, retry_delay=60) == 0
+        assert outbox_rows(outbox_pool) == [(1, 'add', 'pending', 1)]
+
+        with outbox_pool.cursor() as cur:
+            cur.execute("UPDATE provisioning_outbox SET available_at = 0")
+        assert await middleware.outbox.drain_outbox(max_attempts=2, retry_delay=60) == 1
+
+    assert outbox_rows(outbox_pool) == [(1, 'add', 'dead', 2)]
+    assert database.outbox.select_outbox_stats(now)[:3] == (0, 0, 1)
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_user_row_rolls_back_with_a_failed_intent(outbox_pool):
+    now = current_timestamp()
+    database.outbox.insert_user_with_intent(1, 'uuid-1', 'alice', now, 'sub1', 'vless://1', now, 'main', 'key', now)
+    with pytest.raises(psycopg2.Error):
+        database.outbox.insert_user_with_intent(1, 'uuid-9', 'alice', now, 'sub9', 'vless://9', now, 'main', 'other', now)
+    with outbox_pool.cursor() as cur:
+        cur.execute("SELECT count(*) FROM provisioning_outbox")
+        assert cur.fetchone()[0] == 1
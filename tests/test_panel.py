@@ -0,0 +1,124 @@
+# tests/test_panel.py
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from api.panel import PanelClient, PanelError
+from api.session import SessionManager
+
+
+def make_panel_app(delay=0.0):
+    state = {'in_flight': 0, 'max_in_flight': 0, 'added': [], 'logins': 0, 'token': 'session-token'}
+
+    async def login(request):
+        state['logins'] += 1
+        form = await request.post()
+        if form.get('password') != 'secret':
+            return web.json_response({'success': False, 'msg': 'wrong password', 'obj': None})
+        response = web.json_response({'success': True, 'msg': 'ok', 'obj': None})
+        response.set_cookie('3x-ui', state['token'])
+        return response
+
+    async def add_client(request):
+        if request.cookies.get('3x-ui') != state['token']:
+            raise web.HTTPFound('/panel/login')
+        state['in_flight'] += 1
+        state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+        await asyncio.sleep(delay)
+        state['in_flight'] -= 1
+        state['added'].append(await request.json())
+        return web.json_response({'success': True, 'msg': 'added', 'obj': None})
+
+    async def traffic(request):
+        return web.json_response({'success': True, 'msg': '', 'obj': {'email': request.match_info['email'], 'up': 1, 'down': 2}})
+
+    app = web.Application()
+    app.router.add_post('/panel/login', login)
+    app.router.add_post('/panel/panel/api/inbounds/addClient', add_client)
+    app.router.add_get('/panel/panel/api/inbounds/getClientTraffics/{email}', traffic)
+    return app, state
+
+
+@pytest.mark.asyncio
+async def test_panel_client_logs_in_and_reuses_session_cookie():
+    app, state = make_panel_app()
+    async with TestServer(app) as server:
+        client = PanelClient(str(server.make_url('/panel')), 'admin', 'secret')
+        try:
+            await client.login()
+            await client.add_client({'id': 1, 'settings': '{}'})
+            traffic = await client.get_client_traffic('user42')
+        finally:
+            await client.close()
+
+    assert state['added'] == [{'id': 1, 'settings': '{}'}]
+    assert traffic == {'email': 'user42', 'up': 1, 'down': 2}
+
+
+@pytest.mark.asyncio
+async def test_panel_client_raises_on_rejected_login():
+    app, _ = make_panel_app()
+    async with TestServer(app) as server:
+        client = PanelClient(str(server.make_url('/panel')), 'admin', 'wrong')
+        try:
+            with pytest.raises(PanelError):
+                await client.login()
+        finally:
+            await client.close()
+
+
+@pytest.mark.asyncio
+async def test_panel_client_caps_concurrency_and_times_out():
+    app, state = make_panel_app(delay=0.05)
+    async with TestServer(app) as server:
+        client = PanelClient(str(server.make_url('/panel')), 'admin', 'secret', max_concurrency=2)
+        slow = PanelClient(str(server.make_url('/panel')), 'admin', 'secret', read_timeout=0.01)
+        try:
+            await client.login()
+            await asyncio.gather(*(client.add_client({'id': i}) for i in range(6)))
+            await slow.login()
+            with pytest.raises(PanelError):
+                await slow.add_client({'id': 99})
+        finally:
+            await client.close()
+            await slow.close()
+
+    assert state['max_in_flight'] == 2
+
+
+@pytest.mark.asyncio
+async def test_session_relogs_in_once_for_concurrent_callers():
+    app, state = make_panel_app(delay=0.01)
+    async with TestServer(app) as server:
+        session = SessionManager(PanelClient(str(server.make_url('/panel')), 'admin', 'secret'))
+        try:
+            await session.add_client({'id': 0})
+            # Панель сбросила сессии: старая cookie больше не действует
+            state['token'] = 'rotated-token'
+            await asyncio.gather(*(session.add_client({'id': i}) for i in range(1, 5)))
+        finally:
+            await session.close()
+
+    assert state['logins'] == 2
+    assert session.relogins == 1
+    assert sorted(p['id'] for p in state['added']) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_session_restores_cookie_from_file(tmp_path):
+    app, state = make_panel_app()
+    cookie_file = str(tmp_path / 'panel.cookies')
+    async with TestServer(app) as server:
+        url = str(server.make_url('/panel'))
+        first = SessionManager(PanelClient(url, 'admin', 'secret'), cookie_file=cookie_file)
+        await first.ensure()
+        await first.close()
+
+        restarted = SessionManager(PanelClient(url, 'admin', 'secret'), cookie_file=cookie_file)
+        try:
+            await restarted.add_client({'id': 1})
+        finally:
+            await restarted.close()
+
+    assert state['logins'] == 1
+    assert restarted.logins == 0
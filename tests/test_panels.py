@@ -0,0 +1,92 @@
+# tests/test_panels.py
+import json
+import pytest
+from unittest.mock import patch, AsyncMock
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import api.client
+from api.auth import create_session
+from api.panels import PanelRegistry, PanelCapacityError, parse_panel_configs
+
+
+def make_mock_panel():
+    received = []
+
+    async def login(request):
+        response = web.json_response({'success': True, 'msg': '', 'obj': None})
+        response.set_cookie('3x-ui', 'token')
+        return response
+
+    async def record(request):
+        if request.cookies.get('3x-ui') != 'token':
+            raise web.HTTPFound('/login')
+        received.append((request.match_info.get('uuid', 'addClient'), await request.json()))
+        return web.json_response({'success': True, 'msg': '', 'obj': None})
+
+    app = web.Application()
+    app.router.add_post('/login', login)
+    app.router.add_post('/panel/api/inbounds/addClient', record)
+    app.router.add_post('/panel/api/inbounds/updateClient/{uuid}', record)
+    return app, received
+
+
+def panel(name, capacity, inbound_id=1, url='http://127.0.0.1:1'):
+    return {'name': name, 'url': url, 'username': 'admin', 'password': 'secret',
+            'inbound_id': inbound_id, 'host': f'{name}.example.com', 'capacity': capacity}
+
+
+def test_placement_prefers_lowest_load_ratio_and_respects_capacity():
+    registry = PanelRegistry(parse_panel_configs([panel('a', 10), panel('b', 2), panel('c', 10)]), lambda config: None)
+    registry.set_loads({'a': 5, 'c': 2})
+
+    placed = [registry.place().name for _ in range(7)]
+
+    assert placed == ['b', 'c', 'c', 'c', 'b', 'a', 'c']
+    registry.set_loads({'a': 10, 'b': 2, 'c': 10})
+    with pytest.raises(PanelCapacityError):
+        registry.place()
+
+
+def test_panel_configs_are_validated():
+    with pytest.raises(ValueError):
+        parse_panel_configs([panel('a', 10), panel('a', 10)])
+    with pytest.raises(ValueError):
+        parse_panel_configs([{**panel('a', 10), 'inbound_id': None}])
+
+
+@pytest.mark.asyncio
+async def test_clients_are_placed_and_updated_on_their_own_panel():
+    app_a, received_a = make_mock_panel()
+    app_b, received_b = make_mock_panel()
+    async with TestServer(app_a) as server_a, TestServer(app_b) as server_b:
+        configs = parse_panel_configs([
+            panel('a', 100, inbound_id=3, url=str(server_a.make_url(''))),
+            panel('b', 100, inbound_id=7, url=str(server_b.make_url(''))),
+        ])
+        registry = PanelRegistry(configs, create_session)
+        registry.set_loads({'a': 1})
+        insert_user = AsyncMock()
+        update_date = AsyncMock()
+        try:
+            with patch("const.const_db.PANELS", registry), \
+                    patch("database.async_outbox.insert_user_with_intent", insert_user), \
+                    patch("database.async_outbox.update_user_date_with_intent", update_date):
+                vless = await api.client.add_client(42, 'month1', 'user42')
+
+                row = insert_user.call_args.args
+                assert row[7] == 'b'
+                assert '@b.example.com:' in vless
+                user = (42, row[1], 'user42', row[3], row[4], vless, row[6], None, 'b')
+                with patch("database.async_user.select_user", AsyncMock(return_value=user)):
+                    assert await api.client.update_client(42, 'month1') is True
+                # Панели не трогаются до доставки намерений из outbox
+                assert received_b == []
+                await api.client.deliver_intent('add', 42, row[1], 'user42', row[3], row[4], 'b')
+                await api.client.deliver_intent('update', 42, row[1], 'user42', update_date.call_args.args[0], row[4], 'b')
+        finally:
+            await registry.close()
+
+    assert received_a == []
+    assert [(kind, payload['id']) for kind, payload in received_b] == [('addClient', 7), (row[1], 7)]
+    assert json.loads(received_b[1][1]['settings'])['clients'][0]['email'] == 'user42'
+    assert registry.stats()['b']['load'] == 1
@@ -0,0 +1,186 @@
+# tests/test_pool.py
+import threading
+import pytest
+import psycopg2
+from unittest.mock import patch
+import database.async_user
+from database.executor import DB_BREAKER
+from database.pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.closed = False
+        self.itersize = 2000
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.queries.append(query)
+
+    def fetchone(self):
+        return (1,)
+
+    def fetchmany(self, size):
+        return [(tg_id,) for tg_id in range(1, size + 1)]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.autocommit = False
+        self.queries = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.cursors = []
+
+    def cursor(self, name=None):
+        cur = FakeCursor(self, name)
+        self.cursors.append(cur)
+        return cur
+
+    def commit(self):
+        # Как и в psycopg2, именованный курсор после commit уже недействителен
+        assert all(cur.closed for cur in self.cursors if cur.name)
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    return ConnectionPool(connect, **kwargs), created
+
+
+def test_pool_opens_minconn_and_reuses_connections():
+    pool, created = make_pool(minconn=2, maxconn=4)
+    assert len(created) == 2
+
+    with pool.cursor() as cur:
+        cur.execute("SELECT 1")
+    with pool.cursor() as cur:
+        cur.execute("SELECT 2")
+
+    assert len(created) == 2
+    assert pool.stats() == {'size': 2, 'idle': 2, 'in_use': 0}
+    assert all(conn.autocommit for conn in created)
+
+
+def test_pool_grows_up_to_maxconn_and_times_out():
+    pool, created = make_pool(minconn=0, maxconn=2, timeout=0.05)
+    first = pool.getconn()
+    second = pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+
+    pool.putconn(first)
+    assert pool.getconn() is first
+    assert len(created) == 2
+    pool.putconn(second)
+
+
+def test_pool_waiting_checkout_gets_released_connection():
+    pool, created = make_pool(minconn=1, maxconn=1, timeout=2)
+    conn = pool.getconn()
+    got = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    pool.putconn(conn)
+    waiter.join(timeout=2)
+
+    assert got == [conn]
+
+
+def test_pool_replaces_dead_connection_on_checkout():
+    pool, created = make_pool(minconn=1, maxconn=1, validate_interval=0)
+    created[0].broken = True
+
+    with pool.cursor() as cur:
+        cur.execute("SELECT now()")
+
+    assert len(created) == 2
+    assert created[0].closed
+    assert created[0].queries == []
+    assert created[1].queries == ["SELECT now()"]
+
+
+def test_pool_discards_connection_after_operational_error():
+    pool, created = make_pool(minconn=1, maxconn=1, validate_interval=60)
+    created[0].broken = True
+
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.cursor() as cur:
+            cur.execute("SELECT 1")
+
+    assert created[0].closed
+    assert pool.stats()['size'] == 0
+
+    with pool.cursor() as cur:
+        cur.execute("SELECT 1")
+    assert len(created) == 2
+
+
+def test_transaction_commits_or_rolls_back():
+    pool, created = make_pool(minconn=1, maxconn=1)
+    conn = created[0]
+
+    with pool.transaction() as cur:
+        cur.execute("UPDATE referrals SET meow_coins_balance = 0")
+    assert conn.commits == 1
+    assert conn.autocommit
+
+    with pytest.raises(ValueError):
+        with pool.transaction() as cur:
+            raise ValueError("boom")
+    assert conn.rollbacks >= 1
+    assert conn.autocommit
+
+
+def test_named_transaction_closes_server_cursor_before_commit():
+    pool, created = make_pool(minconn=1, maxconn=1)
+    conn = created[0]
+
+    with pool.transaction(name='users_stream', itersize=500) as cur:
+        assert cur.name == 'users_stream'
+        assert cur.itersize == 500
+        cur.execute("SELECT tg_id FROM users ORDER BY tg_id")
+    assert cur.closed
+    assert conn.commits == 1
+    assert pool.stats() == {'size': 1, 'idle': 1, 'in_use': 0}
+
+
+@pytest.mark.asyncio
+async def test_stream_returns_connection_when_circuit_opens_before_close():
+    pool, created = make_pool(minconn=1, maxconn=1)
+    try:
+        with patch("const.const_db.POOL", pool):
+            stream = database.async_user.iter_users(columns=('tg_id',), batch_size=2)
+            assert await stream.__anext__() == (1,)
+            assert pool.stats()['in_use'] == 1
+            # Другие запросы успели открыть предохранитель, пока поток был открыт
+            for _ in range(DB_BREAKER.failure_threshold):
+                DB_BREAKER.record_failure()
+            await stream.aclose()
+    finally:
+        DB_BREAKER.record_success()
+
+    assert pool.stats()['in_use'] == 0
+    assert created[0].cursors[-1].closed
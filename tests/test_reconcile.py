@@ -0,0 +1,71 @@
+# tests/test_reconcile.py
+import json
+import pytest
+from unittest.mock import patch
+import middleware.reconcile
+from api.panels import PanelRegistry, parse_panel_configs
+
+
+class FakePanelSession:
+    def __init__(self, clients):
+        self.clients = clients
+        self.added = []
+        self.updated = []
+
+    async def get_inbound(self, inbound_id):
+        return {'id': inbound_id, 'settings': json.dumps({'clients': self.clients})}
+
+    async def add_client(self, payload):
+        self.added.append(payload)
+
+    async def update_client(self, uuid, payload):
+        self.updated.append((uuid, payload))
+
+
+def make_registry(sessions):
+    configs = parse_panel_configs([
+        {'name': name, 'url': 'http://127.0.0.1:1', 'username': 'u', 'password': 'p', 'inbound_id': 2, 'host': name}
+        for name in sessions
+    ])
+    return PanelRegistry(configs, lambda config: sessions[config.name])
+
+
+USERS = [
+    (1, 'uuid-1', 'alice', 1000, 'sub1', 'main'),
+    (2, 'uuid-2', 'bob', 2000, 'sub2', 'main'),
+    (3, 'uuid-3', 'carol', 3000, 'sub3', 'main'),
+    (4, 'uuid-4', 'dave', 4000, 'sub4', 'main'),
+    (5, 'uuid-5', 'erin', 5000, 'sub5', 'main'),
+]
+
+
+async def stream_users(columns=None):
+    for user in USERS:
+        yield user
+
+
+@pytest.mark.asyncio
+async def test_reconcile_reports_drift_and_repairs_in_batches():
+    main = FakePanelSession([
+        {'id': 'uuid-1', 'email': 'alice', 'expiryTime': 1000},
+        {'id': 'uuid-2', 'email': 'bob', 'expiryTime': 1999},
+        {'id': 'uuid-3', 'email': 'carol-old', 'expiryTime': 3000},
+        {'id': 'uuid-9', 'email': 'ghost', 'expiryTime': 0},
+    ])
+    spare = FakePanelSession([{'id': 'uuid-5', 'email': 'erin', 'expiryTime': 5000}])
+    registry = make_registry({'main': main, 'spare': spare})
+
+    with patch("const.const_db.PANELS", registry), \
+            patch("database.async_user.iter_users", stream_users):
+        report = await middleware.reconcile.reconcile(repair_drift=True, batch_size=10)
+
+    assert report.summary() == {
+        'users': 5, 'panel_clients': 5, 'missing': 1, 'expiry_mismatch': 1, 'email_mismatch': 1,
+        'wrong_panel': 1, 'orphaned': 1, 'repaired': 3, 'repair_failed': 0,
+    }
+    assert [row.uuid for row in report.orphaned] == ['uuid-9']
+    assert len(main.added) == 1
+    added = json.loads(main.added[0]['settings'])['clients']
+    assert [(client['id'], client['expiryTime']) for client in added] == [('uuid-4', 4000)]
+    assert sorted(uuid for uuid, _ in main.updated) == ['uuid-2', 'uuid-3']
+    assert spare.added == [] and spare.updated == []
@@ -0,0 +1,120 @@
+# tests/test_reminders.py
+import os
+import pytest
+import psycopg2
+from unittest.mock import patch
+from database.migrate import migrate
+from database.pool import ConnectionPool
+from middleware.reminders import ReminderWheel, parse_offsets
+
+DATABASE_DSN = os.getenv('TEST_DATABASE_DSN')
+needs_postgres = pytest.mark.skipif(not DATABASE_DSN, reason="TEST_DATABASE_DSN is not set")
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+NOW = 1_760_000_000_000
+
+
+class Clock:
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Sender:
+    def __init__(self):
+        self.sent = []
+
+    async def __call__(self, tg_id, expiry):
+        self.sent.append((tg_id, expiry))
+
+
+def test_offsets_are_parsed_longest_first():
+    assert parse_offsets('1h, 7d,1d') == [('7d', 7 * DAY_MS), ('1d', DAY_MS), ('1h', HOUR_MS)]
+    with pytest.raises(ValueError):
+        parse_offsets('1w')
+
+
+@pytest.mark.asyncio
+async def test_reschedule_replaces_queued_reminder():
+    clock, send = Clock(), Sender()
+    wheel = ReminderWheel(parse_offsets('1d'), send, horizon=2 * 3600, catchup=0, clock=clock)
+
+    async def upcoming(offsets, from_ts, until_ts, now_ts):
+        return [(1, NOW + DAY_MS + HOUR_MS, '1d')]
+
+    async def claim(tg_id, expiry, offset_name, now_ts):
+        return True
+
+    with patch("database.async_reminders.select_upcoming_reminders", upcoming), \
+            patch("database.async_reminders.claim_reminder", claim):
+        await wheel.load(clock.now)
+        # Продлил подписку на полчаса раньше напоминания: старое не уходит, новое - в своё время
+        wheel.reschedule(1, NOW + DAY_MS + HOUR_MS // 2)
+        clock.now = NOW + HOUR_MS
+        await wheel.fire_due(clock.now)
+        assert send.sent == [(1, NOW + DAY_MS + HOUR_MS // 2)]
+        assert wheel.stats()['queued'] == 0
+
+
+@pytest.fixture
+def reminder_pool():
+    admin = psycopg2.connect(DATABASE_DSN)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS reminder_test CASCADE")
+        cur.execute("CREATE SCHEMA reminder_test")
+
+    pool = ConnectionPool(lambda: psycopg2.connect(DATABASE_DSN, options='-c search_path=reminder_test'), maxconn=5)
+    with pool.connection() as conn:
+        migrate(conn)
+    with patch("const.const_db.POOL", pool):
+        with pool.cursor() as cur:
+            # 1 - через сутки и 10 минут, 2 - через 7 суток и 20 минут, 3 - через 40 минут, 4 - через месяц
+            cur.execute("""
+            INSERT INTO users (tg_id, user_id, email, date, sub_id, vless_profile, login_date)
+            SELECT t.tg_id, 'uuid', 'user' || t.tg_id, %s + t.delta, 'sub', 'vless://', 0
+            FROM unnest(%s::bigint[], %s::bigint[]) AS t(tg_id, delta)
+            """, (NOW, [1, 2, 3, 4], [DAY_MS + 10 * 60000, 7 * DAY_MS + 20 * 60000, 40 * 60000, 30 * DAY_MS]))
+        yield pool
+
+    pool.closeall()
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS reminder_test CASCADE")
+    admin.close()
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_reminders_fire_on_time_and_never_twice_across_restarts(reminder_pool):
+    offsets = parse_offsets('7d,1d,1h')
+    clock, send = Clock(), Sender()
+    wheel = ReminderWheel(offsets, send, horizon=3600, catchup=3600, clock=clock)
+
+    # Часовое напоминание пользователя 3 пропущено 20 минут назад и догоняется
+    await wheel.load(clock.now)
+    assert wheel.stats()['queued'] == 3
+    for minute in (0, 10, 20):
+        clock.now = NOW + minute * 60000
+        await wheel.fire_due(clock.now)
+    assert send.sent == [(3, NOW + 40 * 60000), (1, NOW + DAY_MS + 10 * 60000), (2, NOW + 7 * DAY_MS + 20 * 60000)]
+
+    # Перезапуск: новое окно с догоняющей частью находит уже отправленные и пропускает их
+    restarted = ReminderWheel(offsets, send, horizon=3600, catchup=3600, clock=clock)
+    await restarted.load(clock.now)
+    await restarted.fire_due(clock.now)
+    assert len(send.sent) == 3
+
+    # Напоминание, чья дата изменилась в обход планировщика, не отправляется
+    with reminder_pool.cursor() as cur:
+        cur.execute("UPDATE users SET date = date + %s WHERE tg_id = 4", (-30 * DAY_MS + DAY_MS + 50 * 60000,))
+    clock.now = NOW + 40 * 60000
+    await restarted.load(clock.now)
+    with reminder_pool.cursor() as cur:
+        cur.execute("UPDATE users SET date = date + 1 WHERE tg_id = 4")
+    clock.now = NOW + 50 * 60000
+    await restarted.fire_due(clock.now)
+    assert len(send.sent) == 3
+    assert restarted.stats()['skipped'] == 1
@@ -0,0 +1,152 @@
+# tests/test_renewal.py
+import os
+import pytest
+import psycopg2
+from unittest.mock import patch
+import middleware.renewal
+from database.migrate import migrate
+from database.pool import ConnectionPool
+from utils.timestamp import current_timestamp, update_date
+
+DATABASE_DSN = os.getenv('TEST_DATABASE_DSN')
+needs_postgres = pytest.mark.skipif(not DATABASE_DSN, reason="TEST_DATABASE_DSN is not set")
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+@pytest.fixture
+def renewal_pool():
+    admin = psycopg2.connect(DATABASE_DSN)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS renewal_test CASCADE")
+        cur.execute("CREATE SCHEMA renewal_test")
+
+    pool = ConnectionPool(lambda: psycopg2.connect(DATABASE_DSN, options='-c search_path=renewal_test'), maxconn=5)
+    with pool.connection() as conn:
+        migrate(conn)
+    start = current_timestamp() + 10 * DAY_MS
+    with patch("const.const_db.POOL", pool):
+        with pool.cursor() as cur:
+            cur.execute("""
+            INSERT INTO users (tg_id, user_id, email, date, sub_id, vless_profile, login_date)
+            SELECT g, 'uuid-' || g, 'user' || g, %s + g, 'sub' || g, 'vless://' || g, 0
+            FROM generate_series(1, 7) g
+            """, (start,))
+        yield pool, start
+
+    pool.closeall()
+    with admin.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS renewal_test CASCADE")
+    admin.close()
+
+
+def user_dates(pool):
+    with pool.cursor() as cur:
+        cur.execute("SELECT tg_id, date FROM users ORDER BY tg_id")
+        return dict(cur.fetchall())
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_interrupted_run_resumes_without_double_renewal(renewal_pool):
+    pool, start = renewal_pool
+    before = user_dates(pool)
+    pushed = []
+
+    async def push(tg_id, user_id, email, date, sub_id, panel):
+        if tg_id == 4:
+            raise TimeoutError("panel timed out")
+        pushed.append((tg_id, date))
+
+    async def crash_after_first_batch(run):
+        raise RuntimeError("bot restarted")
+
+    with patch("api.client.push_client_expiry", push):
+        with pytest.raises(RuntimeError):
+            await middleware.renewal.renew_tg_ids('run-1', 'month1', [1, 2, 3, 4, 5, 6],
+                                                  batch_size=3, progress=crash_after_first_batch)
+        run = await middleware.renewal.resume_renewal('run-1', batch_size=3)
+
+    after = user_dates(pool)
+    expected = {tg_id: update_date(before[tg_id], 'month1') for tg_id in (1, 2, 3, 5, 6)}
+    assert {tg_id: after[tg_id] for tg_id in expected} == expected
+    assert after[4] == before[4] and after[7] == before[7]
+    assert sorted(tg_id for tg_id, _ in pushed) == [1, 2, 3, 5, 6]
+    assert (run.renewed, run.failed, run.last_tg_id) == (5, 1, 6)
+    assert run.finished_at is not None
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_failed_users_are_retried_before_the_run_finishes(renewal_pool):
+    pool, start = renewal_pool
+    before = user_dates(pool)
+    attempts = []
+
+    async def push(tg_id, user_id, email, date, sub_id, panel):
+        attempts.append(tg_id)
+        if tg_id == 2 and attempts.count(2) == 1:
+            raise TimeoutError("panel timed out")
+
+    with patch("api.client.push_client_expiry", push):
+        run = await middleware.renewal.renew_tg_ids('run-2', 'month1', [1, 2, 3], batch_size=3)
+
+    assert attempts.count(2) == 2
+    assert user_dates(pool)[2] == update_date(before[2], 'month1')
+    assert (run.renewed, run.failed, run.conflicts) == (3, 0, 0)
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_date_changed_during_run_is_renewed_from_the_new_date(renewal_pool):
+    pool, start = renewal_pool
+    before = user_dates(pool)
+    paid_date = before[2] + 90 * DAY_MS
+    pushed = []
+
+    async def push(tg_id, user_id, email, date, sub_id, panel):
+        pushed.append((tg_id, date))
+        if tg_id == 2 and len(pushed) == 2:
+            # Оплата пользователя 2 успела записать новую дату, пока шёл запуск
+            with pool.cursor() as cur:
+                cur.execute("UPDATE users SET date = %s WHERE tg_id = 2", (paid_date,))
+
+    with patch("api.client.push_client_expiry", push):
+        run = await middleware.renewal.renew_tg_ids('run-3', 'month1', [1, 2], batch_size=3)
+
+    after = user_dates(pool)
+    assert after[2] == update_date(paid_date, 'month1')
+    assert after[1] == update_date(before[1], 'month1')
+    assert pushed[-1] == (2, after[2])
+    assert (run.renewed, run.failed, run.conflicts) == (2, 0, 1)
+    with pool.cursor() as cur:
+        cur.execute("SELECT count(*) FROM provisioning_outbox")
+        assert cur.fetchone() == (0,)
+
+
+@needs_postgres
+@pytest.mark.asyncio
+async def test_run_keeping_changed_dates_resends_them_to_panel(renewal_pool):
+    pool, start = renewal_pool
+    before = user_dates(pool)
+    paid_date = before[2] + 90 * DAY_MS
+
+    async def push(tg_id, user_id, email, date, sub_id, panel):
+        if tg_id == 2:
+            with pool.cursor() as cur:
+                cur.execute("UPDATE users SET date = %s WHERE tg_id = 2", (paid_date,))
+
+    with patch("api.client.push_client_expiry", push):
+        run = await middleware.renewal.renew_tg_ids('run-4', 'month1', [1, 2], batch_size=3,
+                                                    keep_changed_dates=True)
+
+    after = user_dates(pool)
+    assert after[2] == paid_date
+    assert after[1] == update_date(before[1], 'month1')
+    assert (run.renewed, run.failed, run.conflicts) == (1, 0, 1)
+    with pool.cursor() as cur:
+        cur.execute("SELECT tg_id, action FROM provisioning_outbox")
+        assert cur.fetchall() == [(2, 'update')]
+        cur.execute("SELECT status FROM renewal_items WHERE run_id = 'run-4' AND tg_id = 2")
+        assert cur.fetchone() == ('conflict',)
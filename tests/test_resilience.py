@@ -0,0 +1,150 @@
+# tests/test_resilience.py
+import asyncio
+import pytest
+from api.panel import PanelAuthError, PanelError, is_panel_failure
+from api.session import SessionManager
+from utils.logging_utils import backoff_delay, retry_on_error
+from utils.resilience import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def fail():
+    raise PanelError("down")
+
+
+async def succeed():
+    return 'ok'
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_fails_fast_and_closes_after_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=30, clock=clock)
+
+    for _ in range(3):
+        with pytest.raises(PanelError):
+            await breaker.call(fail)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(succeed)
+    assert breaker.stats()['rejected'] == 1
+
+    clock.now = 30
+    assert breaker.state == HALF_OPEN
+    assert await breaker.call(succeed) == 'ok'
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_failure_reopens_and_admits_one_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10, clock=clock)
+    with pytest.raises(PanelError):
+        await breaker.call(fail)
+
+    clock.now = 10
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        raise PanelError("still down")
+
+    trial = asyncio.create_task(breaker.call(slow))
+    await asyncio.sleep(0)
+    # Пока идёт пробный вызов, остальные отклоняются
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(succeed)
+    release.set()
+    with pytest.raises(PanelError):
+        await trial
+    assert breaker.state == OPEN
+    assert breaker.stats()['opened'] == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_that_are_not_failures_keep_the_circuit_closed():
+    breaker = CircuitBreaker('test', failure_threshold=1, is_failure=is_panel_failure)
+
+    async def rejected():
+        raise PanelError("rejected by panel", 200)
+
+    async def unauthorized():
+        raise PanelAuthError("login", 302)
+
+    for func in (rejected, unauthorized):
+        with pytest.raises(PanelError):
+            await breaker.call(func)
+    assert breaker.state == CLOSED
+
+
+def test_backoff_delay_grows_with_jitter_and_cap():
+    for attempt, base in ((0, 1), (1, 2), (2, 4), (6, 10)):
+        for _ in range(20):
+            assert base * 0.5 <= backoff_delay(attempt, 1, 2, 10, 0.5) <= base
+
+
+@pytest.mark.asyncio
+async def test_retry_does_not_block_loop_and_skips_open_circuit():
+    calls = []
+
+    @retry_on_error(retries=3, delay=0.05, jitter=0)
+    async def flaky():
+        calls.append(1)
+        raise PanelError("down")
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    with pytest.raises(PanelError):
+        await flaky()
+    task.cancel()
+    assert len(calls) == 3
+    assert ticks >= 5
+
+    @retry_on_error(retries=3, delay=0.05)
+    async def open_circuit():
+        calls.append(2)
+        raise CircuitOpenError('test', 10)
+
+    with pytest.raises(CircuitOpenError):
+        await open_circuit()
+    assert calls.count(2) == 1
+
+
+class DownClient:
+    def __init__(self):
+        self.requests = 0
+
+    async def login(self):
+        self.requests += 1
+        raise PanelError("connection refused")
+
+
+@pytest.mark.asyncio
+async def test_session_stops_calling_a_dead_panel():
+    client = DownClient()
+    breaker = CircuitBreaker('3x-ui:test', failure_threshold=2, reset_timeout=60)
+    session = SessionManager(client, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(PanelError):
+            await session.get_inbounds()
+    with pytest.raises(CircuitOpenError):
+        await session.get_inbounds()
+    assert client.requests == 2
+    assert not session.available()
+    assert session.stats()['circuit'] == OPEN
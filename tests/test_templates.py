@@ -0,0 +1,66 @@
+# tests/test_templates.py
+import json
+import os
+import pytest
+from utils.json_fun import (
+    build_client_payload, validate_client_template, precompute_receipts, receipt_creator, RECEIPT_TEMPLATE_PATH
+)
+from utils.templates import Template, TemplateError
+from const.const_bot import MONTH1
+
+CLIENT_TEMPLATE = {
+    'id': 2,
+    'settings': {'clients': [{'id': None, 'email': None, 'tgId': None, 'expiryTime': 0, 'subId': None, 'limitIp': 3}]},
+}
+
+
+def write_json(path, data, mtime_ns=None):
+    path.write_text(json.dumps(data))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_client_payload_does_not_mutate_template(tmp_path):
+    path = tmp_path / 'client.json'
+    write_json(path, CLIENT_TEMPLATE)
+    template = Template(str(path), validate_client_template)
+    template.load()
+
+    payload = build_client_payload(template.data, 42, 'uuid-1', 'user42', 1000, 'sub1')
+
+    assert payload['id'] == 2
+    assert json.loads(payload['settings'])['clients'][0] == {
+        'id': 'uuid-1', 'email': 'user42', 'tgId': '42', 'expiryTime': 1000, 'subId': 'sub1', 'limitIp': 3,
+    }
+    assert template.data == CLIENT_TEMPLATE
+
+
+def test_template_reloads_on_change_and_keeps_last_good_version(tmp_path):
+    path = tmp_path / 'client.json'
+    write_json(path, CLIENT_TEMPLATE, mtime_ns=1_000_000_000)
+    template = Template(str(path), validate_client_template, check_interval=0)
+    template.load()
+
+    write_json(path, {**CLIENT_TEMPLATE, 'id': 5}, mtime_ns=2_000_000_000)
+    assert template.data['id'] == 5
+
+    write_json(path, {'id': 7}, mtime_ns=3_000_000_000)
+    assert template.data['id'] == 5
+
+
+def test_invalid_template_fails_to_load(tmp_path):
+    path = tmp_path / 'client.json'
+    write_json(path, {'id': 2, 'settings': {'clients': []}})
+    with pytest.raises(TemplateError):
+        Template(str(path), validate_client_template).load()
+
+
+def test_receipts_for_products_are_precomputed():
+    key = (MONTH1['description'], MONTH1['amount'])
+    receipt = receipt_creator(RECEIPT_TEMPLATE_PATH, *key)
+
+    item = json.loads(receipt)['receipt']['items'][0]
+    assert item['description'] == MONTH1['description']
+    assert item['amount']['value'] == f"{MONTH1['amount'] / 100:.2f}"
+    with open(RECEIPT_TEMPLATE_PATH) as file:
+        assert precompute_receipts(json.load(file))[key] == receipt
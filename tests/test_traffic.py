@@ -0,0 +1,60 @@
+# tests/test_traffic.py
+import json
+import pytest
+from api.traffic import TrafficCache, parse_inbound, sync_traffic
+from middleware.traffic import format_bytes
+
+INBOUND = {
+    'id': 2,
+    'settings': json.dumps({'clients': [
+        {'id': 'uuid-1', 'email': 'alice'},
+        {'id': 'uuid-2', 'email': 'bob'},
+    ]}),
+    'clientStats': [
+        {'email': 'alice', 'up': 100, 'down': 2048, 'total': 0, 'expiryTime': 10, 'enable': True},
+        {'email': 'bob', 'up': 0, 'down': 0, 'total': 0, 'expiryTime': 20, 'enable': False},
+    ],
+}
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    async def get_inbound(self, inbound_id):
+        self.calls.append(('get_inbound', inbound_id))
+        return INBOUND
+
+    async def get_online_clients(self):
+        self.calls.append(('get_online_clients',))
+        return ['alice']
+
+
+@pytest.mark.asyncio
+async def test_sync_replaces_table_from_one_request_per_inbound():
+    cache = TrafficCache()
+    session = FakeSession()
+
+    assert await sync_traffic([(session, 2)], cache) == 2
+
+    assert session.calls == [('get_inbound', 2), ('get_online_clients',)]
+    alice = cache.get('alice')
+    assert (alice.uuid, alice.up, alice.down, alice.online) == ('uuid-1', 100, 2048, True)
+    assert cache.get_by_uuid('uuid-2').enable is False
+    assert cache.stats()['online'] == 1
+
+
+def test_replace_drops_clients_missing_from_the_panel():
+    cache = TrafficCache()
+    cache.replace(parse_inbound(INBOUND, None))
+    cache.replace(parse_inbound({**INBOUND, 'clientStats': INBOUND['clientStats'][:1]}, None))
+
+    assert cache.get('bob') is None
+    assert cache.get_by_uuid('uuid-2') is None
+    assert cache.stats()['syncs'] == 2
+
+
+def test_format_bytes():
+    assert format_bytes(512) == "512 Б"
+    assert format_bytes(1536) == "1.5 КБ"
+    assert format_bytes(3 * 1024 ** 3) == "3.0 ГБ"
@@ -0,0 +1,86 @@
+# tests/test_tunnel.py
+import itertools
+import time
+from database.pool import ConnectionPool
+from database.tunnel import TunnelManager
+from tests.test_pool import FakeConnection
+
+
+class FakeForwarder:
+    ports = itertools.count(40001)
+
+    def __init__(self, ssh_address, **kwargs):
+        self.kwargs = kwargs
+        self.local_bind_host = '127.0.0.1'
+        self.local_bind_port = None
+        self.is_active = False
+        self.tunnel_is_up = {}
+
+    def start(self):
+        self.local_bind_port = next(self.ports)
+        self.is_active = True
+        self.tunnel_is_up = {(self.local_bind_host, self.local_bind_port): True}
+
+    def check_tunnels(self):
+        pass
+
+    def stop(self):
+        self.is_active = False
+
+
+def make_tunnel(**kwargs):
+    return TunnelManager(('ssh.example', 22), 'bot', ('localhost', 5432), forwarder_factory=FakeForwarder, **kwargs)
+
+
+def test_tunnel_binds_dynamic_port_with_keepalive():
+    tunnel = make_tunnel(keepalive=15).start(monitor=False)
+    forwarder = tunnel._forwarder
+
+    assert forwarder.kwargs['local_bind_address'] == ('127.0.0.1', 0)
+    assert forwarder.kwargs['set_keepalive'] == 15
+    assert tunnel.local_address == ('127.0.0.1', forwarder.local_bind_port)
+    assert tunnel.is_alive()
+    tunnel.stop()
+
+
+def test_monitor_reestablishes_dead_tunnel_and_notifies_pool():
+    notified = []
+    tunnel = make_tunnel(probe_interval=0.01, on_reconnect=lambda host, port: notified.append(port))
+    tunnel.start()
+    first_port = tunnel.local_address[1]
+
+    tunnel._forwarder.is_active = False
+    for _ in range(200):
+        if notified:
+            break
+        time.sleep(0.01)
+    tunnel.stop()
+
+    assert tunnel.reconnects >= 1
+    assert notified and notified[0] != first_port
+
+
+def test_pool_reset_drops_connections_of_old_tunnel():
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    pool = ConnectionPool(connect, minconn=2, maxconn=3)
+    checked_out = pool.getconn()
+
+    idle = created[0] if checked_out is created[1] else created[1]
+
+    pool.reset()
+    assert idle.closed
+    assert not checked_out.closed
+    pool.putconn(checked_out)
+    assert checked_out.closed
+    assert pool.stats() == {'size': 0, 'idle': 0, 'in_use': 0}
+
+    fresh = pool.getconn()
+    assert fresh is created[2]
+    pool.putconn(fresh)
+    assert pool.stats()['idle'] == 1
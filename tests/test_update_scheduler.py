@@ -0,0 +1,110 @@
+# tests/test_update_scheduler.py
+import asyncio
+import pytest
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from bot.update_scheduler import UpdateScheduler, install_update_scheduler, update_chat_id
+
+
+def message(update_id, chat_id, text='hi'):
+    return types.Update.de_json({
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'date': 0, 'text': text, 'chat': {'id': chat_id, 'type': 'private'},
+                    'from': {'id': chat_id, 'is_bot': False, 'first_name': 'user'}},
+    })
+
+
+def callback(update_id, chat_id, data):
+    return types.Update.de_json({
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'chat_instance': 'c', 'data': data,
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'user'},
+            'message': {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}},
+        },
+    })
+
+
+def test_chat_id_of_messages_callbacks_and_payments():
+    assert update_chat_id(message(1, 10)) == 10
+    assert update_chat_id(callback(2, 11, 'pay_full')) == 11
+    pre_checkout = types.Update.de_json({'update_id': 3, 'pre_checkout_query': {
+        'id': 'q', 'currency': 'RUB', 'total_amount': 100, 'invoice_payload': 'p',
+        'from': {'id': 12, 'is_bot': False, 'first_name': 'user'}}})
+    assert update_chat_id(pre_checkout) == 12
+
+
+@pytest.mark.asyncio
+async def test_chats_are_serialized_inside_and_parallel_across():
+    log, running, peak = [], {}, {'total': 0, 'now': 0}
+
+    async def process(update):
+        chat = update.message.chat.id
+        running[chat] = running.get(chat, 0) + 1
+        peak['now'] += 1
+        peak['total'] = max(peak['total'], peak['now'])
+        assert running[chat] == 1
+        await asyncio.sleep(0.02)
+        log.append((chat, update.update_id))
+        running[chat] -= 1
+        peak['now'] -= 1
+
+    scheduler = UpdateScheduler(process, max_workers=3)
+    try:
+        updates = [message(i, chat) for i, chat in enumerate([1, 1, 2, 1, 3, 2, 4, 5])]
+        await scheduler.dispatch(updates)
+    finally:
+        await scheduler.close()
+
+    for chat in (1, 2):
+        ids = [update_id for logged_chat, update_id in log if logged_chat == chat]
+        assert ids == sorted(ids)
+    assert peak['total'] == 3
+    assert scheduler.stats()['chats'] == 0
+    assert scheduler.stats()['processed'] == 8
+
+
+@pytest.mark.asyncio
+async def test_failed_update_does_not_block_its_chat():
+    done = []
+
+    async def process(update):
+        if update.update_id == 1:
+            raise RuntimeError("handler crashed")
+        done.append(update.update_id)
+
+    scheduler = UpdateScheduler(process, max_workers=2)
+    try:
+        await scheduler.dispatch([message(1, 7), message(2, 7)])
+    finally:
+        await scheduler.close()
+    assert done == [2]
+    assert scheduler.stats()['failed'] == 1
+
+
+@pytest.mark.asyncio
+async def test_double_tap_and_payment_of_one_user_run_in_order_on_the_bot():
+    bot = AsyncTeleBot('123:abc')
+    events = []
+
+    @bot.callback_query_handler(func=lambda call: call.data == 'pay_full')
+    async def pay_full(call):
+        events.append(('pay_full start', call.id))
+        await asyncio.sleep(0.02)
+        events.append(('pay_full end', call.id))
+
+    @bot.message_handler(func=lambda m: True)
+    async def text(m):
+        events.append(('message', m.message_id))
+
+    scheduler = install_update_scheduler(bot, max_workers=10)
+    try:
+        # Два пакета подряд, как при polling: второй не обгоняет первый
+        first = asyncio.create_task(bot.process_new_updates([callback(1, 5, 'pay_full'), callback(2, 5, 'pay_full')]))
+        second = asyncio.create_task(bot.process_new_updates([message(3, 5)]))
+        await asyncio.gather(first, second)
+    finally:
+        await scheduler.close()
+
+    assert events == [('pay_full start', '1'), ('pay_full end', '1'),
+                      ('pay_full start', '2'), ('pay_full end', '2'), ('message', 3)]
@@ -0,0 +1,42 @@
+# tests/test_user.py
+import pytest
+from unittest.mock import patch
+from database.user import UserSnapshot
+
+
+def test_select_user_snapshot_reads_everything_in_one_query(mock_db_cursor):
+    from database.user import select_user_snapshot
+    mock_db_cursor.fetchone.return_value = (
+        42, True, True, 'user42', 1_760_000_000_000, None, 'sub42', 'vless://42', 7, 150
+    )
+
+    snapshot = select_user_snapshot(42)
+
+    assert mock_db_cursor.execute.call_count == 1
+    assert snapshot.exists_in_users and snapshot.exists_in_referrals
+    assert snapshot.referrer_tg_id == 7
+    assert snapshot.balance == 150
+    assert snapshot.date == 1_760_000_000_000
+
+
+def test_select_user_snapshot_for_unknown_user(mock_db_cursor):
+    from database.user import select_user_snapshot
+    mock_db_cursor.fetchone.return_value = (43, False, False, None, None, None, None, None, None, 0)
+
+    snapshot = select_user_snapshot(43)
+
+    assert not snapshot.exists_in_users
+    assert not snapshot.exists_in_referrals
+    assert snapshot.balance == 0
+
+
+@pytest.mark.asyncio
+async def test_expiry_date_view_uses_snapshot_date_without_query():
+    from bot.bot_base_fun import expiry_date_view
+    snapshot = UserSnapshot(44, True, False, 'user44', 1_760_000_000_000, None, 'sub44', 'vless://44', None, 0)
+
+    with patch("middleware.user.select_user_date") as mock_select:
+        text = await expiry_date_view("expiration", 44, snapshot.date)
+
+    mock_select.assert_not_called()
+    assert "Дата истечения" in text
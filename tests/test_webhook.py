@@ -0,0 +1,109 @@
+# tests/test_webhook.py
+import asyncio
+import pytest
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestClient, TestServer
+from telebot.async_telebot import AsyncTeleBot
+from bot.webhook import SECRET_HEADER, WebhookServer, run_webhook
+
+
+def message_update(update_id, text, chat_id=42):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': 0, 'text': text,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'user'},
+        },
+    }
+
+
+class FakeTelegram:
+    """
+    Delivers updates to the webhook the way Telegram does: one POST per update with the secret header.
+    """
+
+    def __init__(self, client, path='/webhook', secret='s3cret'):
+        self.client = client
+        self.path = path
+        self.secret = secret
+
+    async def deliver(self, update, secret=None):
+        response = await self.client.post(self.path, json=update, headers={SECRET_HEADER: secret or self.secret})
+        return response.status
+
+
+class SlowBot:
+    def __init__(self, delay):
+        self.delay = delay
+        self.updates = []
+
+    async def process_new_updates(self, updates):
+        await asyncio.sleep(self.delay)
+        self.updates.extend(update.update_id for update in updates)
+
+
+@pytest.mark.asyncio
+async def test_updates_reach_handlers_and_wrong_secret_is_refused():
+    bot = AsyncTeleBot('123:abc')
+    seen = []
+
+    @bot.message_handler(commands=['start'])
+    async def start(message):
+        seen.append((message.chat.id, message.text))
+
+    server = WebhookServer(bot, 's3cret')
+    async with TestClient(TestServer(server.make_app())) as client:
+        telegram = FakeTelegram(client)
+        assert await telegram.deliver(message_update(1, '/start')) == 200
+        assert await telegram.deliver(message_update(2, '/start'), secret='guess') == 401
+        assert await telegram.deliver({'update_id': 'x', 'message': 'broken'}) == 400
+        await server.drain()
+
+    assert seen == [(42, '/start')]
+    assert server.stats()['rejected'] == 2
+
+
+@pytest.mark.asyncio
+async def test_in_flight_limit_pushes_back_with_503():
+    bot = SlowBot(0.2)
+    server = WebhookServer(bot, 's3cret', max_in_flight=2, acquire_timeout=0.05)
+    async with TestClient(TestServer(server.make_app())) as client:
+        telegram = FakeTelegram(client)
+        statuses = [await telegram.deliver(message_update(i, 'hi')) for i in range(3)]
+        assert server.stats()['in_flight'] == 2
+        await server.drain()
+        # После освобождения слотов Telegram доставляет отклонённое обновление повторно
+        assert await telegram.deliver(message_update(2, 'hi')) == 200
+        await server.drain()
+
+    assert statuses == [200, 200, 503]
+    assert sorted(bot.updates) == [0, 1, 2]
+    assert server.stats()['throttled'] == 1
+
+
+class RecordingBot(SlowBot):
+    def __init__(self):
+        super().__init__(0)
+        self.webhooks = []
+
+    async def set_webhook(self, **kwargs):
+        self.webhooks.append(kwargs)
+
+
+@pytest.mark.asyncio
+async def test_run_webhook_registers_url_and_serves_until_stopped(unused_tcp_port):
+    bot = RecordingBot()
+    stop = asyncio.Event()
+    serving = asyncio.create_task(run_webhook(bot, 'https://bot.example.com/webhook', 's3cret',
+                                              host='127.0.0.1', port=unused_tcp_port, stop=stop))
+    await asyncio.sleep(0.1)
+    async with ClientSession() as session:
+        async with session.post(f'http://127.0.0.1:{unused_tcp_port}/webhook', json=message_update(7, 'hi'),
+                                headers={SECRET_HEADER: 's3cret'}) as response:
+            assert response.status == 200
+    stop.set()
+    await serving
+
+    assert bot.webhooks == [{'url': 'https://bot.example.com/webhook', 'secret_token': 's3cret', 'max_connections': 40}]
+    assert bot.updates == [7]
@@ -20,6 +20,20 @@ BOT_API = os.getenv('BOT_API')
 BOT_TEST_PROVIDER_TOKEN = os.getenv('BOT_TEST_PROVIDER_TOKEN')
 BOT_LIVE_PROVIDER_TOKEN = os.getenv('BOT_LIVE_PROVIDER_TOKEN')
 BOT_ADMIN_IDS = json.loads(os.getenv('BOT_ADMIN_IDS'))
+# Сколько обновлений разных чатов обрабатывать одновременно
+BOT_UPDATE_WORKERS = int(os.getenv('BOT_UPDATE_WORKERS', 50))
+# Получение обновлений: 'polling' или 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Webhook: публичный HTTPS-адрес для Telegram, локальный адрес сервера,
+# секрет из заголовка X-Telegram-Bot-Api-Secret-Token, сколько обновлений
+# обрабатывать одновременно и сколько соединений открывает Telegram
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv('WEBHOOK_MAX_IN_FLIGHT', 100))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
 PHOTO_subscriptions = os.getenv('PHOTO_subscriptions')
 PHOTO_instructions = os.getenv('PHOTO_instructions')
 PHOTO_menu = os.getenv('PHOTO_menu')
@@ -30,4 +44,79 @@ PHOTO_referral_program = os.getenv('PHOTO_referral_program')
 DB_PORT = int(os.getenv('DB_PORT'))
 DB_NAME = os.getenv('DB_NAME')
 DB_USERNAME = os.getenv('DB_USERNAME')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
\ No newline at end of file
+DB_PASSWORD = os.getenv('DB_PASSWORD')
+
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+# Потоки для подключения, миграций и отключения БД (отдельно от потоков запросов)
+DB_CONNECT_WORKERS = int(os.getenv('DB_CONNECT_WORKERS', 2))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_VALIDATE_INTERVAL = float(os.getenv('DB_POOL_VALIDATE_INTERVAL', 30))
+
+# ssh - через SSH-туннель, direct - напрямую по TLS, auto - direct, если порт доступен
+DB_TRANSPORT = os.getenv('DB_TRANSPORT', 'ssh')
+DB_HOST = os.getenv('DB_HOST', API_IP)
+DB_SSLMODE = os.getenv('DB_SSLMODE', 'require')
+DB_SSLROOTCERT = os.getenv('DB_SSLROOTCERT')
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+DB_TUNNEL_KEEPALIVE = float(os.getenv('DB_TUNNEL_KEEPALIVE', 30))
+DB_TUNNEL_PROBE_INTERVAL = float(os.getenv('DB_TUNNEL_PROBE_INTERVAL', 15))
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 300))
+
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', 5))
+API_READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT', 15))
+API_MAX_CONNECTIONS = int(os.getenv('API_MAX_CONNECTIONS', 10))
+API_MAX_CONCURRENCY = int(os.getenv('API_MAX_CONCURRENCY', 5))
+# Файл для cookie сессии 3X-UI: после перезапуска вход не нужен (пусто - не сохранять)
+API_COOKIE_FILE = os.getenv('API_COOKIE_FILE')
+# Несколько панелей 3X-UI: JSON-список объектов с полями name, url, username, password,
+# inbound_id, host и необязательными capacity, port_min, port_max, public_key, short_id,
+# sni, cookie_file. Пусто - одна панель 'main' из переменных API_*.
+API_PANELS = os.getenv('API_PANELS')
+API_PANEL_CAPACITY = int(os.getenv('API_PANEL_CAPACITY', 100000))
+
+# Массовое продление: пользователей за проход и одновременных запросов к панели
+RENEWAL_BATCH_SIZE = int(os.getenv('RENEWAL_BATCH_SIZE', 200))
+RENEWAL_CONCURRENCY = int(os.getenv('RENEWAL_CONCURRENCY', 5))
+
+# Как часто (в секундах) забирать трафик клиентов из 3X-UI
+TRAFFIC_SYNC_INTERVAL = int(os.getenv('TRAFFIC_SYNC_INTERVAL', 60))
+
+# Сверка users с 3X-UI: клиентов в одном запросе исправления
+RECONCILE_BATCH_SIZE = int(os.getenv('RECONCILE_BATCH_SIZE', 100))
+
+# Предохранитель для БД, 3X-UI и Telegram: после стольких ошибок подряд
+# вызовы сразу отклоняются, через BREAKER_RESET_TIMEOUT секунд - пробный вызов
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', 30))
+
+# Outbox доставки клиентов в 3X-UI: намерений за выборку, одновременных запросов,
+# пауза опроса (с), аренда намерения воркером (с), попыток до отказа,
+# начальная и наибольшая пауза между попытками (с)
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+OUTBOX_CONCURRENCY = int(os.getenv('OUTBOX_CONCURRENCY', 5))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 5))
+OUTBOX_LEASE = float(os.getenv('OUTBOX_LEASE', 60))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 20))
+OUTBOX_RETRY_DELAY = float(os.getenv('OUTBOX_RETRY_DELAY', 5))
+OUTBOX_MAX_RETRY_DELAY = float(os.getenv('OUTBOX_MAX_RETRY_DELAY', 600))
+
+# Рассылки: сообщений в секунду на весь бот и запас для всплеска (лимит Telegram ~30/с),
+# пауза между сообщениями одному чату (с), получателей за проход с контрольной точкой,
+# одновременных отправок, попыток при сбоях Telegram и как часто (с) обновлять ход рассылки
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 25))
+BROADCAST_BURST = int(os.getenv('BROADCAST_BURST', 25))
+BROADCAST_CHAT_INTERVAL = float(os.getenv('BROADCAST_CHAT_INTERVAL', 1))
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 100))
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 30))
+BROADCAST_MAX_ATTEMPTS = int(os.getenv('BROADCAST_MAX_ATTEMPTS', 3))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', 5))
+
+# Напоминания об окончании подписки: за сколько до окончания писать (через запятую,
+# например '7d,1d,1h'; единицы s, m, h, d), на сколько секунд вперёд держать их в памяти
+# и сколько секунд после пропущенного из-за перезапуска момента ещё отправлять
+REMINDER_OFFSETS = os.getenv('REMINDER_OFFSETS', '1d')
+REMINDER_HORIZON = float(os.getenv('REMINDER_HORIZON', 3600))
+REMINDER_CATCHUP = float(os.getenv('REMINDER_CATCHUP', 3600))
@@ -0,0 +1,131 @@
+#executors.py
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('executors', 'utils.log')
+
+# Сколько последних ожиданий хранить для перцентилей
+WAIT_SAMPLES = 1000
+
+
+class ExecutorBridge:
+    """
+    Bounded thread pool that runs blocking calls of one downstream for coroutines.
+
+    Each downstream gets its own bridge, so a slow database connect cannot
+    take the threads that serve queries. The bridge counts calls waiting for
+    a thread (queue depth) and running ones, and records how long calls
+    waited in the queue and ran. With a breaker, calls go through it.
+    """
+
+    def __init__(self, name, max_workers, breaker=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.breaker = breaker
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _started(self, waited, state):
+        with self._lock:
+            if not state['dequeued']:
+                state['dequeued'] = True
+                self.queued -= 1
+            self.active += 1
+            self._waits.append(waited)
+            self.max_wait = max(self.max_wait, waited)
+
+    def _finished(self, ran):
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+            self.total_run += ran
+
+    def _submit(self, func, *args, **kwargs):
+        call = functools.partial(func, *args, **kwargs)
+        enqueued = time.perf_counter()
+        # Из очереди вызов убирает либо поток, либо отмена - кто первый, под self._lock
+        state = {'dequeued': False}
+
+        def task():
+            started = time.perf_counter()
+            self._started(started - enqueued, state)
+            try:
+                return call()
+            finally:
+                self._finished(time.perf_counter() - started)
+
+        with self._lock:
+            self.queued += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, task)
+
+        async def wait():
+            try:
+                return await future
+            except asyncio.CancelledError:
+                # Отменённый вызов, не дождавшийся потока, из очереди уходит
+                if future.cancelled():
+                    with self._lock:
+                        if not state['dequeued']:
+                            state['dequeued'] = True
+                            self.queued -= 1
+                raise
+
+        return wait()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) in the pool and awaits its result.
+        """
+        if self.breaker is not None:
+            return await self.breaker.call(self._submit, func, *args, **kwargs)
+        return await self._submit(func, *args, **kwargs)
+
+    async def run_unguarded(self, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) in the pool without the breaker, for cleanup
+        that has to go through while the circuit is open.
+        """
+        return await self._submit(func, *args, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            completed, total_run = self.completed, self.total_run
+            stats = {'workers': self.max_workers, 'queued': self.queued, 'active': self.active, 'completed': completed}
+        stats.update({
+            'wait_ms_avg': sum(waits) / len(waits) * 1000 if waits else 0.0,
+            'wait_ms_p95': waits[min(len(waits) - 1, int(0.95 * len(waits)))] * 1000 if waits else 0.0,
+            'wait_ms_max': self.max_wait * 1000,
+            'run_ms_avg': total_run / completed * 1000 if completed else 0.0,
+        })
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+EXECUTORS = {}
+
+
+def register_executor(bridge):
+    """
+    Adds a bridge to EXECUTORS so its counters show up in executor_stats.
+    """
+    EXECUTORS[bridge.name] = bridge
+    return bridge
+
+
+def executor_stats():
+    return {name: bridge.stats() for name, bridge in list(EXECUTORS.items())}
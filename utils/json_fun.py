@@ -1,29 +1,97 @@
 #json_fun.py
 import json
+from const.const_bot import API_JSON_PATH, HANDLERS_JSON_PATH, MONTH1, MONTH3, MONTH6, YEAR1
 from utils.logging_utils import setup_logger, log_function_call
+from utils.templates import TEMPLATES, TemplateError
 
 logger = setup_logger('json_fun', 'utils.log')
 
+CLIENT_TEMPLATE_PATH = f"{API_JSON_PATH}json/request_post_client.json"
+RECEIPT_TEMPLATE_PATH = f"{HANDLERS_JSON_PATH}json/receipt.json"
+# Чеки для этих товаров собираются заранее при загрузке шаблона
+RECEIPT_PRODUCTS = (MONTH1, MONTH3, MONTH6, YEAR1)
+
+CLIENT_FIELDS = ('id', 'email', 'tgId', 'expiryTime', 'subId')
+
+
+def validate_client_template(data):
+    if not isinstance(data, dict) or not isinstance(data.get('id'), int):
+        raise TemplateError("Client template must have the inbound 'id'")
+    clients = data.get('settings', {}).get('clients') if isinstance(data.get('settings'), dict) else None
+    if not clients or not all(isinstance(client, dict) for client in clients):
+        raise TemplateError("Client template must have a non-empty 'settings.clients' list")
+    for client in clients:
+        missing = [field for field in CLIENT_FIELDS if field not in client]
+        if missing:
+            raise TemplateError(f"Client template is missing fields {missing}")
+
+
+def validate_receipt_template(data):
+    try:
+        item = data['receipt']['items'][0]
+        item['amount']['value']
+        item['description']
+    except (KeyError, IndexError, TypeError) as e:
+        raise TemplateError(f"Receipt template must have receipt.items[0] with description and amount.value: {str(e)}") from e
+
+
+def build_clients_payload(template, clients, inbound_id=None):
+    """
+    Builds one addClient payload for several clients from the parsed template.
+    clients: (tg_id, uuid, email, period, sub_id) tuples; each gets a copy of
+    every client prototype of the template. inbound_id overrides the inbound.
+    """
+    settings = template['settings']
+    entries = [
+        {**client, 'id': f"{uuid}", 'email': f"{email}", 'tgId': f"{tg_id}", 'expiryTime': period, 'subId': f"{sub_id}"}
+        for tg_id, uuid, email, period, sub_id in clients
+        for client in settings['clients']
+    ]
+    payload = {**template, 'settings': json.dumps({**settings, 'clients': entries})}
+    if inbound_id is not None:
+        payload['id'] = inbound_id
+    return payload
+
+
+def build_client_payload(template, tg_id, uuid, email, period, sub_id, inbound_id=None):
+    """
+    Builds an addClient/updateClient payload from the parsed template without mutating it.
+    inbound_id overrides the inbound of the template.
+    """
+    return build_clients_payload(template, [(tg_id, uuid, email, period, sub_id)], inbound_id)
+
+
+def build_receipt(template, description, amount):
+    """
+    Builds the provider_data receipt JSON string from the parsed template.
+    """
+    receipt = template['receipt']
+    first = receipt['items'][0]
+    item = {**first, 'description': f"{description}", 'amount': {**first['amount'], 'value': f"{amount/100:.2f}"}}
+    return json.dumps({**template, 'receipt': {**receipt, 'items': [item] + receipt['items'][1:]}})
+
+
+def precompute_receipts(template):
+    return {
+        (product['description'], product['amount']): build_receipt(template, product['description'], product['amount'])
+        for product in RECEIPT_PRODUCTS
+    }
+
+
+def preload_templates():
+    """
+    Loads and validates payload templates once at startup; raises TemplateError if one is broken.
+    """
+    TEMPLATES.register(CLIENT_TEMPLATE_PATH, validate_client_template)
+    TEMPLATES.register(RECEIPT_TEMPLATE_PATH, validate_receipt_template, precompute_receipts)
+
+
 @log_function_call(logger)
-def post_client_json_updater(tg_id, json_file_path, uuid, email, period, sub_id):
+def post_client_json_updater(tg_id, json_file_path, uuid, email, period, sub_id, inbound_id=None):
     try:
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-
-        for client in data['settings']['clients']:
-            client['id'] = f"{uuid}"
-            client['email'] = f"{email}"
-            client['tgId'] = f"{tg_id}"
-            client['expiryTime'] = period
-            client['subId'] = f"{sub_id}"
-
-        data['settings'] = json.dumps(data['settings'])
-        return data
-    except FileNotFoundError:
-        logger.error(f"File not found: {json_file_path}")
-        raise
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON format in file: {json_file_path}")
+        return build_client_payload(TEMPLATES.get(json_file_path).data, tg_id, uuid, email, period, sub_id, inbound_id)
+    except TemplateError as e:
+        logger.error(f"Template error in post_client_json_updater: {str(e)}")
         raise
     except Exception as e:
         logger.error(f"Error in post_client_json_updater: {str(e)}")
@@ -32,19 +100,13 @@ def post_client_json_updater(tg_id, json_file_path, uuid, email, period, sub_id)
 @log_function_call(logger)
 def receipt_creator(json_file_path, description, amount):
     try:
-        with open(json_file_path, 'r') as file:
-            data = json.load(file)
-
-        data['receipt']['items'][0]['description'] = f"{description}"
-        data['receipt']['items'][0]['amount']['value'] = f"{amount/100:.2f}"
-
-        data = json.dumps(data)
-        return data
-    except FileNotFoundError:
-        logger.error(f"File not found: {json_file_path}")
-        raise
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON format in file: {json_file_path}")
+        template = TEMPLATES.get(json_file_path)
+        receipt = template.derived.get((description, amount))
+        if receipt is not None:
+            return receipt
+        return build_receipt(template.data, description, amount)
+    except TemplateError as e:
+        logger.error(f"Template error in receipt_creator: {str(e)}")
         raise
     except Exception as e:
         logger.error(f"Error in receipt_creator: {str(e)}")
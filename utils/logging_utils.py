@@ -1,8 +1,10 @@
 # logging_utils.py
 
+import asyncio
 import logging
 import logging.handlers
 import os
+import random
 from functools import wraps
 from typing import Callable, Any
 import time
@@ -72,27 +74,59 @@ def setup_logger(name: str, log_file: str) -> logging.Logger:
     return logger
 
 
-def retry_on_error(retries: int = 3, delay: int = 5) -> Callable:
+def backoff_delay(attempt: int, delay: float, backoff: float = 2, max_delay: float = 60, jitter: float = 0.5) -> float:
     """
-    Декоратор для повторных попыток выполнения функции при ошибке
+    Pause before retry number attempt (from 0): delay * backoff**attempt capped
+    by max_delay, with up to a jitter fraction of it randomly taken off.
     """
+    base = min(max_delay, delay * backoff ** attempt)
+    # Случайный разброс, чтобы повторы разных запросов не приходили одновременно
+    return base - random.uniform(0, base * jitter)
+
+
+def retry_on_error(retries: int = 3, delay: float = 5, backoff: float = 2, max_delay: float = 60,
+                   jitter: float = 0.5) -> Callable:
+    """
+    Декоратор для повторных попыток выполнения функции при ошибке.
+    Пауза растёт экспоненциально со случайным разбросом (backoff_delay);
+    корутины ждут через asyncio.sleep и не блокируют цикл событий.
+    Ошибки с retryable = False (например, открытый предохранитель) не повторяются.
+    """
+
+    def should_retry(e, attempt):
+        return attempt < retries - 1 and getattr(e, 'retryable', True)
+
+    def log_attempt(func, attempt, e):
+        logger = logging.getLogger(func.__module__)
+        logger.error(
+            f"Attempt {attempt + 1}/{retries} failed for {func.__name__}: {str(e)}"
+        )
 
     def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                for attempt in range(retries):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        log_attempt(func, attempt, e)
+                        if not should_retry(e, attempt):
+                            raise
+                        await asyncio.sleep(backoff_delay(attempt, delay, backoff, max_delay, jitter))
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            last_exception = None
             for attempt in range(retries):
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    logger = logging.getLogger(func.__module__)
-                    logger.error(
-                        f"Attempt {attempt + 1}/{retries} failed for {func.__name__}: {str(e)}"
-                    )
-                    if attempt < retries - 1:
-                        time.sleep(delay)
-            raise last_exception
+                    log_attempt(func, attempt, e)
+                    if not should_retry(e, attempt):
+                        raise
+                    time.sleep(backoff_delay(attempt, delay, backoff, max_delay, jitter))
 
         return wrapper
 
@@ -128,58 +162,86 @@ def log_function_call(logger: logging.Logger) -> Callable:
     """
     Декоратор для логирования вызовов функций.
     Также извлекает информацию о пользователе из call или message,
-    используя LOGGER_PRESET.
+    используя LOGGER_PRESET. Корутины логируются после их завершения.
     """
 
+    def get_user_info(args) -> str:
+        # Изначально пустая информация
+        user_info_str = ""
+
+        # Проверяем, не является ли первый аргумент call (CallbackQuery)
+        if args:
+            if hasattr(args[0], 'message') and hasattr(args[0].message, 'chat'):
+                chat_id = args[0].message.chat.id
+                username = getattr(args[0].from_user, 'username', None) or "N/A"
+                user_info_str = LOGGER_PRESET.format(chat_id=chat_id, username=username)
+            elif hasattr(args[0], 'chat') and hasattr(args[0], 'from_user'):
+                # Или первый аргумент – это message
+                chat_id = args[0].chat.id
+                username = getattr(args[0].from_user, 'username', None) or "N/A"
+                user_info_str = LOGGER_PRESET.format(chat_id=chat_id, username=username)
+        return user_info_str
+
+    def log_enter(func, user_info_str):
+        # Логируем вход в функцию
+        logger.info(f"{LogColors.OKBLUE}\n\n{LogColors.WARNING}{user_info_str}{LogColors.ENDC} {LogColors.OKBLUE}Entered {func.__name__} function.{LogColors.ENDC}")
+
+    def log_success(func, user_info_str, start_time):
+        duration = (datetime.now() - start_time).total_seconds()
+
+        if user_info_str:
+            logger.info(
+                f"{LogColors.OKBLUE}{user_info_str}Function {func.__name__} completed successfully in {duration:.2f} seconds{LogColors.ENDC}"
+            )
+        else:
+            logger.info(
+                f"{LogColors.OKBLUE}Function {func.__name__} completed successfully in {duration:.2f} seconds{LogColors.ENDC}"
+            )
+
+    def log_failure(func, user_info_str, start_time, e):
+        duration = (datetime.now() - start_time).total_seconds()
+
+        if user_info_str:
+            logger.error(
+                f"{LogColors.WARNING}{user_info_str} Function {func.__name__} failed after {duration:.2f} seconds. Error: {str(e)}{LogColors.ENDC}"
+            )
+        else:
+            logger.error(
+                f"{LogColors.WARNING}Function {func.__name__} failed after {duration:.2f} seconds. Error: {str(e)}{LogColors.ENDC}"
+            )
+
     def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                user_info_str = get_user_info(args)
+                log_enter(func, user_info_str)
+
+                start_time = datetime.now()
+                try:
+                    result = await func(*args, **kwargs)
+                    log_success(func, user_info_str, start_time)
+                    return result
+                except Exception as e:
+                    log_failure(func, user_info_str, start_time, e)
+                    raise
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            # Изначально пустая информация
-            user_info_str = ""
-
-            # Проверяем, не является ли первый аргумент call (CallbackQuery)
-            if args:
-                if hasattr(args[0], 'message') and hasattr(args[0].message, 'chat'):
-                    chat_id = args[0].message.chat.id
-                    username = getattr(args[0].from_user, 'username', None) or "N/A"
-                    user_info_str = LOGGER_PRESET.format(chat_id=chat_id, username=username)
-                elif hasattr(args[0], 'chat') and hasattr(args[0], 'from_user'):
-                    # Или первый аргумент – это message
-                    chat_id = args[0].chat.id
-                    username = getattr(args[0].from_user, 'username', None) or "N/A"
-                    user_info_str = LOGGER_PRESET.format(chat_id=chat_id, username=username)
-
-            # Логируем вход в функцию
-            logger.info(f"{LogColors.OKBLUE}\n\n{LogColors.WARNING}{user_info_str}{LogColors.ENDC} {LogColors.OKBLUE}Entered {func.__name__} function.{LogColors.ENDC}")
+            user_info_str = get_user_info(args)
+            log_enter(func, user_info_str)
 
             start_time = datetime.now()
             try:
                 result = func(*args, **kwargs)
-                duration = (datetime.now() - start_time).total_seconds()
-
-                if user_info_str:
-                    logger.info(
-                        f"{LogColors.OKBLUE}{user_info_str}Function {func.__name__} completed successfully in {duration:.2f} seconds{LogColors.ENDC}"
-                    )
-                else:
-                    logger.info(
-                        f"{LogColors.OKBLUE}Function {func.__name__} completed successfully in {duration:.2f} seconds{LogColors.ENDC}"
-                    )
+                log_success(func, user_info_str, start_time)
                 return result
-
             except Exception as e:
-                duration = (datetime.now() - start_time).total_seconds()
-
-                if user_info_str:
-                    logger.error(
-                        f"{LogColors.WARNING}{user_info_str} Function {func.__name__} failed after {duration:.2f} seconds. Error: {str(e)}{LogColors.ENDC}"
-                    )
-                else:
-                    logger.error(
-                        f"{LogColors.WARNING}Function {func.__name__} failed after {duration:.2f} seconds. Error: {str(e)}{LogColors.ENDC}"
-                    )
+                log_failure(func, user_info_str, start_time, e)
                 raise
 
         return wrapper
 
-    return decorator
\ No newline at end of file
+    return decorator
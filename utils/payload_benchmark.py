@@ -0,0 +1,68 @@
+#payload_benchmark.py
+import argparse
+import json
+import sys
+import timeit
+
+from const.const_bot import MONTH3
+from utils.json_fun import (
+    CLIENT_TEMPLATE_PATH, RECEIPT_TEMPLATE_PATH, build_client_payload, build_receipt, preload_templates
+)
+from utils.templates import TEMPLATES
+
+CLIENT_ARGS = (123456789, '6f1c7c84-0b55-4a4f-9a43-3b0f4f3f8c11', 'user42', 1_760_000_000_000, 'abcdefgh12345678')
+
+
+def build_client_from_file(tg_id, uuid, email, period, sub_id):
+    """Прежний способ: чтение и разбор файла на каждый запрос"""
+    with open(CLIENT_TEMPLATE_PATH, 'r') as file:
+        data = json.load(file)
+    for client in data['settings']['clients']:
+        client['id'] = f"{uuid}"
+        client['email'] = f"{email}"
+        client['tgId'] = f"{tg_id}"
+        client['expiryTime'] = period
+        client['subId'] = f"{sub_id}"
+    data['settings'] = json.dumps(data['settings'])
+    return data
+
+
+def build_receipt_from_file(description, amount):
+    with open(RECEIPT_TEMPLATE_PATH, 'r') as file:
+        data = json.load(file)
+    data['receipt']['items'][0]['description'] = f"{description}"
+    data['receipt']['items'][0]['amount']['value'] = f"{amount/100:.2f}"
+    return json.dumps(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare payload build time from disk and from preloaded templates.")
+    parser.add_argument('--number', type=int, default=20000, help="builds per measurement")
+    parser.add_argument('--repeat', type=int, default=5, help="measurements, the best one is reported")
+    args = parser.parse_args(argv)
+
+    preload_templates()
+    client_template = TEMPLATES.get(CLIENT_TEMPLATE_PATH)
+    receipt_template = TEMPLATES.get(RECEIPT_TEMPLATE_PATH)
+    key = (MONTH3['description'], MONTH3['amount'])
+
+    # Оба способа должны давать одинаковый результат
+    assert build_client_from_file(*CLIENT_ARGS) == build_client_payload(client_template.data, *CLIENT_ARGS)
+    assert build_receipt_from_file(*key) == receipt_template.derived[key]
+
+    cases = [
+        ('client payload, file', lambda: build_client_from_file(*CLIENT_ARGS)),
+        ('client payload, template', lambda: build_client_payload(client_template.data, *CLIENT_ARGS)),
+        ('receipt, file', lambda: build_receipt_from_file(*key)),
+        ('receipt, template', lambda: build_receipt(receipt_template.data, *key)),
+        ('receipt, precomputed', lambda: receipt_template.derived[key]),
+    ]
+    print(f"{'case':<28}{'us/build':>10}")
+    for label, func in cases:
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        print(f"{label:<28}{best / args.number * 1e6:>10.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
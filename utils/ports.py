@@ -4,5 +4,5 @@ from utils.logging_utils import setup_logger, log_function_call
 logger = setup_logger('ports', 'utils.log')
 
 @log_function_call(logger)
-def random_port():
-    return random.randint(29401, 29599)
\ No newline at end of file
+def random_port(port_min=29401, port_max=29599):
+    return random.randint(port_min, port_max)
@@ -0,0 +1,94 @@
+#rate_limit.py
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Lets at most rate calls per second through, with bursts of up to capacity.
+
+    Waiters are served in arrival order. pause(seconds) stops every caller
+    until the pause is over, e.g. for the retry_after of a 429 response.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.clock = clock
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.pauses = 0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        if now <= self._updated:
+            return
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """
+        Waits until a token is available and takes it.
+        """
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.acquired += 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Holds every caller for seconds; overlapping pauses end at the latest one.
+        """
+        now = self.clock()
+        if now + seconds > self._paused_until:
+            self._paused_until = now + seconds
+            # Запас копится заново только после паузы, иначе она закончится всплеском
+            self._tokens = 0.0
+            self._updated = self._paused_until
+            self.pauses += 1
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'capacity': self.capacity,
+            'acquired': self.acquired,
+            'pauses': self.pauses,
+            'paused_for': max(self._paused_until - self.clock(), 0.0),
+            'waited': self.waited,
+        }
+
+
+class ChatSpacing:
+    """
+    Keeps at least interval seconds between calls for the same chat.
+    """
+
+    def __init__(self, interval, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self._next = {}
+
+    async def wait(self, chat_id):
+        """
+        Reserves the next free slot of chat_id and sleeps until it comes.
+        """
+        now = self.clock()
+        slot = max(now, self._next.get(chat_id, now))
+        self._next[chat_id] = slot + self.interval
+        if len(self._next) > 10000:
+            # Чаты, у которых интервал уже прошёл, не нужно помнить
+            self._next = {chat: until for chat, until in self._next.items() if until > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
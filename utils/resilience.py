@@ -0,0 +1,158 @@
+#resilience.py
+import asyncio
+import threading
+import time
+
+from utils.config import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('resilience', 'utils.log')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a downstream whose circuit is open.
+    """
+    # retry_on_error не повторяет такие вызовы: ждать внутри повтора бессмысленно
+    retryable = False
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fails calls to an unhealthy downstream fast instead of letting them wait for timeouts.
+
+    failure_threshold consecutive failures open the circuit; while open every
+    call raises CircuitOpenError. After reset_timeout seconds the circuit is
+    half-open and lets half_open_max_calls trial calls through: a success
+    closes it, a failure opens it for another reset_timeout.
+    is_failure(exc) decides which exceptions mean the downstream is unhealthy;
+    other exceptions (a rejected request, a missing row) count as a success.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT,
+                 half_open_max_calls=1, is_failure=None, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure or (lambda e: True)
+        self.clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trials = 0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trials = 0
+            logger.info(f"Circuit '{self.name}' is half-open, probing.")
+        return self._state
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self.clock()
+        self._trials = 0
+        self.opened += 1
+        logger.warning(f"Circuit '{self.name}' opened after {self._failures} failures.")
+
+    def before_call(self):
+        """
+        Reserves a call; raises CircuitOpenError if the circuit does not admit it.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.reset_timeout - (self.clock() - self._opened_at))
+            if state == HALF_OPEN:
+                if self._trials >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0)
+                self._trials += 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                logger.info(f"Circuit '{self.name}' closed.")
+            self._state = CLOSED
+            self._trials = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._open()
+
+    def record_exception(self, e):
+        if self.is_failure(e):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def _release_trial(self):
+        # Отменённый пробный вызов ничего не сказал о здоровье: освобождаем слот
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Awaits func(*args, **kwargs) through the circuit.
+        """
+        self.before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            self._release_trial()
+            raise
+        except Exception as e:
+            self.record_exception(e)
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state()
+            return {
+                'state': state,
+                'failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+
+
+BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name, **kwargs):
+    """
+    Returns the circuit breaker of a downstream, creating it with kwargs on first use.
+    """
+    with _BREAKERS_LOCK:
+        breaker = BREAKERS.get(name)
+        if breaker is None:
+            breaker = BREAKERS[name] = CircuitBreaker(name, **kwargs)
+        return breaker
+
+
+def breaker_stats():
+    return {name: breaker.stats() for name, breaker in list(BREAKERS.items())}
@@ -0,0 +1,129 @@
+#templates.py
+import json
+import os
+import threading
+import time
+
+from utils.logging_utils import setup_logger
+
+logger = setup_logger('templates', 'utils.log')
+
+
+class TemplateError(Exception):
+    """
+    Raised when a JSON template is missing, malformed or fails validation.
+    """
+
+
+class Template:
+    """
+    A JSON file parsed once and kept in memory.
+
+    validate(data) raises TemplateError for a bad file; derive(data) returns
+    values precomputed from the template (e.g. ready payloads), rebuilt on
+    every reload. The file's mtime is checked at most every check_interval
+    seconds, so building a payload normally touches no file at all.
+    """
+
+    def __init__(self, path, validate=None, derive=None, check_interval=5.0):
+        self.path = path
+        self.validate = validate
+        self.derive = derive
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        # (data, derived, mtime) меняется одним присваиванием
+        self._state = None
+
+    def _read(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError as e:
+            raise TemplateError(f"Template not found: {self.path}") from e
+        except json.JSONDecodeError as e:
+            raise TemplateError(f"Invalid JSON format in template {self.path}: {str(e)}") from e
+        if self.validate is not None:
+            self.validate(data)
+        derived = self.derive(data) if self.derive is not None else {}
+        return data, derived, mtime
+
+    def load(self):
+        """
+        Reads and validates the file, replacing the cached copy.
+        """
+        with self._lock:
+            self._state = self._read()
+            self._checked_at = time.monotonic()
+            self.reloads += 1
+        logger.info(f"Loaded template {self.path}.")
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._state is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            changed = self._state is None or os.stat(self.path).st_mtime_ns != self._state[2]
+        except OSError as e:
+            # Файл пропал: работаем со старой копией
+            logger.warning(f"Cannot stat template {self.path}: {str(e)}")
+            return
+        if not changed:
+            return
+        try:
+            self.load()
+        except TemplateError as e:
+            if self._state is None:
+                raise
+            # Сломанный файл не должен ломать выдачу: остаёмся на прошлой версии
+            logger.error(f"Keeping previous version of {self.path}: {str(e)}")
+
+    @property
+    def data(self):
+        """
+        Parsed template. Shared between callers: never mutate it.
+        """
+        self._refresh()
+        return self._state[0]
+
+    @property
+    def derived(self):
+        """
+        Values precomputed by derive for the current version of the file.
+        """
+        self._refresh()
+        return self._state[1]
+
+
+class TemplateRegistry:
+    """
+    Templates by file path.
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._templates = {}
+
+    def register(self, path, validate=None, derive=None):
+        """
+        Registers and loads a template, raising TemplateError if it is invalid.
+        """
+        template = Template(path, validate, derive, self.check_interval)
+        template.load()
+        self._templates[path] = template
+        return template
+
+    def get(self, path):
+        """
+        Returns the template for path, loading it on first use.
+        """
+        template = self._templates.get(path)
+        if template is None:
+            template = self._templates.setdefault(path, Template(path, check_interval=self.check_interval))
+        return template
+
+
+TEMPLATES = TemplateRegistry()